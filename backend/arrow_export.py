@@ -0,0 +1,152 @@
+"""
+大结果集导出 - 从服务端游标按批读取元组行，直接按列构造 Arrow RecordBatch（不构造逐行字典）
+输出 Arrow IPC 流或 Parquet，Decimal / 日期保持原生类型，分析侧可直接读成 DataFrame：
+    pyarrow.ipc.open_stream(body).read_pandas()
+    pandas.read_parquet(io.BytesIO(body))
+"""
+
+import os
+import pyarrow as pa
+import pyarrow.parquet as pq
+from columnar import column_types
+
+EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', 50000))
+# Arrow IPC 缓冲区压缩（zstd / lz4 / none）；导出响应不再经过 HTTP 压缩
+EXPORT_ARROW_COMPRESSION = os.getenv('EXPORT_ARROW_COMPRESSION', 'zstd')
+EXPORT_PARQUET_COMPRESSION = os.getenv('EXPORT_PARQUET_COMPRESSION', 'zstd')
+
+# 格式 -> (Content-Type, 文件扩展名)
+EXPORT_FORMATS = {
+    'arrow': ('application/vnd.apache.arrow.stream', 'arrow'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+
+# 首批数据中整列为 NULL、无法确定小数位时使用的 scale
+_DEFAULT_DECIMAL_SCALE = 4
+
+_ARROW_TYPES = {
+    'int': pa.int64(),
+    'float': pa.float64(),
+    'bool': pa.bool_(),
+    'date': pa.date32(),
+    'datetime': pa.timestamp('us'),
+    'time': pa.duration('us'),
+    'bytes': pa.binary(),
+    'string': pa.string(),
+    'json': pa.string(),
+    'null': pa.string(),
+}
+
+
+def _decimal_type(values):
+    """MySQL DECIMAL 列的取值小数位固定，取首批数据中最大的小数位作为 scale"""
+    scales = [max(0, -v.as_tuple().exponent) for v in values if v is not None]
+    return pa.decimal128(38, max(scales) if scales else _DEFAULT_DECIMAL_SCALE)
+
+
+def arrow_schema(description, rows):
+    """由游标 description 与首批数据确定 Arrow schema"""
+    names = [d[0] for d in description]
+    types = column_types(description, rows)
+    fields = []
+    for i, (name, type_name) in enumerate(zip(names, types)):
+        if type_name == 'decimal':
+            arrow_type = _decimal_type(row[i] for row in rows)
+        else:
+            arrow_type = _ARROW_TYPES.get(type_name, pa.string())
+        fields.append(pa.field(name, arrow_type))
+    return pa.schema(fields)
+
+
+def rows_to_batch(rows, schema):
+    """元组行 -> RecordBatch：zip(*rows) 按列转置后逐列转换"""
+    columns = list(zip(*rows)) if rows else [()] * len(schema)
+    arrays = [pa.array(values, type=field.type) for values, field in zip(columns, schema)]
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+class _ChunkSink:
+    """只追加的输出流：累计写入位置供 Parquet 记录偏移，已写出的字节随时取走发送"""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def take(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+class ResultExporter:
+    """
+    按批把游标结果编码为 Arrow IPC / Parquet；每次调用返回可以立即发送的字节
+    start() 读取首批并写出表头，之后反复调用 next_chunk() 直到 done（均为同步调用，在 db_executor 中执行）
+    """
+
+    def __init__(self, cursor, fmt='arrow', batch_size=EXPORT_BATCH_SIZE):
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"不支持的导出格式: {fmt}")
+        self.cursor = cursor
+        self.format = fmt
+        self.batch_size = batch_size
+        self.schema = None
+        self.rows = 0
+        self.done = False
+        self._sink = _ChunkSink()
+        self._writer = None
+
+    def _open_writer(self):
+        stream = pa.PythonFile(self._sink, mode='w')
+        if self.format == 'parquet':
+            compression = EXPORT_PARQUET_COMPRESSION if EXPORT_PARQUET_COMPRESSION != 'none' else None
+            return pq.ParquetWriter(stream, self.schema, compression=compression)
+        compression = EXPORT_ARROW_COMPRESSION if EXPORT_ARROW_COMPRESSION != 'none' else None
+        return pa.ipc.new_stream(stream, self.schema, options=pa.ipc.IpcWriteOptions(compression=compression))
+
+    def _write(self, rows):
+        self.rows += len(rows)
+        batch = rows_to_batch(rows, self.schema)
+        if self.format == 'parquet':
+            # 每批一个 row group，写完即可发送
+            self._writer.write_batch(batch, row_group_size=len(rows) or None)
+        else:
+            self._writer.write_batch(batch)
+
+    def start(self):
+        rows = self.cursor.fetchmany(self.batch_size)
+        self.schema = arrow_schema(self.cursor.description, rows)
+        self._writer = self._open_writer()
+        if rows:
+            self._write(rows)
+        else:
+            self._finish()
+        return self._sink.take()
+
+    def next_chunk(self):
+        rows = self.cursor.fetchmany(self.batch_size)
+        if rows:
+            self._write(rows)
+        else:
+            self._finish()
+        return self._sink.take()
+
+    def _finish(self):
+        self._writer.close()
+        self.done = True
@@ -0,0 +1,309 @@
+"""
+两级缓存 - 进程内 L1（LRU + TTL + 内存上限）+ Redis L2
+读：L1 -> L2，L2 命中回填 L1（read-through）
+写：同时写 L1 和 L2（write-through），并通过 pub/sub 通知其他 worker 丢弃各自的 L1 副本
+Redis 不可用时只有 L1，条目保留到值本身的 TTL（如 CACHE_TTL）为止，替代原来永不过期、无限增长的 mock_cache 字典
+"""
+
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from metrics import stage
+
+L1_MAX_ENTRIES = int(os.getenv('L1_CACHE_MAX_ENTRIES', 10000))
+L1_MAX_BYTES = int(os.getenv('L1_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+L1_TTL = int(os.getenv('L1_CACHE_TTL', 300))
+INVALIDATION_CHANNEL = os.getenv('CACHE_INVALIDATION_CHANNEL', 'cache:invalidate')
+
+
+def _sizeof(key, value):
+    return sys.getsizeof(key) + sys.getsizeof(value)
+
+
+class LocalCache:
+    """线程安全的进程内 LRU 缓存，同时受条目数、内存估算值和 TTL 约束"""
+
+    def __init__(self, max_entries=L1_MAX_ENTRIES, max_bytes=L1_MAX_BYTES, ttl=L1_TTL):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._data = OrderedDict()   # key -> (value, 本地过期时间, 值本身的过期时间, 大小)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        """返回 (value, 值的剩余有效秒数或 None)，未命中返回 None"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, local_expiry, value_expiry, _ = entry
+            if now >= local_expiry:
+                self._pop(key)
+                self.expirations += 1
+                return None
+            self._data.move_to_end(key)
+        return value, (value_expiry - now if value_expiry is not None else None)
+
+    def set(self, key, value, ttl=None, local_ttl=None):
+        """
+        ttl 为值本身的剩余有效秒数；本地副本最多保留 local_ttl 秒（默认 self.ttl）
+        没有 L2 时 L1 就是唯一一份缓存，调用方传 local_ttl=ttl 让副本与值同时过期
+        """
+        now = time.monotonic()
+        local_ttl = self.ttl if local_ttl is None else local_ttl
+        value_expiry = now + ttl if ttl is not None else None
+        local_expiry = now + (min(local_ttl, ttl) if ttl is not None else local_ttl)
+        size = _sizeof(key, value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._data:
+                self._pop(key)
+            self._data[key] = (value, local_expiry, value_expiry, size)
+            self._bytes += size
+            while len(self._data) > self.max_entries or self._bytes > self.max_bytes:
+                self._pop(next(iter(self._data)))
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._pop(key)
+
+    def _pop(self, key):
+        entry = self._data.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[3]
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._data),
+                'bytes': self._bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+            }
+
+
+class _TierStats:
+    """各层命中计数；终端版批量模式下多个线程共用同一个缓存，计数需要加锁"""
+
+    def __init__(self):
+        self.l1_hits = 0
+        self.l1_misses = 0
+        self.l2_hits = 0
+        self.l2_misses = 0
+        self.l2_errors = 0
+        self._lock = threading.Lock()
+
+    def incr(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def as_dict(self):
+        with self._lock:
+            l1_hits, l1_misses = self.l1_hits, self.l1_misses
+            l2_hits, l2_misses, l2_errors = self.l2_hits, self.l2_misses, self.l2_errors
+        l1_total = l1_hits + l1_misses
+        l2_total = l2_hits + l2_misses
+        return {
+            'l1_hits': l1_hits,
+            'l1_misses': l1_misses,
+            'l1_hit_ratio': round(l1_hits / l1_total, 4) if l1_total else 0.0,
+            'l2_hits': l2_hits,
+            'l2_misses': l2_misses,
+            'l2_hit_ratio': round(l2_hits / l2_total, 4) if l2_total else 0.0,
+            'l2_errors': l2_errors,
+        }
+
+
+def _ttl_from_pttl(pttl):
+    # Redis PTTL：-1 没有过期时间，-2 key 不存在
+    return pttl / 1000 if pttl is not None and pttl >= 0 else None
+
+
+class TieredCache:
+    """异步两级缓存（FastAPI 使用，redis_client 为 redis.asyncio 客户端）"""
+
+    def __init__(self, l1=None, redis_client=None, name='cache'):
+        self.l1 = l1 or LocalCache()
+        self.redis = redis_client
+        self.name = name
+        self.instance_id = uuid.uuid4().hex[:12]
+        self.stats = _TierStats()
+
+    async def get(self, key):
+        """返回 (value, 剩余有效秒数或 None)，未命中返回 (None, None)"""
+        with stage(f"{self.name}_cache_l1"):
+            hit = self.l1.get(key)
+        if hit is not None:
+            self.stats.incr('l1_hits')
+            return hit
+        self.stats.incr('l1_misses')
+
+        if self.redis is None:
+            return None, None
+        try:
+            with stage(f"{self.name}_cache_l2"):
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    pipe.get(key)
+                    pipe.pttl(key)
+                    value, pttl = await pipe.execute()
+        except Exception as e:
+            self.stats.incr('l2_errors')
+            print(f"⚠️ Redis 缓存读取失败: {e}")
+            return None, None
+        if value is None:
+            self.stats.incr('l2_misses')
+            return None, None
+        self.stats.incr('l2_hits')
+        ttl = _ttl_from_pttl(pttl)
+        self.l1.set(key, value, ttl)
+        return value, ttl
+
+    async def mget(self, keys):
+        """批量读取，返回 {key: value}（只含命中的 key），L1 未命中的 key 用一次 MGET 取回"""
+        found = {}
+        missing = []
+        for key in keys:
+            hit = self.l1.get(key)
+            if hit is not None:
+                self.stats.incr('l1_hits')
+                found[key] = hit[0]
+            else:
+                self.stats.incr('l1_misses')
+                missing.append(key)
+        if missing and self.redis is not None:
+            try:
+                with stage(f"{self.name}_cache_l2"):
+                    values = await self.redis.mget(missing)
+            except Exception as e:
+                self.stats.incr('l2_errors')
+                print(f"⚠️ Redis 批量读取失败: {e}")
+                return found
+            for key, value in zip(missing, values):
+                if value is None:
+                    self.stats.incr('l2_misses')
+                    continue
+                self.stats.incr('l2_hits')
+                found[key] = value
+                self.l1.set(key, value)
+        return found
+
+    async def set(self, key, value, ttl):
+        """写入 L1 与 L2，并通知其他 worker 失效各自的 L1；没有 Redis 时 L1 副本保留到值本身过期"""
+        if self.redis is None:
+            self.l1.set(key, value, ttl, local_ttl=ttl)
+            return
+        self.l1.set(key, value, ttl)
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.setex(key, ttl, value)
+                pipe.publish(INVALIDATION_CHANNEL, f"{self.instance_id}|{key}")
+                await pipe.execute()
+        except Exception as e:
+            self.stats.incr('l2_errors')
+            print(f"⚠️ Redis 缓存写入失败: {e}")
+
+    async def delete(self, key):
+        self.l1.delete(key)
+        if self.redis is None:
+            return
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.delete(key)
+                pipe.publish(INVALIDATION_CHANNEL, f"{self.instance_id}|{key}")
+                await pipe.execute()
+        except Exception as e:
+            self.stats.incr('l2_errors')
+            print(f"⚠️ Redis 缓存删除失败: {e}")
+
+    def handle_invalidation(self, message):
+        """处理其他 worker 发来的失效通知"""
+        instance_id, _, key = message.partition('|')
+        if instance_id != self.instance_id:
+            self.l1.delete(key)
+
+    def snapshot(self):
+        return {'name': self.name, **self.stats.as_dict(), 'l1': self.l1.stats()}
+
+
+async def listen_invalidations(redis_client, caches):
+    """订阅失效频道，把消息分发给各个 TieredCache（作为后台任务运行）"""
+    pubsub = redis_client.pubsub()
+    await pubsub.subscribe(INVALIDATION_CHANNEL)
+    try:
+        async for message in pubsub.listen():
+            if message.get('type') != 'message':
+                continue
+            for cache in caches:
+                cache.handle_invalidation(message['data'])
+    finally:
+        await pubsub.unsubscribe(INVALIDATION_CHANNEL)
+        await pubsub.close()
+
+
+class SyncTieredCache:
+    """同步两级缓存（终端版使用，redis_client 为同步 redis 客户端）"""
+
+    def __init__(self, l1=None, redis_client=None, name='cache'):
+        self.l1 = l1 or LocalCache()
+        self.redis = redis_client
+        self.name = name
+        self.instance_id = uuid.uuid4().hex[:12]
+        self.stats = _TierStats()
+
+    def get(self, key):
+        """返回 (value, 命中层级)，未命中返回 (None, None)"""
+        with stage(f"{self.name}_cache_l1"):
+            hit = self.l1.get(key)
+        if hit is not None:
+            self.stats.incr('l1_hits')
+            return hit[0], 'l1'
+        self.stats.incr('l1_misses')
+        if self.redis is None:
+            return None, None
+        try:
+            with stage(f"{self.name}_cache_l2"):
+                pipe = self.redis.pipeline(transaction=False)
+                pipe.get(key)
+                pipe.pttl(key)
+                value, pttl = pipe.execute()
+        except Exception as e:
+            self.stats.incr('l2_errors')
+            print(f"⚠️  Redis 读取失败: {e}")
+            return None, None
+        if value is None:
+            self.stats.incr('l2_misses')
+            return None, None
+        self.stats.incr('l2_hits')
+        self.l1.set(key, value, _ttl_from_pttl(pttl))
+        return value, 'l2'
+
+    def set(self, key, value, ttl):
+        if self.redis is None:
+            self.l1.set(key, value, ttl, local_ttl=ttl)
+            return
+        self.l1.set(key, value, ttl)
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.setex(key, ttl, value)
+            pipe.publish(INVALIDATION_CHANNEL, f"{self.instance_id}|{key}")
+            pipe.execute()
+        except Exception as e:
+            self.stats.incr('l2_errors')
+            print(f"⚠️  Redis 写入失败: {e}")
+
+    def snapshot(self):
+        return {'name': self.name, **self.stats.as_dict(), 'l1': self.l1.stats()}
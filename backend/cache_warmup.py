@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+缓存预热 - 按 prompt 出现频次，把最热门问题的 SQL 提前生成并批量写入 Redis
+- 每次请求对规范化 prompt 计数（Redis ZSET，只保留次数最多的 PROMPT_FREQ_MAX_ENTRIES 个），没有计数时退回读取查询日志
+- 已在缓存中的 prompt 跳过；LLM 并发受 WARMUP_CONCURRENCY 限制；结果通过 pipeline 一次写入
+- 服务启动时可自动预热（WARMUP_ON_STARTUP），完成前 /ready 返回 503
+
+用法:
+    python cache_warmup.py                   # 预热前 WARMUP_TOP_N 个热门问题
+    python cache_warmup.py --top 500 --concurrency 8
+    python cache_warmup.py --source log      # 从查询日志统计热门问题
+"""
+
+import argparse
+import asyncio
+import os
+from collections import Counter
+from prompt_normalizer import normalize_prompt
+from query_log import read_query_log, QUERY_LOG_PATH
+
+PROMPT_FREQ_KEY = 'prompt_freq'
+# 规范化 prompt -> 最近一次的原始写法（预热时发给 LLM 的文本）
+PROMPT_TEXT_KEY = 'prompt_freq:text'
+
+WARMUP_ON_STARTUP = os.getenv('WARMUP_ON_STARTUP', 'false').lower() in ('1', 'true', 'yes')
+WARMUP_TOP_N = int(os.getenv('WARMUP_TOP_N', 200))
+WARMUP_CONCURRENCY = int(os.getenv('WARMUP_CONCURRENCY', 4))
+# 每批写入 Redis 的条数
+WARMUP_PIPELINE_SIZE = int(os.getenv('WARMUP_PIPELINE_SIZE', 100))
+# 频次统计最多保留的 prompt 数；超出 10% 后一次性淘汰次数最少的，避免每个请求都裁剪
+PROMPT_FREQ_MAX_ENTRIES = int(os.getenv('PROMPT_FREQ_MAX_ENTRIES', 10000))
+
+
+async def record_prompt(redis_client, prompt, max_entries=PROMPT_FREQ_MAX_ENTRIES):
+    """请求计数：ZINCRBY + 记录原始写法 + ZCARD，一次往返；条目过多时裁剪到 max_entries"""
+    normalized = normalize_prompt(prompt)
+    if not normalized:
+        return
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.zincrby(PROMPT_FREQ_KEY, 1, normalized)
+    pipe.hset(PROMPT_TEXT_KEY, normalized, prompt)
+    pipe.zcard(PROMPT_FREQ_KEY)
+    _, _, size = await pipe.execute()
+    if size > max_entries + max(1, max_entries // 10):
+        await trim_prompt_freq(redis_client, max_entries)
+
+
+async def trim_prompt_freq(redis_client, max_entries=PROMPT_FREQ_MAX_ENTRIES):
+    """只保留次数最多的 max_entries 个 prompt，同时删除被淘汰 prompt 的原始写法；返回淘汰数"""
+    evicted = await redis_client.zrange(PROMPT_FREQ_KEY, 0, -max_entries - 1)
+    if not evicted:
+        return 0
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.zremrangebyrank(PROMPT_FREQ_KEY, 0, -max_entries - 1)
+    pipe.hdel(PROMPT_TEXT_KEY, *evicted)
+    await pipe.execute()
+    return len(evicted)
+
+
+async def top_prompts_from_redis(redis_client, n=WARMUP_TOP_N):
+    """按频次返回前 n 个 [(原始 prompt, 次数)]"""
+    ranked = await redis_client.zrevrange(PROMPT_FREQ_KEY, 0, n - 1, withscores=True)
+    if not ranked:
+        return []
+    texts = await redis_client.hmget(PROMPT_TEXT_KEY, [normalized for normalized, _ in ranked])
+    return [(text or normalized, int(score)) for (normalized, score), text in zip(ranked, texts)]
+
+
+def top_prompts_from_log(path=QUERY_LOG_PATH, n=WARMUP_TOP_N):
+    """从查询日志统计热门 prompt（规则命中的问题不需要缓存，跳过）"""
+    counts = Counter()
+    texts = {}
+    for entry in read_query_log(path):
+        prompt = entry.get('prompt')
+        if not prompt or entry.get('source') == 'rule':
+            continue
+        normalized = normalize_prompt(prompt)
+        counts[normalized] += 1
+        texts[normalized] = prompt
+    return [(texts[normalized], count) for normalized, count in counts.most_common(n)]
+
+
+async def warm_up(redis_client, prompts, cache_key_fn, generate, ttl,
+                  concurrency=WARMUP_CONCURRENCY, skip=None, on_stored=None):
+    """
+    预热：prompts 为 [(prompt, 次数)]；cache_key_fn(prompt) 生成缓存 key，generate(prompt) 为生成 SQL 的协程
+    skip(prompt) 返回 True 的问题不预热（如规则快速通道能直接回答的问题）；
+    on_stored(key, sql) 在写入 Redis 后调用（如同步填充本进程 L1）
+    返回统计 {'candidates', 'cached', 'generated', 'failed'}
+    """
+    candidates = {}
+    for prompt, _ in prompts:
+        if skip and skip(prompt):
+            continue
+        candidates.setdefault(cache_key_fn(prompt), prompt)
+    keys = list(candidates)
+    existing = await redis_client.mget(keys) if keys else []
+    missing = [key for key, value in zip(keys, existing) if value is None]
+    stats = {'candidates': len(keys), 'cached': len(keys) - len(missing), 'generated': 0, 'failed': 0}
+    print(f"🔥 [预热] 热门问题 {len(keys)} 个，已缓存 {stats['cached']} 个，待生成 {len(missing)} 个")
+
+    limiter = asyncio.Semaphore(concurrency)
+    results = {}
+
+    async def _generate(key):
+        async with limiter:
+            try:
+                results[key] = await generate(candidates[key])
+            except Exception as e:
+                stats['failed'] += 1
+                print(f"⚠️ [预热] 生成失败「{candidates[key]}」: {e}")
+
+    await asyncio.gather(*(_generate(key) for key in missing))
+
+    # 分批 pipeline 写入，避免逐条往返
+    items = list(results.items())
+    for start in range(0, len(items), WARMUP_PIPELINE_SIZE):
+        pipe = redis_client.pipeline(transaction=False)
+        for key, sql in items[start:start + WARMUP_PIPELINE_SIZE]:
+            pipe.setex(key, ttl, sql)
+        await pipe.execute()
+    for key, sql in items:
+        if on_stored:
+            on_stored(key, sql)
+    stats['generated'] = len(items)
+    print(f"✅ [预热] 完成：新生成 {stats['generated']} 个，失败 {stats['failed']} 个")
+    return stats
+
+
+async def _main(args):
+    import redis.asyncio as aioredis
+    from dotenv import load_dotenv
+    from llm_service import get_sql_from_llm_async
+    from prompt_normalizer import make_cache_key
+    from schema_catalog import schema_catalog, SCHEMA_CACHE_KEY
+    from intent_rules import intent_matcher
+
+    load_dotenv(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'config', '.env'))
+    client = aioredis.Redis(
+        host=os.getenv('REDIS_HOST', 'localhost'),
+        port=int(os.getenv('REDIS_PORT', 6379)),
+        username=os.getenv('REDIS_USER', 'default'),
+        password=os.getenv('REDIS_PASSWORD', ''),
+        db=int(os.getenv('REDIS_DB', 0)),
+        decode_responses=True,
+    )
+    try:
+        # 实体词典用于识别规则快速通道能直接回答的问题（加载失败时只识别数字和日期）
+        try:
+            from db_pool import get_pool
+            from entity_dictionary import entity_dictionary
+            conn = get_pool().acquire()
+            try:
+                entity_dictionary.load(conn)
+            finally:
+                conn.close()
+        except Exception as e:
+            print(f"⚠️ 实体词典加载失败: {e}")
+
+        # 与服务共用 Redis 中的表结构目录，提示词保持一致
+        payload = await client.get(SCHEMA_CACHE_KEY)
+        if payload:
+            schema_catalog.load_json(payload)
+
+        if args.source == 'log':
+            prompts = top_prompts_from_log(args.log, args.top)
+        else:
+            prompts = await top_prompts_from_redis(client, args.top)
+        if not prompts:
+            print("📭 没有可预热的问题")
+            return
+
+        ttl = int(os.getenv('CACHE_TTL', 3600)) + int(os.getenv('CACHE_STALE_TTL', 300))
+        await warm_up(
+            client, prompts, make_cache_key,
+            lambda prompt: get_sql_from_llm_async(prompt, schema_catalog.context_for(prompt)),
+            ttl, concurrency=args.concurrency,
+            skip=lambda prompt: intent_matcher.can_answer(normalize_prompt(prompt)),
+        )
+    finally:
+        await client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="按热门问题预热 SQL 缓存")
+    parser.add_argument('--top', type=int, default=WARMUP_TOP_N, help="预热前 N 个热门问题")
+    parser.add_argument('--concurrency', type=int, default=WARMUP_CONCURRENCY, help="LLM 并发数")
+    parser.add_argument('--source', choices=('redis', 'log'), default='redis', help="热门问题来源")
+    parser.add_argument('--log', default=QUERY_LOG_PATH, help="查询日志路径（--source log 时使用）")
+    asyncio.run(_main(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -2,30 +2,42 @@
 """
 AI 数据库查询终端版 - 纯命令行交互
 支持：MySQL 查询、AI 生成 SQL、Redis 缓存
+
+批量模式（非交互，并发处理，结果写为 JSONL / CSV，过程日志输出到 stderr）:
+    python cli_query.py --batch prompts.txt --workers 8 --output results.jsonl
+    cat prompts.txt | python cli_query.py --batch - --output results.csv
 """
 
 import os
 import sys
-import mysql.connector
 import redis
 import json
+import csv
+import time
+import argparse
+import contextlib
+import unicodedata
+from itertools import chain, islice
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from dotenv import load_dotenv
 from llm_service import get_sql_from_llm
+from db_pool import get_pool
+from prompt_normalizer import make_cache_key, normalize_prompt
+from entity_dictionary import entity_dictionary
+from intent_rules import intent_matcher
+from schema_catalog import schema_catalog
+from sql_template import render_sql
+from metrics import stage, start_request_timer
+from cache import LocalCache, SyncTieredCache
+from sql_guard import enforce_limit
+from explain_guard import CostGuard, EXPLAIN_GUARD_ENABLED, QueryTooExpensiveError, apply_execution_timeout
 
 # 加载环境变量
 env_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'config', '.env')
 load_dotenv(env_path)
 
-# MySQL 配置
-DB_CONFIG = {
-    'host': os.getenv('DB_HOST', 'localhost'),
-    'port': int(os.getenv('DB_PORT', 3306)),
-    'user': os.getenv('DB_USER', 'root'),
-    'password': os.getenv('DB_PASSWORD', ''),
-    'database': os.getenv('DB_NAME', 'demo_db'),
-    'charset': 'utf8mb4'
-}
+# MySQL 配置与连接池见 db_pool.py
 
 # Redis 配置（适配火山引擎私网 Redis，支持用户名+密码）
 def get_redis_client():
@@ -62,82 +74,149 @@ def get_redis_client():
         print(f"⚠️  Redis 未连接: {e}")
         return None
 
-# 内存缓存（Redis 不可用时的备用）
-mock_cache = {}
+_NO_CLIENT = object()
+# 会话内共用的 Redis 客户端：首次使用时创建并测试一次，连接失败也只尝试一次（之后只用内存缓存）
+_session_redis = _NO_CLIENT
+
+# 进程内 L1 缓存（LRU + TTL + 内存上限），Redis 作为 L2；两级缓存会话内只建一个，命中统计持续累计
+l1_cache = LocalCache()
+sql_cache = SyncTieredCache(l1_cache, None, name="sql")
+
+def get_session_redis():
+    """返回会话共用的 Redis 客户端（可能为 None），并挂到会话的两级缓存上"""
+    global _session_redis
+    if _session_redis is _NO_CLIENT:
+        _session_redis = get_redis_client()
+        sql_cache.redis = _session_redis
+    return _session_redis
+
+def close_session_redis():
+    global _session_redis
+    if _session_redis not in (_NO_CLIENT, None):
+        _session_redis.close()
+    _session_redis = _NO_CLIENT
+    sql_cache.redis = None
+
+# SQL 缓存有效期，与服务端保持一致
+CACHE_TTL = int(os.getenv('CACHE_TTL', 3600))
+CACHE_STALE_TTL = int(os.getenv('CACHE_STALE_TTL', 300))
 
 def get_db_connection():
-    """获取 MySQL 连接"""
+    """从连接池借出 MySQL 连接（close() 即归还）"""
     try:
-        conn = mysql.connector.connect(**DB_CONFIG)
+        conn = get_pool().acquire()
         return conn
     except Exception as e:
         print(f"❌  MySQL 连接失败: {e}")
         return None
 
-def execute_sql(sql):
-    """执行 SQL 查询"""
-    conn = get_db_connection()
+# 与服务端相同的执行前 EXPLAIN 代价检查（批量模式的多个线程共用判定缓存）
+cost_guard = CostGuard()
+
+def execute_sql(sql, params=None, raise_errors=False, guard=True):
+    """
+    执行 SQL 查询（带参数时使用预处理语句）；raise_errors 为 True 时失败抛出异常而不是返回 None
+    guard 为 True 时先做 EXPLAIN 代价检查并加 MAX_EXECUTION_TIME 提示（生成的 SQL 必须经过检查）
+    """
+    with stage("db_acquire"):
+        conn = get_db_connection()
     if not conn:
+        if raise_errors:
+            raise RuntimeError("MySQL 连接失败")
         return None
     
     try:
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute(sql)
-        results = cursor.fetchall()
+        if guard:
+            if EXPLAIN_GUARD_ENABLED:
+                with stage("validate"):
+                    cost_guard.check(conn, sql, params)
+            sql = apply_execution_timeout(sql)
+        with stage("db_execute"):
+            if params is not None:
+                cursor = conn.cursor(prepared=True, dictionary=True)
+                cursor.execute(sql, params)
+            else:
+                cursor = conn.cursor(dictionary=True)
+                cursor.execute(sql)
+        with stage("fetch"):
+            results = cursor.fetchall()
         cursor.close()
-        conn.close()
         return results
+    except QueryTooExpensiveError as e:
+        print(f"🛑  {e}")
+        if raise_errors:
+            raise
+        return None
     except Exception as e:
         print(f"❌  SQL 执行失败: {e}")
+        if raise_errors:
+            raise
         return None
+    finally:
+        conn.close()
+
+def query_with_cache(prompt, redis_client=_NO_CLIENT, raise_errors=False):
+    """
+    带缓存的查询；返回 {'sql', 'data', 'cache_hit', 'source', 'count'}，失败返回 None
+    redis_client 不传时使用会话共用的客户端；传 None 表示只用内存缓存
+    raise_errors 为 True 时失败抛出异常（批量模式记录失败原因）
+    """
+    # 0. 规则快速通道：常见问题本地直接生成 SQL，不访问缓存与 AI
+    with stage("rule"):
+        match = intent_matcher.match(normalize_prompt(prompt))
+    if match:
+        sql, params = match
+        print(f"⚡  [规则命中] {render_sql(sql, params)}")
+        print("🔍  [执行查询...]")
+        sql = enforce_limit(sql)
+        results = execute_sql(sql, params, raise_errors)
+        if results is None:
+            return None
+        return {
+            'sql': render_sql(sql, params),
+            'data': results,
+            'cache_hit': True,
+            'source': 'rule',
+            'count': len(results)
+        }
 
-def query_with_cache(prompt):
-    """带缓存的查询"""
-    redis_client = get_redis_client()
-    cache_key = f"cache:{prompt}"
-    sql = None
-    cache_hit = False
+    if redis_client is _NO_CLIENT:
+        redis_client = get_session_redis()
+    # 会话客户端使用会话的两级缓存；显式传入其他客户端（或 None 只用内存）时临时包装
+    cache = sql_cache if redis_client is sql_cache.redis else SyncTieredCache(l1_cache, redis_client, name="sql")
+    cache_key = make_cache_key(prompt)
     
-    # 1. 检查缓存
-    if redis_client:
-        try:
-            sql = redis_client.get(cache_key)
-            if sql:
-                cache_hit = True
-                print("🚀  [Redis 缓存命中]")
-        except Exception as e:
-            print(f"⚠️  Redis 读取失败: {e}")
-    elif prompt in mock_cache:
-        sql = mock_cache[prompt]
-        cache_hit = True
+    # 1. 检查缓存（L1 -> Redis）
+    sql, tier = cache.get(cache_key)
+    cache_hit = sql is not None
+    if tier == 'l1':
         print("📦  [内存缓存命中]")
+    elif tier == 'l2':
+        print("🚀  [Redis 缓存命中]")
     
     # 2. 未命中缓存，调用 AI
     if not sql:
         print("🤖  [AI 生成 SQL...]")
         try:
-            sql = get_sql_from_llm(prompt)
+            with stage("llm"):
+                sql = get_sql_from_llm(prompt, schema_catalog.context_for(prompt))
             print(f"📄  [生成 SQL] {sql}")
         except Exception as e:
             print(f"❌  AI 调用失败: {e}")
+            if raise_errors:
+                raise
             return None
         
-        # 存入缓存
-        if redis_client:
-            try:
-                redis_client.setex(cache_key, 3600, sql)
-                print("💾  [已缓存到 Redis]")
-            except Exception as e:
-                print(f"⚠️  Redis 写入失败: {e}")
-        else:
-            mock_cache[prompt] = sql
-            print("💾  [已缓存到内存]")
+        # 存入缓存（写内存 + Redis）
+        cache.set(cache_key, sql, CACHE_TTL + CACHE_STALE_TTL)
+        print(f"💾  [已缓存到{'内存 + Redis' if redis_client else '内存'}]")
     else:
         print(f"📄  [缓存 SQL] {sql}")
     
-    # 3. 执行查询
+    # 3. 执行查询（生成的 SQL 强制行数上限）
     print("🔍  [执行查询...]")
-    results = execute_sql(sql)
+    sql = enforce_limit(sql)
+    results = execute_sql(sql, raise_errors=raise_errors)
     
     if results is None:
         return None
@@ -146,9 +225,75 @@ def query_with_cache(prompt):
         'sql': sql,
         'data': results,
         'cache_hit': cache_hit,
+        'source': 'cache' if cache_hit else 'llm',
         'count': len(results)
     }
 
+# 表格输出：列宽按前 CLI_SAMPLE_ROWS 行取样（超出部分截断），逐行输出；终端交互时每 CLI_PAGE_SIZE 行暂停
+CLI_SAMPLE_ROWS = int(os.getenv('CLI_SAMPLE_ROWS', 50))
+CLI_PAGE_SIZE = int(os.getenv('CLI_PAGE_SIZE', 40))
+CLI_MAX_COL_WIDTH = int(os.getenv('CLI_MAX_COL_WIDTH', 40))
+# 服务端游标每次读取的行数
+CLI_FETCH_SIZE = int(os.getenv('CLI_FETCH_SIZE', 500))
+
+def _display_width(text):
+    """终端显示宽度：中文等全角字符占两列"""
+    return sum(2 if unicodedata.east_asian_width(ch) in ('W', 'F') else 1 for ch in text)
+
+def _fit(text, width, align='<'):
+    """按显示宽度截断并补齐空格"""
+    text = text.replace('\n', ' ')
+    used = 0
+    for i, ch in enumerate(text):
+        w = 2 if unicodedata.east_asian_width(ch) in ('W', 'F') else 1
+        if used + w > width:
+            text = text[:i]
+            break
+        used += w
+    pad = width - used
+    if align == '^':
+        return ' ' * (pad // 2) + text + ' ' * (pad - pad // 2)
+    return text + ' ' * pad
+
+def render_table(columns, rows, page_size=None):
+    """
+    输出表格：rows 为元组行的可迭代对象（可以是服务端游标的分批读取），只缓存取样窗口内的行
+    page_size 为 None 时，标准输入输出都是终端则分页，否则不分页
+    返回 (已输出行数, 是否被用户中途停止)
+    """
+    if page_size is None:
+        page_size = CLI_PAGE_SIZE if sys.stdin.isatty() and sys.stdout.isatty() else 0
+    rows = iter(rows)
+    sample = list(islice(rows, CLI_SAMPLE_ROWS))
+    widths = []
+    for i, col in enumerate(columns):
+        width = max([_display_width(str(col))] + [_display_width(str(row[i])) for row in sample])
+        widths.append(min(width, CLI_MAX_COL_WIDTH))
+
+    separator = "=" * (sum(widths) + 3 * len(widths) + 1)
+    print(separator)
+    print("|" + "".join(f" {_fit(str(col), w, '^')} |" for col, w in zip(columns, widths)))
+    print(separator)
+    count = 0
+    for row in chain(sample, rows):
+        print("|" + "".join(f" {_fit(str(value), w)} |" for value, w in zip(row, widths)))
+        count += 1
+        if page_size and count % page_size == 0:
+            answer = input(f"-- 已显示 {count} 行，回车继续，q 停止 -- ").strip().lower()
+            if answer in ('q', 'quit'):
+                print(separator)
+                return count, True
+    print(separator)
+    return count, False
+
+def iter_cursor(cursor, size=CLI_FETCH_SIZE):
+    """按批读取游标，逐行产出"""
+    while True:
+        batch = cursor.fetchmany(size)
+        if not batch:
+            return
+        yield from batch
+
 def print_results(results):
     """打印查询结果"""
     if results is None:
@@ -160,39 +305,25 @@ def print_results(results):
         return
     
     data = results['data']
-    
-    # 获取列名
     columns = list(data[0].keys())
-    
-    # 计算列宽
-    col_widths = {}
-    for col in columns:
-        header_len = len(str(col))
-        max_data_len = max([len(str(row.get(col, ''))) for row in data])
-        col_widths[col] = max(header_len, max_data_len) + 2
-    
-    # 打印分隔线
-    total_width = sum(col_widths.values()) + len(columns) + 1
-    print("=" * total_width)
-    
-    # 打印表头
-    header = "|"
-    for col in columns:
-        header += f" {str(col):^{col_widths[col]-2}} |"
-    print(header)
-    print("=" * total_width)
-    
-    # 打印数据
-    for row in data:
-        line = "|"
-        for col in columns:
-            val = str(row.get(col, ''))[:col_widths[col]-2]
-            line += f" {val:<{col_widths[col]-2}} |"
-        print(line)
-    
-    print("=" * total_width)
+    render_table(columns, (tuple(row.get(col) for col in columns) for row in data))
     print(f"📊  共 {results['count']} 条记录 {'(来自缓存)' if results['cache_hit'] else ''}")
 
+def print_timings(timer):
+    """打印本次查询各阶段耗时"""
+    if timer.stages:
+        print("⏱️   耗时: " + " | ".join(f"{name} {ms:.1f}ms" for name, ms in timer.as_ms().items()))
+
+def show_cache_stats():
+    """本次会话累计的缓存命中统计"""
+    snapshot = sql_cache.snapshot()
+    l1 = snapshot.pop('l1')
+    print(f"📈  SQL 缓存（{'内存 + Redis' if sql_cache.redis else '内存'}）:")
+    for key, value in snapshot.items():
+        if key != 'name':
+            print(f"    {key}: {value}")
+    print(f"    L1 条目: {l1['entries']}，占用 {l1['bytes'] / 1024:.1f} KB，淘汰 {l1['evictions']}，过期 {l1['expirations']}")
+
 def show_help():
     """显示帮助信息"""
     print("""
@@ -211,13 +342,14 @@ def show_help():
 ║    /sql      - 直接执行 SQL 语句                             ║
 ║    /tables   - 查看所有表                                    ║
 ║    /schema   - 查看表结构                                    ║
+║    /stats    - 查看本次会话的缓存命中统计                    ║
 ║    /quit     - 退出程序                                      ║
 ╚══════════════════════════════════════════════════════════════╝
     """)
 
 def show_tables():
     """显示所有表"""
-    results = execute_sql("SHOW TABLES")
+    results = execute_sql("SHOW TABLES", guard=False)
     if results:
         print("📋  数据库中的表:")
         for row in results:
@@ -226,7 +358,7 @@ def show_tables():
 def show_schema():
     """显示表结构"""
     print("📐  ai_projects 表结构:")
-    results = execute_sql("DESCRIBE ai_projects")
+    results = execute_sql("DESCRIBE ai_projects", guard=False)
     if results:
         for row in results:
             print(f"   • {row['Field']}: {row['Type']} {row['Null']} {row['Key']}")
@@ -238,31 +370,186 @@ def direct_sql():
         return
     
     print(f"🔍  执行: {sql}")
-    results = execute_sql(sql)
-    
-    if results is not None:
-        print_results({
-            'sql': sql,
-            'data': results,
-            'cache_hit': False,
-            'count': len(results)
-        })
+    stream_sql(sql)
+
+def stream_sql(sql):
+    """非缓冲（服务端）游标执行并逐批输出：大表立即开始打印，内存占用与结果大小无关"""
+    conn = get_db_connection()
+    if not conn:
+        return
+    finished = False
+    try:
+        # 连接池默认自动提交；/sql 在显式事务中执行并且从不提交，UPDATE/DELETE 等修改最终回滚
+        conn.start_transaction()
+        cursor = conn.cursor(buffered=False)
+        cursor.execute(sql)
+        if cursor.description is None:
+            print(f"✅  执行完成，影响 {cursor.rowcount} 行")
+            conn.rollback()
+            print("⚠️  /sql 不提交修改，本次修改已回滚（DDL 语句除外）")
+            finished = True
+            return
+        columns = [d[0] for d in cursor.description]
+        count, stopped = render_table(columns, iter_cursor(cursor))
+        if count == 0:
+            print("📭  查询结果为空")
+        else:
+            print(f"📊  {'已显示' if stopped else '共'} {count} 条记录")
+        finished = not stopped
+        if finished:
+            cursor.close()
+    except Exception as e:
+        print(f"❌  SQL 执行失败: {e}")
+    finally:
+        # 中途停止时结果集未读完，直接丢弃连接，避免归还时把剩余行全部读完
+        if finished:
+            conn.close()
+        else:
+            conn.discard()
+
+# ========== 批量模式 ==========
+
+BATCH_WORKERS = int(os.getenv('CLI_BATCH_WORKERS', 8))
+BATCH_CSV_FIELDS = ['index', 'prompt', 'status', 'source', 'cache_hit', 'count', 'elapsed_ms', 'sql', 'error', 'timings']
+
+def read_prompts(path):
+    """每行一个问题，忽略空行与 # 开头的注释；path 为 - 时读取 stdin"""
+    stream = sys.stdin if path == '-' else open(path, encoding='utf-8')
+    try:
+        return [line.strip() for line in stream if line.strip() and not line.lstrip().startswith('#')]
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+def run_prompt(index, prompt, redis_client, include_data=False):
+    """批量模式中处理单个问题（在工作线程中执行），返回结果记录"""
+    timer = start_request_timer()
+    start = time.perf_counter()
+    record = {'index': index, 'prompt': prompt}
+    try:
+        results = query_with_cache(prompt, redis_client, raise_errors=True)
+        record.update(status='success', source=results['source'], cache_hit=results['cache_hit'],
+                      count=results['count'], sql=results['sql'], error=None)
+        if include_data:
+            record['data'] = results['data']
+    except Exception as e:
+        record.update(status='error', source=None, cache_hit=False, count=0, sql=None, error=str(e))
+    record['elapsed_ms'] = round((time.perf_counter() - start) * 1000, 3)
+    record['timings'] = timer.as_ms()
+    return record
+
+def write_record(writer, record, stream):
+    """writer 为 csv.DictWriter 时写 CSV 行，否则写一行 JSON"""
+    if writer:
+        row = dict(record, timings=json.dumps(record['timings'], ensure_ascii=False))
+        writer.writerow({k: row.get(k) for k in BATCH_CSV_FIELDS})
+    else:
+        stream.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+
+def _percentile(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+def run_batch(args):
+    """
+    批量模式：工作线程并发处理，所有问题共用一个 Redis 客户端与连接池
+    结果按输入顺序写出（JSONL 每行一条 / CSV），最后在 stderr 打印汇总；有失败时返回 1
+    """
+    prompts = read_prompts(args.batch)
+    output_format = args.format or ('csv' if args.output and args.output.endswith('.csv') else 'jsonl')
+    out = sys.stdout if args.output in (None, '-') else open(args.output, 'w', encoding='utf-8', newline='')
+    # 过程日志与结果分开：日志改到 stderr，--quiet 时丢弃
+    log_stream = open(os.devnull, 'w') if args.quiet else sys.stderr
+    writer = csv.DictWriter(out, fieldnames=BATCH_CSV_FIELDS) if output_format == 'csv' else None
+    if writer:
+        writer.writeheader()
+
+    counts = {'success': 0, 'error': 0}
+    sources = {}
+    latencies = []
+    start = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(log_stream):
+            if not init_session():
+                return 1
+            redis_client = get_session_redis()
+            print(f"📦  批量模式: {len(prompts)} 个问题，{args.workers} 个并发")
+            try:
+                with ThreadPoolExecutor(max_workers=args.workers) as executor:
+                    # map 按输入顺序返回结果，便于与上一次回归结果逐行对比
+                    records = executor.map(
+                        lambda index, prompt: run_prompt(index, prompt, redis_client, args.include_data),
+                        range(1, len(prompts) + 1), prompts,
+                    )
+                    for record in records:
+                        write_record(writer, record, out)
+                        counts[record['status']] += 1
+                        if record['source']:
+                            sources[record['source']] = sources.get(record['source'], 0) + 1
+                        latencies.append(record['elapsed_ms'])
+            finally:
+                close_session_redis()
+    finally:
+        if out is sys.stdout:
+            out.flush()
+        else:
+            out.close()
+        if args.quiet:
+            log_stream.close()
+
+    elapsed = time.perf_counter() - start
+    print(f"✅  批量完成: {len(prompts)} 个问题，成功 {counts['success']}，失败 {counts['error']}，"
+          f"耗时 {elapsed:.1f}s（{len(prompts) / elapsed if elapsed else 0:.1f} 个/秒）", file=sys.stderr)
+    print(f"   来源分布: {sources}  p50 {_percentile(latencies, 0.5):.0f}ms  "
+          f"p95 {_percentile(latencies, 0.95):.0f}ms", file=sys.stderr)
+    return 1 if counts['error'] else 0
+
+def init_session():
+    """测试数据库连接并加载实体词典与表结构目录；MySQL 不可用时返回 False"""
+    conn = get_db_connection()
+    if not conn:
+        print("❌  MySQL 连接失败，请检查配置")
+        return False
+    print("✅  MySQL 连接成功!")
+    try:
+        # 规则快速通道依赖实体词典识别架构师、状态等取值
+        print(f"📚  实体词典已加载: {entity_dictionary.load(conn)} 个取值")
+    except Exception as e:
+        print(f"⚠️  实体词典加载失败: {e}")
+    try:
+        # 提示词只带与问题相关的表结构
+        print(f"📐  表结构目录已加载: {schema_catalog.load(conn)} 张表")
+    except Exception as e:
+        print(f"⚠️  表结构目录加载失败（使用内置表结构）: {e}")
+    conn.close()
+    return True
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="AI 数据库查询助手 - 终端版")
+    parser.add_argument('--batch', metavar='PATH', help="批量模式：问题文件（每行一个），- 表示从 stdin 读取")
+    parser.add_argument('--workers', type=int, default=BATCH_WORKERS, help="批量模式并发数")
+    parser.add_argument('--output', '-o', help="结果输出文件（默认 stdout）；.csv 结尾时输出 CSV")
+    parser.add_argument('--format', choices=('jsonl', 'csv'), help="输出格式（默认按输出文件扩展名判断）")
+    parser.add_argument('--include-data', action='store_true', help="JSONL 输出中包含查询结果行")
+    parser.add_argument('--quiet', '-q', action='store_true', help="不输出过程日志")
+    return parser.parse_args()
 
 def main():
     """主程序"""
+    args = parse_args()
+    if args.batch:
+        sys.exit(run_batch(args))
+
     show_help()
     
-    # 测试数据库连接
-    conn = get_db_connection()
-    if conn:
-        print("✅  MySQL 连接成功!")
-        conn.close()
-    else:
-        print("❌  MySQL 连接失败，请检查配置")
+    # 测试数据库连接，加载实体词典与表结构目录
+    if not init_session():
         return
     
-    # 测试 Redis（这里调用 get_redis_client 会自动打印连接状态）
-    get_redis_client()
+    # 连接 Redis（会打印连接状态），整个会话共用这一个客户端
+    get_session_redis()
     
     print("\n" + "="*60)
     
@@ -291,6 +578,10 @@ def main():
                 show_schema()
                 continue
             
+            if user_input.lower() == '/stats':
+                show_cache_stats()
+                continue
+            
             if user_input.lower() == '/sql':
                 direct_sql()
                 continue
@@ -299,12 +590,14 @@ def main():
             print(f"\n🔎  正在查询: {user_input}")
             print("-" * 60)
             
+            timer = start_request_timer()
             results = query_with_cache(user_input)
             
             if results:
                 print_results(results)
             else:
                 print("❌  查询失败")
+            print_timings(timer)
                 
         except KeyboardInterrupt:
             print("\n\n👋  再见!")
@@ -312,5 +605,7 @@ def main():
         except Exception as e:
             print(f"❌  错误: {e}")
 
+    close_session_redis()
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,113 @@
+"""
+列式响应 - {columns, types, rows: [[...]]}，列名每个结果只出现一次
+直接使用元组游标的行，不构造字典；用 orjson 编码（日期原生支持，Decimal 经 json_default 转为数值）
+宽表 SELECT * 的响应体积与序列化耗时都明显小于逐行字典
+"""
+
+import datetime
+import decimal
+import json
+import orjson
+from mysql.connector import FieldType
+from result_cache import json_default
+
+# MySQL 字段类型 -> 响应中的类型名；BLOB 系列（TEXT 列也报告为 BLOB）等不确定的类型按取值推断
+_FIELD_TYPES = {
+    'TINY': 'int', 'SHORT': 'int', 'LONG': 'int', 'LONGLONG': 'int', 'INT24': 'int', 'YEAR': 'int',
+    'DECIMAL': 'decimal', 'NEWDECIMAL': 'decimal',
+    'FLOAT': 'float', 'DOUBLE': 'float',
+    'DATE': 'date', 'NEWDATE': 'date',
+    'DATETIME': 'datetime', 'TIMESTAMP': 'datetime',
+    'TIME': 'time',
+    'VARCHAR': 'string', 'VAR_STRING': 'string', 'STRING': 'string', 'ENUM': 'string', 'SET': 'string',
+    'JSON': 'json',
+}
+
+
+def _value_type(value):
+    # bool 是 int 的子类，datetime 是 date 的子类，先判断子类
+    if isinstance(value, bool):
+        return 'bool'
+    if isinstance(value, int):
+        return 'int'
+    if isinstance(value, decimal.Decimal):
+        return 'decimal'
+    if isinstance(value, float):
+        return 'float'
+    if isinstance(value, datetime.datetime):
+        return 'datetime'
+    if isinstance(value, datetime.date):
+        return 'date'
+    if isinstance(value, datetime.timedelta):
+        return 'time'
+    if isinstance(value, (bytes, bytearray)):
+        return 'bytes'
+    return 'string'
+
+
+def infer_types(rows, count):
+    """按每列第一个非 NULL 值推断类型；整列为 NULL 时为 'null'"""
+    types = [None] * count
+    missing = count
+    for row in rows:
+        for i, value in enumerate(row):
+            if types[i] is None and value is not None:
+                types[i] = _value_type(value)
+                missing -= 1
+        if not missing:
+            break
+    return [t or 'null' for t in types]
+
+
+def column_types(description, rows):
+    """由游标 description 的 type_code 得出列类型，无法确定的列按取值推断"""
+    types = []
+    for column in description:
+        try:
+            types.append(_FIELD_TYPES.get(FieldType.get_info(column[1])))
+        except Exception:
+            types.append(None)
+    if None in types:
+        inferred = infer_types(rows, len(types))
+        types = [t or inferred[i] for i, t in enumerate(types)]
+    return types
+
+
+class ColumnarResult:
+    """列式结果集；rows 为游标返回的元组列表"""
+
+    __slots__ = ('columns', 'types', 'rows')
+
+    def __init__(self, columns, types, rows):
+        self.columns = columns
+        self.types = types
+        self.rows = rows
+
+    @classmethod
+    def from_cursor(cls, cursor, rows):
+        columns = [d[0] for d in cursor.description or ()]
+        return cls(columns, column_types(cursor.description or (), rows), rows)
+
+    @classmethod
+    def from_dicts(cls, rows):
+        """字典行 -> 列式（用于写结果缓存，两种响应格式共用同一条目）"""
+        columns = list(rows[0].keys()) if rows else []
+        values = [[row[c] for c in columns] for row in rows]
+        return cls(columns, infer_types(values, len(columns)), values)
+
+    def encode(self):
+        """结果缓存格式，与 result_cache.encode_rows 相同并多存一份类型 "t" """
+        payload = {'c': self.columns, 't': self.types, 'r': self.rows}
+        return json.dumps(payload, ensure_ascii=False, separators=(',', ':'), default=json_default)
+
+    @classmethod
+    def decode(cls, payload):
+        """读取结果缓存；没有类型的旧条目按取值推断"""
+        data = json.loads(payload)
+        rows = data['r']
+        return cls(data['c'], data.get('t') or infer_types(rows, len(data['c'])), rows)
+
+
+def dumps(payload):
+    """orjson 编码；返回 bytes"""
+    return orjson.dumps(payload, default=json_default)
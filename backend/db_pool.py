@@ -0,0 +1,253 @@
+"""
+MySQL 连接池 - /ask 接口与终端版共享
+支持：固定大小 + 溢出连接、借出时健康检查、连接最大存活时间回收、等待时长与利用率统计
+"""
+
+import os
+import threading
+import time
+import mysql.connector
+from dotenv import load_dotenv
+
+# 加载环境变量（从 config/.env 读取）
+env_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'config', '.env')
+load_dotenv(env_path)
+
+# MySQL 数据库配置（读取火山引擎 RDS 配置）
+DB_CONFIG = {
+    'host': os.getenv('DB_HOST', 'localhost'),
+    'port': int(os.getenv('DB_PORT', 3306)),
+    'user': os.getenv('DB_USER', 'root'),
+    'password': os.getenv('DB_PASSWORD', ''),
+    'database': os.getenv('DB_NAME', 'demo_db'),
+    'charset': 'utf8mb4'
+}
+
+# 连接池配置
+POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 5))                 # 常驻连接数
+POOL_MAX_OVERFLOW = int(os.getenv('DB_POOL_MAX_OVERFLOW', 10))  # 高峰期允许额外创建的连接数
+POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 30))        # 借连接最长等待秒数
+POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', 3600))        # 连接最大存活秒数（<=0 不回收）
+POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'true').lower() in ('1', 'true', 'yes')
+# 池中连接用于只读查询：自动提交，避免归还的连接停留在旧的 REPEATABLE READ 快照上；
+# 需要写入的调用方应显式 start_transaction() 并自行提交（归还时未结束的事务一律回滚）
+POOL_AUTOCOMMIT = os.getenv('DB_POOL_AUTOCOMMIT', 'true').lower() in ('1', 'true', 'yes')
+
+
+class PoolTimeoutError(Exception):
+    """等待空闲连接超时"""
+
+
+class PooledConnection:
+    """借出的连接代理：close() 归还连接池而不是真正断开"""
+
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+
+    def close(self):
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            self._pool.release(conn)
+
+    def discard(self):
+        """连接已损坏时调用，直接关闭不再放回池中"""
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            self._pool.release(conn, discard=True)
+
+    def __getattr__(self, name):
+        if self._conn is None:
+            raise mysql.connector.errors.OperationalError("连接已归还连接池")
+        return getattr(self._conn, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class ConnectionPool:
+    """线程安全的有界连接池"""
+
+    def __init__(self, config, size=POOL_SIZE, max_overflow=POOL_MAX_OVERFLOW,
+                 timeout=POOL_TIMEOUT, recycle=POOL_RECYCLE, pre_ping=POOL_PRE_PING,
+                 autocommit=POOL_AUTOCOMMIT):
+        self.config = dict(config)
+        self.config.setdefault('autocommit', autocommit)
+        self.size = size
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        self.recycle = recycle
+        self.pre_ping = pre_ping
+
+        self._cond = threading.Condition()
+        self._idle = []          # [(conn, created_at)]，后进先出，保持热连接
+        self._created_at = {}    # id(conn) -> 创建时间
+        self._open = 0           # 当前已打开（空闲 + 借出）的连接数
+        self._checked_out = 0
+
+        # 统计信息
+        self._checkouts = 0
+        self._waits = 0
+        self._wait_time_total = 0.0
+        self._wait_time_max = 0.0
+        self._timeouts = 0
+        self._recycled = 0
+        self._ping_failures = 0
+
+    @property
+    def limit(self):
+        return self.size + self.max_overflow
+
+    def _connect(self):
+        return mysql.connector.connect(**self.config)
+
+    def _close_quietly(self, conn):
+        self._created_at.pop(id(conn), None)
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _is_usable(self, conn, created_at):
+        """检查连接是否超过存活时间、是否仍然可用"""
+        if self.recycle > 0 and time.monotonic() - created_at > self.recycle:
+            self._recycled += 1
+            return False
+        if self.pre_ping:
+            try:
+                conn.ping(reconnect=False)
+            except Exception:
+                self._ping_failures += 1
+                return False
+        return True
+
+    def acquire(self):
+        """借出一个连接，池满时最多等待 timeout 秒"""
+        start = time.monotonic()
+        deadline = start + self.timeout
+        waited = False
+
+        while True:
+            conn = None
+            created_at = None
+            with self._cond:
+                while True:
+                    if self._idle:
+                        conn, created_at = self._idle.pop()
+                        break
+                    if self._open < self.limit:
+                        self._open += 1
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._timeouts += 1
+                        raise PoolTimeoutError(
+                            f"等待数据库连接超时（{self.timeout}s），当前已借出 {self._checked_out}/{self.limit}"
+                        )
+                    waited = True
+                    self._cond.wait(remaining)
+
+            if conn is None:
+                # 新建连接（在锁外进行，避免握手阻塞其他线程）
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._cond:
+                        self._open -= 1
+                        self._cond.notify()
+                    raise
+                created_at = time.monotonic()
+                self._created_at[id(conn)] = created_at
+            elif not self._is_usable(conn, created_at):
+                self._close_quietly(conn)
+                with self._cond:
+                    self._open -= 1
+                    self._cond.notify()
+                continue
+
+            wait_time = time.monotonic() - start
+            with self._cond:
+                self._checked_out += 1
+                self._checkouts += 1
+                if waited:
+                    self._waits += 1
+                self._wait_time_total += wait_time
+                self._wait_time_max = max(self._wait_time_max, wait_time)
+            return PooledConnection(self, conn)
+
+    def release(self, conn, discard=False):
+        """归还连接；超出常驻数量的溢出连接直接关闭"""
+        if not discard:
+            try:
+                # 丢弃未读取完的结果集，避免污染下一个借用者
+                if conn.unread_result:
+                    conn.consume_results()
+                # 借用者未提交的修改不会随连接带给下一个借用者，也不会被自动提交
+                if conn.in_transaction:
+                    conn.rollback()
+            except Exception:
+                discard = True
+
+        with self._cond:
+            self._checked_out -= 1
+            created_at = self._created_at.get(id(conn), time.monotonic())
+            if discard or len(self._idle) >= self.size:
+                self._open -= 1
+                close = True
+            else:
+                self._idle.append((conn, created_at))
+                close = False
+            self._cond.notify()
+
+        if close:
+            self._close_quietly(conn)
+
+    def connection(self):
+        """with get_pool().connection() as conn: ..."""
+        return self.acquire()
+
+    def stats(self):
+        """连接池状态：利用率与等待时长"""
+        with self._cond:
+            return {
+                'size': self.size,
+                'max_overflow': self.max_overflow,
+                'open': self._open,
+                'idle': len(self._idle),
+                'checked_out': self._checked_out,
+                'utilization': round(self._checked_out / self.limit, 4) if self.limit else 0.0,
+                'checkouts': self._checkouts,
+                'waits': self._waits,
+                'wait_time_avg_ms': round(self._wait_time_total / self._checkouts * 1000, 3) if self._checkouts else 0.0,
+                'wait_time_max_ms': round(self._wait_time_max * 1000, 3),
+                'timeouts': self._timeouts,
+                'recycled': self._recycled,
+                'ping_failures': self._ping_failures,
+            }
+
+    def dispose(self):
+        """关闭所有空闲连接（借出中的连接归还时再关闭）"""
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._open -= len(idle)
+        for conn, _ in idle:
+            self._close_quietly(conn)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """获取进程内共享的连接池（延迟初始化）"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(DB_CONFIG)
+                print(f"📌 MySQL 连接池已创建: size={POOL_SIZE}, max_overflow={POOL_MAX_OVERFLOW}, "
+                      f"recycle={POOL_RECYCLE}s, pre_ping={POOL_PRE_PING}")
+    return _pool
@@ -0,0 +1,81 @@
+"""
+实体词典 - 从 ai_projects 的去重取值中识别 prompt 里的实体（架构师、状态、行业等）
+供规则快速通道与 SQL 模板缓存识别"只是字面量不同"的问题
+"""
+
+import re
+import threading
+from prompt_normalizer import normalize_prompt
+
+# 参与识别的列（取值较少、常出现在查询条件中）
+ENTITY_COLUMNS = ('architect_name', 'status', 'client_industry', 'ai_tools_used')
+# 一格存多个取值的列及其分隔符，如 ai_tools_used = "Sora, Runway, Pika"
+MULTI_VALUE_COLUMNS = {'ai_tools_used': re.compile(r'\s*[,，、]\s*')}
+
+
+class EntityDictionary:
+    """规范化取值 -> (列名, 原始取值) 的词典，按最长匹配查找"""
+
+    def __init__(self, columns=ENTITY_COLUMNS):
+        self.columns = columns
+        self._values = {}
+        self._pattern = None
+        self._lock = threading.Lock()
+
+    def load(self, conn, table='ai_projects', max_values=5000):
+        """从数据库加载各列去重取值；同一个值出现在多列时有歧义，不参与识别"""
+        values = {}
+        ambiguous = set()
+        cursor = conn.cursor()
+        try:
+            for column in self.columns:
+                cursor.execute(
+                    f"SELECT DISTINCT `{column}` FROM `{table}` WHERE `{column}` IS NOT NULL LIMIT {int(max_values)}"
+                )
+                separator = MULTI_VALUE_COLUMNS.get(column)
+                for (cell,) in cursor.fetchall():
+                    for value in (separator.split(str(cell)) if separator else [str(cell)]):
+                        key = normalize_prompt(value)
+                        if not key:
+                            continue
+                        if key in values and values[key][0] != column:
+                            ambiguous.add(key)
+                        values[key] = (column, value)
+        finally:
+            cursor.close()
+
+        for key in ambiguous:
+            values.pop(key, None)
+        self.set_values(values)
+        return len(values)
+
+    def set_values(self, values):
+        """直接设置词典（规范化取值 -> (列名, 原始取值)）"""
+        pattern = None
+        if values:
+            # 长词优先，避免 "张三丰" 被拆成 "张三"
+            alternation = '|'.join(re.escape(v) for v in sorted(values, key=len, reverse=True))
+            pattern = re.compile(alternation)
+        with self._lock:
+            self._values = values
+            self._pattern = pattern
+
+    def find(self, text):
+        """返回 [(start, end, 列名, 原始取值)]，互不重叠"""
+        with self._lock:
+            pattern, values = self._pattern, self._values
+        if pattern is None:
+            return []
+        return [(m.start(), m.end()) + values[m.group(0)] for m in pattern.finditer(text)]
+
+    def values_of(self, column):
+        """某列的全部原始取值"""
+        with self._lock:
+            return [original for col, original in self._values.values() if col == column]
+
+    def __len__(self):
+        return len(self._values)
+
+
+# 进程内共享的实体词典
+entity_dictionary = EntityDictionary()
@@ -0,0 +1,166 @@
+"""
+执行前代价检查 - 用 EXPLAIN FORMAT=JSON 估算 LLM 生成 SQL 的代价，超出预算直接拒绝
+- 估算扫描行数 / query_cost 超过阈值：拒绝执行（笛卡尔积、无索引大表扫描等）
+- 判定结果按规范化 SQL 缓存，相同 SQL 不重复 EXPLAIN
+- 执行时加 MAX_EXECUTION_TIME 优化器提示，单条语句超时由 MySQL 主动终止
+"""
+
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from result_cache import normalize_sql
+
+EXPLAIN_GUARD_ENABLED = os.getenv('EXPLAIN_GUARD_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+MAX_EST_ROWS = int(os.getenv('SQL_MAX_EST_ROWS', 5000000))
+MAX_QUERY_COST = float(os.getenv('SQL_MAX_QUERY_COST', 1000000))
+MAX_EXECUTION_MS = int(os.getenv('SQL_MAX_EXECUTION_MS', 10000))
+VERDICT_CACHE_SIZE = int(os.getenv('EXPLAIN_VERDICT_CACHE_SIZE', 5000))
+# 表统计信息会变化，判定结果只复用一段时间
+VERDICT_TTL = int(os.getenv('EXPLAIN_VERDICT_TTL', 600))
+
+_LEADING_SELECT_RE = re.compile(r'^\s*SELECT\b', re.IGNORECASE)
+
+
+class QueryTooExpensiveError(Exception):
+    """EXPLAIN 估算代价超出预算"""
+
+
+def apply_execution_timeout(sql, max_ms=MAX_EXECUTION_MS):
+    """在 SELECT 后插入 MAX_EXECUTION_TIME 提示；非 SELECT 开头或已带提示的语句保持不变"""
+    if max_ms <= 0 or 'MAX_EXECUTION_TIME' in sql.upper():
+        return sql
+    m = _LEADING_SELECT_RE.match(sql)
+    if not m:
+        return sql
+    return f"{sql[:m.end()]} /*+ MAX_EXECUTION_TIME({int(max_ms)}) */{sql[m.end():]}"
+
+
+def _walk_plan(node, prefix_rows, totals):
+    """遍历 EXPLAIN JSON，按嵌套循环累计估算扫描行数；返回本节点产出行数"""
+    if isinstance(node, list):
+        produced = prefix_rows
+        for item in node:
+            produced = _walk_plan(item, prefix_rows, totals)
+        return produced
+    if not isinstance(node, dict):
+        return prefix_rows
+
+    if 'nested_loop' in node:
+        produced = prefix_rows
+        for item in node['nested_loop']:
+            # 连接中后一张表的扫描次数 = 前面已产出的行数
+            produced = _walk_plan(item, produced, totals)
+        return produced
+
+    if 'table' in node and isinstance(node['table'], dict):
+        table = node['table']
+        examined = float(table.get('rows_examined_per_scan', 0) or 0)
+        totals['rows'] += examined * max(prefix_rows, 1)
+        totals['tables'].append(table.get('table_name'))
+        if table.get('access_type') == 'ALL':
+            totals['full_scans'].append(table.get('table_name'))
+        # 派生表 / 子查询
+        for key in ('materialized_from_subquery', 'attached_subqueries'):
+            if key in table:
+                _walk_plan(table[key], 1, totals)
+        return float(table.get('rows_produced_per_join', examined) or 0)
+
+    produced = prefix_rows
+    for key, value in node.items():
+        if isinstance(value, (dict, list)):
+            produced = _walk_plan(value, prefix_rows, totals)
+    return produced
+
+
+def analyze_plan(plan):
+    """从 EXPLAIN FORMAT=JSON 结果中提取 query_cost 与估算扫描行数"""
+    query_block = plan.get('query_block', plan)
+    cost = float(query_block.get('cost_info', {}).get('query_cost', 0) or 0)
+    totals = {'rows': 0.0, 'tables': [], 'full_scans': []}
+    _walk_plan(query_block, 1, totals)
+    return {
+        'cost': cost,
+        'rows': int(totals['rows']),
+        'tables': totals['tables'],
+        'full_scans': totals['full_scans'],
+    }
+
+
+def explain(conn, sql, params=None):
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"EXPLAIN FORMAT=JSON {sql}", params)
+        row = cursor.fetchone()
+        return json.loads(row[0])
+    finally:
+        cursor.close()
+
+
+class CostGuard:
+    """EXPLAIN 代价检查，判定结果按规范化 SQL 缓存"""
+
+    def __init__(self, max_rows=MAX_EST_ROWS, max_cost=MAX_QUERY_COST,
+                 cache_size=VERDICT_CACHE_SIZE, ttl=VERDICT_TTL):
+        self.max_rows = max_rows
+        self.max_cost = max_cost
+        self.cache_size = cache_size
+        self.ttl = ttl
+        self._verdicts = OrderedDict()
+        self._lock = threading.Lock()
+        self.checks = 0
+        self.cache_hits = 0
+        self.rejections = 0
+
+    def _cache_key(self, sql, params):
+        return normalize_sql(sql), tuple(params) if params else None
+
+    def verdict(self, conn, sql, params=None):
+        """返回 {'allowed', 'cost', 'rows', 'reason', ...}"""
+        key = self._cache_key(sql, params)
+        now = time.monotonic()
+        with self._lock:
+            self.checks += 1
+            cached = self._verdicts.get(key)
+            if cached and now - cached[0] < self.ttl:
+                self._verdicts.move_to_end(key)
+                self.cache_hits += 1
+                return cached[1]
+
+        stats = analyze_plan(explain(conn, sql, params))
+        reason = ''
+        if stats['rows'] > self.max_rows:
+            reason = f"预估扫描 {stats['rows']} 行，超过上限 {self.max_rows}"
+        elif stats['cost'] > self.max_cost:
+            reason = f"预估代价 {stats['cost']:.0f}，超过上限 {self.max_cost:.0f}"
+        result = {**stats, 'allowed': not reason, 'reason': reason}
+
+        with self._lock:
+            self._verdicts[key] = (now, result)
+            self._verdicts.move_to_end(key)
+            while len(self._verdicts) > self.cache_size:
+                self._verdicts.popitem(last=False)
+        return result
+
+    def check(self, conn, sql, params=None):
+        """超出预算时抛出 QueryTooExpensiveError"""
+        result = self.verdict(conn, sql, params)
+        if not result['allowed']:
+            with self._lock:
+                self.rejections += 1
+            raise QueryTooExpensiveError(f"查询被拒绝：{result['reason']}（全表扫描: {result['full_scans'] or '无'}）")
+        return result
+
+    def stats(self):
+        return {
+            'enabled': EXPLAIN_GUARD_ENABLED,
+            'max_est_rows': self.max_rows,
+            'max_query_cost': self.max_cost,
+            'max_execution_ms': MAX_EXECUTION_MS,
+            'checks': self.checks,
+            'cache_hits': self.cache_hits,
+            'rejections': self.rejections,
+            'cached_verdicts': len(self._verdicts),
+        }
@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+索引建议工具 - 基于查询日志中真实生成的 SQL，为 ai_projects 推荐索引
+1. 统计 WHERE（等值 / 范围）、ORDER BY、GROUP BY 中出现的列及频次
+2. 生成单列与组合候选索引（等值列在前，范围/排序列在后）
+3. 在抽样副本表上逐个加索引，用 EXPLAIN 对比整个负载的预估扫描行数
+4. 按预计节省排序输出 DDL，--apply 时直接建到正式表
+
+用法:
+    python index_advisor.py                     # 分析 logs/queries.jsonl，抽样 10 万行评估
+    python index_advisor.py --sample 500000 --top 3
+    python index_advisor.py --no-evaluate       # 不建临时表，只按出现频次排序
+    python index_advisor.py --apply             # 把排名前 N 的建议建到正式表
+"""
+
+import argparse
+import re
+from collections import Counter, OrderedDict
+from db_pool import get_pool
+from explain_guard import explain, analyze_plan
+from query_log import read_query_log, QUERY_LOG_PATH
+from result_cache import normalize_sql
+from sql_guard import clause_text
+
+_PREDICATE_RE = re.compile(
+    r"(?:`?\w+`?\.)?`?(\w+)`?\s*"
+    r"(<=>|>=|<=|!=|<>|=|>|<|\bNOT\s+IN\b|\bIN\b|\bBETWEEN\b|\bNOT\s+LIKE\b|\bLIKE\b|\bIS\b)"
+    r"\s*('(?:[^']|'')*'|\S+)?",
+    re.IGNORECASE,
+)
+_EQUALITY_OPS = {'=', '<=>', 'IN', 'IS'}
+_RANGE_OPS = {'>', '<', '>=', '<=', 'BETWEEN', 'LIKE'}
+MAX_INDEX_COLUMNS = 3
+
+
+def load_workload(path, table):
+    """读取查询日志，返回 {规范化 SQL: 出现次数}（只保留涉及目标表的 SELECT）"""
+    pattern = re.compile(rf'\b{re.escape(table)}\b', re.IGNORECASE)
+    workload = Counter()
+    for entry in read_query_log(path):
+        sql = entry.get('sql') or ''
+        if sql.lstrip().upper().startswith('SELECT') and pattern.search(sql):
+            workload[normalize_sql(sql)] += 1
+    return workload
+
+
+def _column_list(text, columns):
+    names = []
+    for item in text.split(','):
+        m = re.match(r'\s*(?:`?\w+`?\.)?`?(\w+)`?', item)
+        if m and m.group(1).lower() in columns:
+            names.append(columns[m.group(1).lower()])
+    return names
+
+
+def extract_shape(sql, columns):
+    """提取一条 SQL 的等值列、范围列、排序列、分组列；columns 为 {小写列名: 列名}"""
+    equality, ranges = [], []
+    for m in _PREDICATE_RE.finditer(clause_text(sql, 'WHERE')):
+        column = columns.get(m.group(1).lower())
+        if column is None:
+            continue
+        op = ' '.join(m.group(2).upper().split())
+        literal = m.group(3) or ''
+        if op in _EQUALITY_OPS and column not in equality:
+            equality.append(column)
+        elif op in _RANGE_OPS and column not in ranges:
+            # 以 % 开头的 LIKE 无法使用 B+ 树索引
+            if op == 'LIKE' and literal.startswith("'%"):
+                continue
+            ranges.append(column)
+    return {
+        'equality': equality,
+        'range': [c for c in ranges if c not in equality],
+        'order': _column_list(clause_text(sql, 'ORDER BY'), columns),
+        'group': _column_list(clause_text(sql, 'GROUP BY'), columns),
+    }
+
+
+def candidate_indexes(shape):
+    """由一条 SQL 的列使用情况生成候选索引（列元组）"""
+    equality = shape['equality'][:MAX_INDEX_COLUMNS]
+    candidates = set()
+    for column in equality + shape['range'] + shape['order'][:1] + shape['group'][:1]:
+        candidates.add((column,))
+    if equality:
+        candidates.add(tuple(equality))
+        if shape['range']:
+            candidates.add(tuple(equality + shape['range'][:1])[:MAX_INDEX_COLUMNS])
+        elif shape['order']:
+            candidates.add(tuple(equality + [c for c in shape['order'] if c not in equality])[:MAX_INDEX_COLUMNS])
+    if len(shape['group']) > 1:
+        candidates.add(tuple(shape['group'][:MAX_INDEX_COLUMNS]))
+    return candidates
+
+
+def table_columns(conn, table):
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            "SELECT COLUMN_NAME FROM information_schema.COLUMNS WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+            (table,),
+        )
+        return {name.lower(): name for (name,) in cursor.fetchall()}
+    finally:
+        cursor.close()
+
+
+def existing_indexes(conn, table):
+    """已有索引的列元组列表"""
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            "SELECT INDEX_NAME, COLUMN_NAME FROM information_schema.STATISTICS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s ORDER BY INDEX_NAME, SEQ_IN_INDEX",
+            (table,),
+        )
+        indexes = OrderedDict()
+        for index_name, column in cursor.fetchall():
+            indexes.setdefault(index_name, []).append(column)
+        return [tuple(cols) for cols in indexes.values()]
+    finally:
+        cursor.close()
+
+
+def _is_covered(candidate, indexes):
+    """候选索引是某个已有索引的最左前缀时无需重复创建"""
+    return any(index[:len(candidate)] == candidate for index in indexes)
+
+
+def index_name(table, columns):
+    return f"idx_{table}_{'_'.join(columns)}"[:64]
+
+
+def index_ddl(table, columns):
+    cols = ', '.join(f"`{c}`" for c in columns)
+    return f"CREATE INDEX `{index_name(table, columns)}` ON `{table}` ({cols});"
+
+
+def _execute(conn, sql):
+    cursor = conn.cursor()
+    try:
+        cursor.execute(sql)
+        if cursor.with_rows:
+            cursor.fetchall()
+    finally:
+        cursor.close()
+
+
+def workload_rows(conn, workload, table, target):
+    """整个负载在 target 表上的预估扫描行数（按出现次数加权）；EXPLAIN 失败的 SQL 跳过"""
+    pattern = re.compile(rf'\b{re.escape(table)}\b')
+    total = 0
+    per_query = {}
+    for sql, count in workload.items():
+        try:
+            rows = analyze_plan(explain(conn, pattern.sub(target, sql)))['rows']
+        except Exception:
+            continue
+        per_query[sql] = rows
+        total += rows * count
+    return total, per_query
+
+
+def evaluate_candidates(conn, table, workload, candidates, sample):
+    """在抽样副本表上逐个评估候选索引，返回 {候选: 预计节省的扫描行数}"""
+    scratch = f"{table}__advisor"
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"SELECT COUNT(*) FROM `{table}`")
+        full_rows = cursor.fetchone()[0]
+    finally:
+        cursor.close()
+
+    print(f"🧪 创建抽样副本表 {scratch}（{min(sample, full_rows)} / {full_rows} 行）...")
+    _execute(conn, f"DROP TABLE IF EXISTS `{scratch}`")
+    _execute(conn, f"CREATE TABLE `{scratch}` LIKE `{table}`")
+    savings = {}
+    try:
+        _execute(conn, f"INSERT INTO `{scratch}` SELECT * FROM `{table}` LIMIT {int(sample)}")
+        _execute(conn, f"ANALYZE TABLE `{scratch}`")
+        sampled = min(sample, full_rows) or 1
+        # 抽样表上的节省量按比例放大到全表
+        scale = full_rows / sampled
+        baseline, _ = workload_rows(conn, workload, table, scratch)
+        for candidate in candidates:
+            name = index_name(table, candidate)
+            cols = ', '.join(f"`{c}`" for c in candidate)
+            _execute(conn, f"ALTER TABLE `{scratch}` ADD INDEX `{name}` ({cols})")
+            _execute(conn, f"ANALYZE TABLE `{scratch}`")
+            with_index, _ = workload_rows(conn, workload, table, scratch)
+            savings[candidate] = max(0, int((baseline - with_index) * scale))
+            _execute(conn, f"ALTER TABLE `{scratch}` DROP INDEX `{name}`")
+            print(f"   • {name}: 预计减少扫描 {savings[candidate]} 行")
+    finally:
+        _execute(conn, f"DROP TABLE IF EXISTS `{scratch}`")
+    return savings
+
+
+def advise(table='ai_projects', log_path=QUERY_LOG_PATH, sample=100000, top=5, evaluate=True, apply=False):
+    workload = load_workload(log_path, table)
+    if not workload:
+        print(f"📭 查询日志中没有涉及 {table} 的 SQL: {log_path}")
+        return []
+    print(f"📊 负载: {sum(workload.values())} 次查询，{len(workload)} 条不同 SQL")
+
+    conn = get_pool().acquire()
+    try:
+        columns = table_columns(conn, table)
+        indexes = existing_indexes(conn, table)
+
+        weights = Counter()
+        column_usage = Counter()
+        for sql, count in workload.items():
+            shape = extract_shape(sql, columns)
+            for kind, cols in shape.items():
+                for column in cols:
+                    column_usage[(kind, column)] += count
+            for candidate in candidate_indexes(shape):
+                if not _is_covered(candidate, indexes):
+                    weights[candidate] += count
+
+        print("🔎 列使用频次:")
+        for (kind, column), count in column_usage.most_common():
+            print(f"   • {column:<20} {kind:<9} {count}")
+        if not weights:
+            print("✅ 现有索引已覆盖所有候选，无需新增")
+            return []
+
+        if evaluate:
+            scores = evaluate_candidates(conn, table, workload, list(weights), sample)
+            ranked = sorted(weights, key=lambda c: (scores.get(c, 0), weights[c]), reverse=True)
+            ranked = [c for c in ranked if scores.get(c, 0) > 0]
+        else:
+            scores = {}
+            ranked = sorted(weights, key=lambda c: (weights[c], -len(c)), reverse=True)
+        ranked = ranked[:top]
+
+        print("\n📐 索引建议（按预计收益排序）:")
+        for rank, candidate in enumerate(ranked, 1):
+            saving = f"预计减少扫描 {scores[candidate]} 行" if candidate in scores else f"命中 {weights[candidate]} 次查询"
+            print(f"  {rank}. {index_ddl(table, candidate)}  -- {saving}")
+
+        if apply:
+            for candidate in ranked:
+                print(f"🔨 创建索引 {index_name(table, candidate)} ...")
+                _execute(conn, index_ddl(table, candidate).rstrip(';'))
+            print("✅ 索引已创建")
+        return ranked
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="基于查询日志的索引建议工具")
+    parser.add_argument('--table', default='ai_projects')
+    parser.add_argument('--log', default=QUERY_LOG_PATH, help="查询日志路径（JSONL）")
+    parser.add_argument('--sample', type=int, default=100000, help="抽样副本表行数")
+    parser.add_argument('--top', type=int, default=5, help="输出前 N 条建议")
+    parser.add_argument('--no-evaluate', action='store_true', help="不建抽样副本表，只按频次排序")
+    parser.add_argument('--apply', action='store_true', help="把建议的索引建到正式表")
+    args = parser.parse_args()
+    advise(args.table, args.log, args.sample, args.top, not args.no_evaluate, args.apply)
+
+
+if __name__ == "__main__":
+    main()
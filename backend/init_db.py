@@ -1,8 +1,31 @@
+#!/usr/bin/env python3
+"""
+初始化 MySQL 演示数据：建库建表，生成 AI 短漫剧项目数据并批量导入
+- NumPy 向量化生成，按块（--chunk-size）生成并导入，内存占用与总行数无关
+- 取值分布可配置：--skew 控制架构师/行业/工具的 Zipf 倾斜度（0 为均匀），--budget 选择预算分布
+- 导入方式：多行 INSERT（默认）或 LOAD DATA LOCAL INFILE（需服务端开启 local_infile），
+  --workers 多进程并行导入不同的块；二级索引在导入完成后创建（--index）
+- 每块使用 (seed, 块序号) 作为随机种子，相同参数生成的数据完全一致
+
+用法:
+    python init_db.py                                            # 默认 102 行演示数据
+    python init_db.py --rows 10000000 --method infile --workers 4 --index architect_name --index status,start_date
+    python init_db.py --rows 1000000 --skew 1.2 --budget lognormal
+    python init_db.py --rows 100000 --csv ../data/ai_projects_100k.csv   # 只生成 CSV，不连接 MySQL
+"""
+
+import argparse
+import csv
 import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
 import mysql.connector
-import random
-from datetime import datetime, timedelta
+import numpy as np
+import redis
 from dotenv import load_dotenv
+from index_advisor import index_name
+from result_cache import bump_data_version
 
 # 加载环境变量
 env_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'config', '.env')
@@ -18,81 +41,285 @@ DB_CONFIG = {
 }
 
 DB_NAME = os.getenv('DB_NAME', 'demo_db')
+TABLE = 'ai_projects'
+
+INDUSTRIES = ['科幻', '武侠', '悬疑', '都市', '二次元', '治愈', '惊悚']
+STATUSES = ['已交付', '制作中', '策划中', '后期中']
+TOOLS = ['Stable Diffusion', 'Midjourney', 'Sora', 'Runway', 'Pika', 'Claude 3.5', 'GPT-4o']
+ARCHITECTS = ['张三', '李四', '王五', '赵六', '孙七', '周八', '吴九']
+
+COLUMNS = [
+    'id', 'architect_name', 'project_name', 'client_industry', 'tech_stack', 'episode_count', 'total_budget',
+    'completion_rate', 'start_date', 'end_date', 'status', 'ai_tools_used', 'performance_score',
+]
+
+# 固定的演示数据（id 1、2），前端示例问题依赖这两行
+DEMO_ROWS = [
+    (1, '张三', '赛博都市：觉醒', '科幻', 'SD + Midjourney', 12, '150000.00', 100, '2023-01-10', '2023-03-10', '已交付', 'Runway Gen-2', '9.5'),
+    (2, '李四', '古风江湖：剑影', '武侠', 'ControlNet + Sora', 24, '300000.00', 80, '2023-04-15', '2023-08-15', '制作中', 'Pika Labs', '8.8'),
+]
+
+CREATE_TABLE_SQL = """
+CREATE TABLE ai_projects (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    architect_name VARCHAR(100) NOT NULL COMMENT '解决方案架构师姓名',
+    project_name VARCHAR(200) NOT NULL COMMENT 'AI短漫剧项目名称',
+    client_industry VARCHAR(100) COMMENT '客户行业',
+    tech_stack VARCHAR(255) COMMENT '技术栈',
+    episode_count INT COMMENT '剧集数量',
+    total_budget DECIMAL(15, 2) COMMENT '项目总预算',
+    completion_rate INT COMMENT '完成进度(%)',
+    start_date DATE COMMENT '开始日期',
+    end_date DATE COMMENT '交付日期',
+    status VARCHAR(50) COMMENT '当前状态',
+    ai_tools_used VARCHAR(255) COMMENT '使用的AI工具',
+    performance_score DECIMAL(3, 1) COMMENT '性能/评价得分'
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+"""
+
+DEFAULT_ROWS = 100
+DEFAULT_CHUNK_SIZE = int(os.getenv('INIT_DB_CHUNK_SIZE', 50000))
+
+
+def bump_cache_version():
+    """数据已重建，递增 Redis 中的数据版本号，让服务端的查询结果缓存失效"""
+    try:
+        client = redis.Redis(
+            host=os.getenv('REDIS_HOST', 'localhost'),
+            port=int(os.getenv('REDIS_PORT', 6379)),
+            username=os.getenv('REDIS_USER', 'default'),
+            password=os.getenv('REDIS_PASSWORD', ''),
+            db=int(os.getenv('REDIS_DB', 0)),
+            decode_responses=True,
+            socket_timeout=10
+        )
+        version = bump_data_version(client)
+        print(f"🔄 数据版本已更新为 {version}，结果缓存已失效")
+    except Exception as e:
+        print(f"⚠️ 数据版本更新失败（结果缓存将依赖 UPDATE_TIME 失效）: {e}")
+
+
+# ========== 数据生成 ==========
+
+def zipf_weights(n, skew):
+    """第 k 个取值的权重 ∝ 1 / k^skew；skew 为 0 时均匀分布"""
+    weights = 1.0 / np.arange(1, n + 1) ** skew
+    return weights / weights.sum()
+
+
+def _choice(rng, values, size, skew):
+    return np.asarray(values, dtype=object)[rng.choice(len(values), size=size, p=zipf_weights(len(values), skew))]
+
+
+def _sample_without_replacement(rng, values, size, k, skew):
+    """每行按权重不放回地抽 k 个（Gumbel-top-k），返回 ' + ' / ', ' 连接前的二维对象数组"""
+    keys = np.log(zipf_weights(len(values), skew)) + rng.gumbel(size=(size, len(values)))
+    picked = np.argsort(-keys, axis=1)[:, :k]
+    return np.asarray(values, dtype=object)[picked]
+
+
+def _money(cents):
+    return [f"{c // 100}.{c % 100:02d}" for c in cents.tolist()]
+
+
+def generate_chunk(start_id, size, seed, chunk_index, skew=0.0, budget='uniform', years=1):
+    """
+    生成 id 从 start_id 开始的 size 行，返回按 COLUMNS 顺序的列（均为 Python list，数值已格式化为字符串）
+    随机种子为 (seed, chunk_index)，同样的参数总是生成同样的数据，与并行方式无关
+    """
+    rng = np.random.default_rng([seed, chunk_index])
+    ids = np.arange(start_id, start_id + size)
+
+    tech = _sample_without_replacement(rng, TOOLS, size, 2, skew)
+    tools = _sample_without_replacement(rng, TOOLS, size, 3, skew)
+
+    if budget == 'lognormal':
+        # 中位数 15 万，长尾到数百万
+        budget_cents = np.clip(rng.lognormal(np.log(150000), 0.8, size), 10000, 1e9) * 100
+    else:
+        budget_cents = rng.uniform(50000, 500000, size) * 100
+    start = np.datetime64('2023-01-01') + rng.integers(0, 365 * years + 1, size).astype('timedelta64[D]')
+    end = start + rng.integers(30, 181, size).astype('timedelta64[D]')
+    # 得分 5.0 ~ 10.0，一位小数
+    score_tenths = rng.integers(50, 101, size)
+
+    return [
+        ids.tolist(),
+        _choice(rng, ARCHITECTS, size, skew).tolist(),
+        [f"AI短漫剧项目_{i}" for i in (ids - 2).tolist()],
+        _choice(rng, INDUSTRIES, size, skew).tolist(),
+        [' + '.join(pair) for pair in tech.tolist()],
+        rng.integers(5, 51, size).tolist(),
+        _money(np.round(budget_cents).astype(np.int64)),
+        rng.integers(0, 101, size).tolist(),
+        start.astype(str).tolist(),
+        end.astype(str).tolist(),
+        _choice(rng, STATUSES, size, 0.0).tolist(),
+        [', '.join(triple) for triple in tools.tolist()],
+        [f"{t // 10}.{t % 10}" for t in score_tenths.tolist()],
+    ]
+
+
+def plan_chunks(rows, chunk_size):
+    """生成的行 id 从 3 开始（1、2 为演示数据），返回 [(块序号, 起始 id, 行数)]"""
+    return [(i, 3 + offset, min(chunk_size, rows - offset)) for i, offset in enumerate(range(0, rows, chunk_size))]
+
+
+# ========== 导入 ==========
 
-def init_mysql_db():
+_PLACEHOLDERS = '(' + ', '.join(['%s'] * len(COLUMNS)) + ')'
+INSERT_SQL = f"INSERT INTO {TABLE} ({', '.join(COLUMNS)}) VALUES {_PLACEHOLDERS}"
+
+
+def _connect(local_infile=False):
+    config = dict(DB_CONFIG, database=DB_NAME)
+    if local_infile:
+        config['allow_local_infile'] = True
+    conn = mysql.connector.connect(**config)
+    cursor = conn.cursor()
+    # 导入期间跳过唯一性与外键检查（主键由生成器保证不重复）
+    cursor.execute("SET SESSION unique_checks = 0, foreign_key_checks = 0")
+    cursor.close()
+    return conn
+
+
+def _insert_rows(cursor, columns, batch_rows):
+    """多行 INSERT：executemany 会把 VALUES 改写为多行语句，每 batch_rows 行一条"""
+    rows = list(zip(*columns))
+    for start in range(0, len(rows), batch_rows):
+        cursor.executemany(INSERT_SQL, rows[start:start + batch_rows])
+
+
+def _load_infile(cursor, columns):
+    """把本块写成临时 TSV，再 LOAD DATA LOCAL INFILE（字段中不含制表符与换行，无需转义）"""
+    with tempfile.NamedTemporaryFile('w', encoding='utf-8', suffix='.tsv', delete=False) as f:
+        f.write('\n'.join('\t'.join(map(str, row)) for row in zip(*columns)))
+        f.write('\n')
+        path = f.name
+    try:
+        cursor.execute(
+            f"LOAD DATA LOCAL INFILE %s INTO TABLE {TABLE} CHARACTER SET utf8mb4 "
+            f"FIELDS TERMINATED BY '\\t' LINES TERMINATED BY '\\n' ({', '.join(COLUMNS)})",
+            (path,),
+        )
+    finally:
+        os.remove(path)
+
+
+def load_chunks(chunks, options):
+    """导入一组块（一个进程、一个连接），每块提交一次；返回导入行数"""
+    conn = _connect(local_infile=options['method'] == 'infile')
+    cursor = conn.cursor()
+    loaded = 0
+    try:
+        for chunk_index, start_id, size in chunks:
+            columns = generate_chunk(start_id, size, options['seed'], chunk_index,
+                                     options['skew'], options['budget'], options['years'])
+            if options['method'] == 'infile':
+                _load_infile(cursor, columns)
+            else:
+                _insert_rows(cursor, columns, options['batch_rows'])
+            conn.commit()
+            loaded += size
+    finally:
+        cursor.close()
+        conn.close()
+    return loaded
+
+
+def create_indexes(cursor, indexes):
+    """导入完成后一次性建二级索引，比边插入边维护索引快得多"""
+    for columns in indexes:
+        start = time.perf_counter()
+        cols = ', '.join(f"`{c}`" for c in columns)
+        cursor.execute(f"ALTER TABLE `{TABLE}` ADD INDEX `{index_name(TABLE, columns)}` ({cols})")
+        print(f"🗂️ 索引 ({', '.join(columns)}) 已创建，耗时 {time.perf_counter() - start:.1f}s")
+
+
+def write_csv(path, rows, chunk_size, seed, skew=0.0, budget='uniform', years=1):
+    """只生成数据写入 CSV（格式同 data/ai_projects.csv），不连接 MySQL"""
+    start = time.perf_counter()
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(COLUMNS)
+        writer.writerows(DEMO_ROWS)
+        for chunk_index, start_id, size in plan_chunks(rows, chunk_size):
+            writer.writerows(zip(*generate_chunk(start_id, size, seed, chunk_index, skew, budget, years)))
+    elapsed = time.perf_counter() - start
+    total = rows + len(DEMO_ROWS)
+    print(f"✅ 已写入 {path}: {total} 行，耗时 {elapsed:.1f}s（{total / elapsed:,.0f} 行/秒）")
+
+
+def init_mysql_db(rows=DEFAULT_ROWS, chunk_size=DEFAULT_CHUNK_SIZE, method='insert', workers=1,
+                  indexes=(), seed=42, skew=0.0, budget='uniform', years=1, batch_rows=1000):
     # 1. 先连接 MySQL（不指定数据库）
     conn = mysql.connector.connect(**DB_CONFIG)
     cursor = conn.cursor()
-    
+
     # 2. 创建数据库
     print(f"正在创建数据库 {DB_NAME}...")
     cursor.execute(f"CREATE DATABASE IF NOT EXISTS {DB_NAME} CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci")
     cursor.execute(f"USE {DB_NAME}")
-    
-    # 3. 创建表
-    print("正在创建表结构...")
-    cursor.execute("DROP TABLE IF EXISTS ai_projects")
-    cursor.execute("""
-    CREATE TABLE ai_projects (
-        id INT AUTO_INCREMENT PRIMARY KEY,
-        architect_name VARCHAR(100) NOT NULL COMMENT '解决方案架构师姓名',
-        project_name VARCHAR(200) NOT NULL COMMENT 'AI短漫剧项目名称',
-        client_industry VARCHAR(100) COMMENT '客户行业',
-        tech_stack VARCHAR(255) COMMENT '技术栈',
-        episode_count INT COMMENT '剧集数量',
-        total_budget DECIMAL(15, 2) COMMENT '项目总预算',
-        completion_rate INT COMMENT '完成进度(%)',
-        start_date DATE COMMENT '开始日期',
-        end_date DATE COMMENT '交付日期',
-        status VARCHAR(50) COMMENT '当前状态',
-        ai_tools_used VARCHAR(255) COMMENT '使用的AI工具',
-        performance_score DECIMAL(3, 1) COMMENT '性能/评价得分'
-    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
-    """)
-
-    # 4. 准备生成 100 条数据
-    print("正在生成 100+ 条 AI 短漫剧项目数据...")
-    
-    industries = ['科幻', '武侠', '悬疑', '都市', '二次元', '治愈', '惊悚']
-    statuses = ['已交付', '制作中', '策划中', '后期中']
-    tools = ['Stable Diffusion', 'Midjourney', 'Sora', 'Runway', 'Pika', 'Claude 3.5', 'GPT-4o']
-    architects = ['张三', '李四', '王五', '赵六', '孙七', '周八', '吴九']
-
-    project_data = []
-    
-    # 先加几个固定的演示数据
-    project_data.append(('张三', '赛博都市：觉醒', '科幻', 'SD + Midjourney', 12, 150000.0, 100, '2023-01-10', '2023-03-10', '已交付', 'Runway Gen-2', 9.5))
-    project_data.append(('李四', '古风江湖：剑影', '武侠', 'ControlNet + Sora', 24, 300000.0, 80, '2023-04-15', '2023-08-15', '制作中', 'Pika Labs', 8.8))
-
-    # 循环生成剩下的 100 条
-    for i in range(1, 101):
-        arch = random.choice(architects)
-        proj_name = f"AI短漫剧项目_{i}"
-        indus = random.choice(industries)
-        tech = " + ".join(random.sample(tools, 2))
-        episodes = random.randint(5, 50)
-        budget = round(random.uniform(50000, 500000), 2)
-        rate = random.randint(0, 100)
-        
-        start_dt = datetime(2023, 1, 1) + timedelta(days=random.randint(0, 365))
-        end_dt = start_dt + timedelta(days=random.randint(30, 180))
-        
-        status = random.choice(statuses)
-        ai_tool = ", ".join(random.sample(tools, 3))
-        score = round(random.uniform(5.0, 10.0), 1)
-        
-        project_data.append((arch, proj_name, indus, tech, episodes, budget, rate, start_dt.strftime('%Y-%m-%d'), end_dt.strftime('%Y-%m-%d'), status, ai_tool, score))
-
-    # 5. 插入数据
-    cursor.executemany("""
-    INSERT INTO ai_projects (architect_name, project_name, client_industry, tech_stack, episode_count, total_budget, completion_rate, start_date, end_date, status, ai_tools_used, performance_score)
-    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-    """, project_data)
 
+    # 3. 创建表（只有主键，二级索引在导入后创建）
+    print("正在创建表结构...")
+    cursor.execute(f"DROP TABLE IF EXISTS {TABLE}")
+    cursor.execute(CREATE_TABLE_SQL)
+    cursor.executemany(INSERT_SQL, DEMO_ROWS)
     conn.commit()
+
+    # 4. 分块生成并导入；多个进程各自负责一部分块
+    chunks = plan_chunks(rows, chunk_size)
+    workers = max(1, min(workers, len(chunks)))
+    print(f"正在生成并导入 {rows} 行数据（{len(chunks)} 块，{workers} 个进程，方式: {method}）...")
+    options = {'method': method, 'seed': seed, 'skew': skew, 'budget': budget, 'years': years,
+               'batch_rows': batch_rows}
+    start = time.perf_counter()
+    if workers == 1:
+        loaded = load_chunks(chunks, options)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            loaded = sum(executor.map(load_chunks, [chunks[i::workers] for i in range(workers)],
+                                      [options] * workers))
+    elapsed = time.perf_counter() - start
+    print(f"📥 已导入 {loaded} 行，耗时 {elapsed:.1f}s（{loaded / elapsed if elapsed else 0:,.0f} 行/秒）")
+
+    # 5. 导入完成后创建二级索引
+    if indexes:
+        create_indexes(cursor, indexes)
+    cursor.execute(f"ANALYZE TABLE {TABLE}")
+    cursor.fetchall()
+
     cursor.close()
     conn.close()
-    print(f"✅ 成功！MySQL 数据库已初始化，数据库: {DB_NAME}")
+    print(f"✅ 成功！MySQL 数据库已初始化，数据库: {DB_NAME}，共 {loaded + len(DEMO_ROWS)} 行")
+    bump_cache_version()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="初始化 ai_projects 演示数据")
+    parser.add_argument('--rows', type=int, default=DEFAULT_ROWS, help="生成的行数（另有 2 行固定演示数据）")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help="每块生成/提交的行数")
+    parser.add_argument('--method', choices=('insert', 'infile'), default='insert',
+                        help="导入方式：多行 INSERT 或 LOAD DATA LOCAL INFILE")
+    parser.add_argument('--batch-rows', type=int, default=1000, help="insert 方式下每条 INSERT 语句的行数")
+    parser.add_argument('--workers', type=int, default=1, help="并行导入的进程数")
+    parser.add_argument('--index', action='append', default=[], metavar='COLS',
+                        help="导入后创建的二级索引，逗号分隔多列，可重复")
+    parser.add_argument('--seed', type=int, default=42, help="随机种子")
+    parser.add_argument('--skew', type=float, default=0.0, help="架构师/行业/工具取值的 Zipf 倾斜度，0 为均匀")
+    parser.add_argument('--budget', choices=('uniform', 'lognormal'), default='uniform', help="预算分布")
+    parser.add_argument('--years', type=int, default=1, help="开始日期分布的年数（从 2023-01-01 起）")
+    parser.add_argument('--csv', metavar='PATH', help="只生成 CSV 文件，不连接 MySQL")
+    args = parser.parse_args()
+
+    if args.csv:
+        write_csv(args.csv, args.rows, args.chunk_size, args.seed, args.skew, args.budget, args.years)
+        return
+    indexes = [tuple(c.strip() for c in spec.split(',') if c.strip()) for spec in args.index]
+    init_mysql_db(args.rows, args.chunk_size, args.method, args.workers, indexes,
+                  args.seed, args.skew, args.budget, args.years, args.batch_rows)
+
 
 if __name__ == "__main__":
-    init_mysql_db()
+    main()
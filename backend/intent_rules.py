@@ -0,0 +1,234 @@
+"""
+规则快速通道 - 常见问题（全部项目、某架构师的项目、预算大于 X、已交付的项目……）本地直接生成 SQL
+基于实体词典与数字/日期槽位（sql_template.extract_slots）逐段识别条件；
+整句都能被规则解释时才命中，否则交给后续的模板 / LLM，宁可不命中也不猜
+"""
+
+import re
+import threading
+from collections import Counter
+from sql_template import extract_slots
+
+TABLE = 'ai_projects'
+
+# 数值列的中文说法
+_METRICS = (
+    (r'总预算|预算|经费', 'total_budget'),
+    (r'性能得分|评价得分|得分|评分|分数', 'performance_score'),
+    (r'剧集数量|剧集数|集数', 'episode_count'),
+    (r'完成进度|完成率|完成度|进度', 'completion_rate'),
+)
+_METRIC_RE = '|'.join(words for words, _ in _METRICS)
+
+# 比较运算符（长词在前）
+_OPERATORS = (
+    (r'大于等于|不低于|不少于|至少|>=', '>='),
+    (r'小于等于|不高于|不超过|至多|<=', '<='),
+    (r'大于|超过|高于|多于|>', '>'),
+    (r'小于|低于|少于|<', '<'),
+    (r'等于|=', '='),
+)
+_OPERATOR_RE = '|'.join(words for words, _ in _OPERATORS)
+
+# 不影响语义的词：整句去掉条件后只剩这些词时才算命中
+_FILLER_RE = re.compile(
+    r'请|帮我|给我|麻烦|查询|查找|查一下|查查|查看|看一下|看看|列出|显示|找出|找一下|搜索|统计|'
+    r'一下|所有的|所有|全部的|全部|都有|都|有哪些|有什么|是哪些|哪些|列表|信息|详情|数据|记录|'
+    r'项目|并且|而且|同时|以及|和|且|并|中|里面|里|的|是|为|有| |,|、'
+)
+_SLOT_RE = re.compile(r'\{\w+\}')
+
+
+def _metric_column(word):
+    for words, column in _METRICS:
+        if re.fullmatch(words, word):
+            return column
+    return None
+
+
+def _operator(word):
+    for words, op in _OPERATORS:
+        if re.fullmatch(words, word):
+            return op
+    return None
+
+
+class _Query:
+    """规则匹配过程中累积的 SQL 片段"""
+
+    def __init__(self):
+        self.conditions = []
+        self.params = []
+        self.order = None
+        self.limit = None
+        self.count = False
+        self.entity_columns = set()
+
+    def where(self, condition, *params):
+        self.conditions.append(condition)
+        self.params.extend(params)
+
+    def sql(self):
+        select = "COUNT(*) AS count" if self.count else "*"
+        sql = f"SELECT {select} FROM {TABLE}"
+        if self.conditions:
+            sql += " WHERE " + " AND ".join(self.conditions)
+        if self.order and not self.count:
+            sql += f" ORDER BY {self.order}"
+        if self.limit and not self.count:
+            sql += f" LIMIT {int(self.limit)}"
+        return sql + ";"
+
+
+def _entity(column, template):
+    """某个实体列的条件：{列名} 连同前后修饰词一起识别"""
+    def apply(query, values, _):
+        # 同一列出现两次（"张三和李四的项目"）可能是"或"的意思，交给 LLM
+        if column in query.entity_columns:
+            return False
+        query.entity_columns.add(column)
+        query.where(f"{column} = %s", values[0])
+    return re.compile(template.format(slot=re.escape('{' + column + '}'))), apply, column
+
+
+def _tool(query, values, _):
+    query.where("ai_tools_used LIKE %s", f"%{values[0]}%")
+
+
+def _compare(query, values, m):
+    op = _operator(m.group('op')) if m.group('op') else None
+    suffix = m.group('suffix')
+    if op is None and suffix is None:
+        # "预算10万的项目" 没有比较方向，不猜
+        return False
+    if op is None:
+        op = '>=' if suffix == '以上' else '<='
+    query.where(f"{_metric_column(m.group('metric'))} {op} %s", values[0])
+
+
+def _date(query, values, m):
+    column = 'end_date' if m.group('event') in ('交付', '结束', '完成') else 'start_date'
+    direction = m.group('direction')
+    # "X之后/以后" 不含当天，"X起" 含当天，"X之前/以前" 不含当天
+    if direction == '起':
+        op = '>='
+    elif direction in ('之后', '以后', '后'):
+        op = '>'
+    else:
+        op = '<'
+    query.where(f"{column} {op} %s", values[0])
+
+
+def _year(query, values, m):
+    column = 'end_date' if m.group('event') in ('交付', '结束', '完成') else 'start_date'
+    year = int(values[0])
+    query.where(f"{column} >= %s AND {column} < %s", f"{year}-01-01", f"{year + 1}-01-01")
+
+
+def _extreme(query, values, m):
+    column = _metric_column(m.group('metric'))
+    descending = m.group('dir') in ('最高', '最多', '最大')
+    query.order = f"{column} {'DESC' if descending else 'ASC'}, id"
+    query.limit = int(values[0]) if values else 1
+
+
+def _sort(query, values, m):
+    column = _metric_column(m.group('metric'))
+    descending = m.group('dir') in ('从高到低', '从大到小', '降序', '倒序')
+    query.order = f"{column} {'DESC' if descending else 'ASC'}, id"
+
+
+def _top(query, values, _):
+    query.limit = int(values[0])
+
+
+def _count(query, values, _):
+    query.count = True
+
+
+# (正则, 处理函数, 意图名)，按顺序匹配；正则只在未被占用的文本上生效
+_RULES = [
+    _entity('architect_name', r'(?:架构师)?{slot}(?:架构师)?(?:负责|主导|做|带)?'),
+    _entity('status', r'(?:状态)?{slot}(?:状态)?'),
+    _entity('client_industry', r'(?:客户行业|行业)?{slot}(?:类型|类|行业|题材)?'),
+    (re.compile(r'(?:使用|用了|用到|采用)?(?:ai工具)?\{ai_tools_used\}(?:工具)?'), _tool, 'ai_tools_used'),
+    (re.compile(rf'(?P<metric>{_METRIC_RE})在?(?P<op>{_OPERATOR_RE})?\{{number\}}(?:元|分|集|%)?(?P<suffix>以上|以下)?'),
+     _compare, 'compare'),
+    (re.compile(r'(?:开始日期|开始时间|交付日期|结束日期)?在?\{date\}'
+                r'(?P<direction>之后|以后|后|起|之前|以前|前)(?P<event>开始|启动|交付|结束|完成)?'),
+     _date, 'date'),
+    (re.compile(r'\{number\}年(?P<event>开始|启动|交付|结束|完成)'), _year, 'year'),
+    (re.compile(rf'(?P<metric>{_METRIC_RE})(?P<dir>最高|最多|最大|最低|最少|最小)的?(?:前?\{{number\}}(?:个|条|名))?'),
+     _extreme, 'top_by_metric'),
+    (re.compile(rf'按(?P<metric>{_METRIC_RE})(?P<dir>从高到低|从大到小|从低到高|从小到大|降序|倒序|升序|正序)?排序?'),
+     _sort, 'order'),
+    (re.compile(r'(?:前|top)\{number\}(?:个|条|名)?'), _top, 'limit'),
+    (re.compile(r'(?:一共|总共)?有?多少个?|总数|数量|个数'), _count, 'count'),
+]
+
+
+class IntentMatcher:
+    """常见问题的规则匹配；match() 返回 (sql, 参数) 或 None"""
+
+    def __init__(self, rules=_RULES):
+        self.rules = rules
+        self.attempts = 0
+        self.matches = 0
+        self.intents = Counter()
+        self._lock = threading.Lock()
+
+    def _parse(self, text):
+        template, slots = extract_slots(text)
+        if not template:
+            return None
+        slot_starts = [m.start() for m in _SLOT_RE.finditer(template)]
+        # 已识别的部分替换为等长的占位字符，保持槽位下标不变
+        masked = template
+        query = _Query()
+        intents = []
+        for pattern, apply, intent in self.rules:
+            for m in pattern.finditer(masked):
+                if not m.group(0):
+                    continue
+                values = [slots[i][1] for i, start in enumerate(slot_starts) if m.start() <= start < m.end()]
+                # 处理函数返回 False 表示这段文本不能确定地解释，留给后面的规则或最终判定
+                if apply(query, values, m) is False:
+                    continue
+                intents.append(intent)
+                masked = masked[:m.start()] + '\x00' * (m.end() - m.start()) + masked[m.end():]
+
+        leftover = _FILLER_RE.sub('', masked.replace('\x00', ''))
+        if leftover:
+            return None
+        # 没有任何条件时，只接受"所有项目"这类明确的整表查询
+        if not intents and '项目' not in template:
+            return None
+        return query, intents or ['all']
+
+    def match(self, normalized):
+        """normalized 为 normalize_prompt 的结果"""
+        parsed = self._parse(normalized)
+        with self._lock:
+            self.attempts += 1
+            if parsed is None:
+                return None
+            self.matches += 1
+            self.intents.update(parsed[1])
+        query = parsed[0]
+        return query.sql(), (tuple(query.params) if query.params else None)
+
+    def can_answer(self, normalized):
+        """只判断能否命中，不计入统计（供缓存预热等离线场景使用）"""
+        return self._parse(normalized) is not None
+
+    def stats(self):
+        return {
+            'attempts': self.attempts,
+            'matches': self.matches,
+            'hit_rate': round(self.matches / self.attempts, 4) if self.attempts else 0.0,
+            'intents': dict(self.intents),
+        }
+
+
+# 进程内共享的规则匹配器
+intent_matcher = IntentMatcher()
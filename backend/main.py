@@ -1,15 +1,49 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse, JSONResponse, Response
+from fastapi.encoders import jsonable_encoder
 from pydantic import BaseModel
-import mysql.connector
+from typing import List, Optional
 import os
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 import redis
+import redis.asyncio as aioredis
 import json
+import time
+import contextvars
+import functools
 from dotenv import load_dotenv
 # 引入已经验证成功的 AI 服务
-from llm_service import get_sql_from_llm
+from llm_service import get_sql_from_llm_async, LLMUnavailableError, llm_stats
+from db_pool import DB_CONFIG, get_pool
+from singleflight import SingleFlight, generate_with_lease
+from prompt_normalizer import make_cache_key, normalize_prompt
+from similarity_index import SimilarityIndex, SIMILARITY_ENABLED
+from entity_dictionary import entity_dictionary
+from intent_rules import intent_matcher
+from schema_catalog import schema_catalog, SCHEMA_CACHE_KEY, SCHEMA_CACHE_TTL
+from sql_template import TemplateStore, render_sql
+from sql_guard import enforce_limit, paginate, InvalidCursorError, STREAM_MAX_ROWS, EXPORT_MAX_ROWS
+from explain_guard import CostGuard, EXPLAIN_GUARD_ENABLED, apply_execution_timeout
+from cache import LocalCache, TieredCache, listen_invalidations, L1_MAX_BYTES
+from result_cache import (
+    RESULT_CACHE_ENABLED, RESULT_CACHE_TTL, RESULT_CACHE_MAX_BYTES,
+    DataVersion, result_cache_key, query_etag, decode_rows, fetch_update_time, json_default,
+)
+from compression import CompressionMiddleware, COMPRESSION_ENABLED
+from static_assets import FrontendFiles, etag_matches
+from columnar import ColumnarResult, dumps as dumps_json
+from arrow_export import ResultExporter, EXPORT_FORMATS
+from query_log import query_log
+from metrics import (
+    stage, start_request_timer, StatsCollector, register_collector,
+    REQUEST_SECONDS, REQUESTS, IN_FLIGHT,
+)
+from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
+from cache_warmup import (
+    WARMUP_ON_STARTUP, WARMUP_TOP_N, record_prompt, top_prompts_from_redis, top_prompts_from_log, warm_up,
+)
 
 # 加载环境变量（从 config/.env 读取）
 env_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'config', '.env')
@@ -23,34 +57,32 @@ app.add_middleware(
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    # 前端跨域时需要读取 ETag 以便下次带 If-None-Match
+    expose_headers=["ETag", "Server-Timing"],
 )
 
-# 2. MySQL 数据库配置（读取火山引擎 RDS 配置）
-DB_CONFIG = {
-    'host': os.getenv('DB_HOST', 'localhost'),
-    'port': int(os.getenv('DB_PORT', 3306)),
-    'user': os.getenv('DB_USER', 'root'),
-    'password': os.getenv('DB_PASSWORD', ''),
-    'database': os.getenv('DB_NAME', 'demo_db'),
-    'charset': 'utf8mb4'
-}
+# 响应压缩（brotli / gzip，小响应不压缩）
+if COMPRESSION_ENABLED:
+    app.add_middleware(CompressionMiddleware)
 
+# 2. MySQL 数据库配置（读取火山引擎 RDS 配置，连接池见 db_pool.py）
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 FRONTEND_DIR = os.path.join(BASE_DIR, "frontend")
 print(f"📌 MySQL 数据库配置: {DB_CONFIG['host']}:{DB_CONFIG['port']}/{DB_CONFIG['database']}")
 
-# 3. 初始化 Redis 连接（适配火山引擎私网 Redis）
+# 3. 初始化 Redis 连接（适配火山引擎私网 Redis，使用异步客户端避免阻塞事件循环）
+redis_host = os.getenv('REDIS_HOST', 'localhost')
+redis_port = int(os.getenv('REDIS_PORT', 6379))
+redis_user = os.getenv('REDIS_USER', 'default')  # 新增这行
+redis_password = os.getenv('REDIS_PASSWORD', '')
+redis_db = int(os.getenv('REDIS_DB', 0))
+
 redis_client = None
-try:
-    # 从 .env 读取 Redis 配置
-    redis_host = os.getenv('REDIS_HOST', 'localhost')
-    redis_port = int(os.getenv('REDIS_PORT', 6379))
-    redis_user = os.getenv('REDIS_USER', 'default')  # 新增这行
-    redis_password = os.getenv('REDIS_PASSWORD', '')
-    redis_db = int(os.getenv('REDIS_DB', 0))
-    
-    # 创建 Redis 客户端（适配火山引擎私网）
-    redis_client = redis.Redis(
+
+async def init_redis():
+    """创建异步 Redis 客户端并测试连接，失败时只使用进程内 L1 缓存"""
+    global redis_client
+    client = aioredis.Redis(
         host=redis_host,
         port=redis_port,
         username=redis_user,  # 新增这行
@@ -60,96 +92,808 @@ try:
         socket_timeout=10,      # 私网连接超时设为10秒
         retry_on_timeout=True   # 超时自动重试
     )
-    
-    # 测试连接
-    redis_client.ping()
-    print(f"✅ Redis 私网连接成功: {redis_host}:{redis_port}/db{redis_db}")
-except redis.exceptions.AuthenticationError:
-    print(f"⚠️ Redis 认证失败: 密码错误，请检查 REDIS_PASSWORD 配置")
-except redis.exceptions.ConnectionError:
-    print(f"⚠️ Redis 连接失败: 无法连接到 {redis_host}:{redis_port}")
-    print("   请检查：1.Redis白名单是否包含ECS IP  2.ECS和Redis是否在同一VPC  3.端口是否开放")
-except Exception as e:
-    print(f"⚠️ Redis 初始化异常: {str(e)}，将使用内存 Mock 缓存")
-
-# 内存 Mock 缓存（备用）
-mock_cache = {}
+    try:
+        # 测试连接
+        await client.ping()
+        redis_client = client
+        # 两级缓存挂上 L2，并订阅其他 worker 的失效通知
+        sql_cache.redis = client
+        result_store.redis = client
+        start_background(listen_invalidations(client, [sql_cache, result_store]))
+        print(f"✅ Redis 私网连接成功: {redis_host}:{redis_port}/db{redis_db}")
+    except redis.exceptions.AuthenticationError:
+        print(f"⚠️ Redis 认证失败: 密码错误，请检查 REDIS_PASSWORD 配置")
+    except redis.exceptions.ConnectionError:
+        print(f"⚠️ Redis 连接失败: 无法连接到 {redis_host}:{redis_port}")
+        print("   请检查：1.Redis白名单是否包含ECS IP  2.ECS和Redis是否在同一VPC  3.端口是否开放")
+    except Exception as e:
+        print(f"⚠️ Redis 初始化异常: {str(e)}，将只使用进程内缓存")
+
+# 4. 数据库查询线程池：mysql-connector 是同步驱动，放到有界线程池中执行，
+#    线程数与连接池上限一致，避免线程空等连接
+DB_EXECUTOR_WORKERS = int(os.getenv('DB_EXECUTOR_WORKERS', get_pool().limit))
+db_executor = ThreadPoolExecutor(max_workers=DB_EXECUTOR_WORKERS, thread_name_prefix="db")
+
+async def run_in_db_executor(func, *args):
+    """在数据库线程池中执行同步函数（复制当前上下文，线程内的阶段计时记入本请求）"""
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    return await loop.run_in_executor(db_executor, functools.partial(ctx.run, func, *args))
+
+def load_entity_dictionary():
+    """从 ai_projects 加载实体词典（架构师、状态、行业、AI 工具），供规则快速通道与 SQL 模板识别字面量"""
+    conn = get_pool().acquire()
+    try:
+        count = entity_dictionary.load(conn)
+        print(f"📚 实体词典已加载: {count} 个取值")
+    finally:
+        conn.close()
+
+def load_schema_catalog():
+    conn = get_pool().acquire()
+    try:
+        return schema_catalog.load(conn)
+    finally:
+        conn.close()
+
+async def init_schema_catalog():
+    """表结构目录：优先读取 Redis 中其他 worker 已加载的版本，否则查询 information_schema 后写回"""
+    if redis_client:
+        try:
+            payload = await redis_client.get(SCHEMA_CACHE_KEY)
+            if payload:
+                schema_catalog.load_json(payload)
+                print(f"📐 表结构目录已从缓存加载: 版本 {schema_catalog.version}")
+                return
+        except Exception as e:
+            print(f"⚠️ 读取表结构缓存失败: {e}")
+    count = await run_in_db_executor(load_schema_catalog)
+    print(f"📐 表结构目录已加载: {count} 张表，版本 {schema_catalog.version}")
+    if redis_client:
+        try:
+            await redis_client.setex(SCHEMA_CACHE_KEY, SCHEMA_CACHE_TTL, schema_catalog.to_json())
+        except Exception as e:
+            print(f"⚠️ 写入表结构缓存失败: {e}")
+
+@app.on_event("startup")
+async def on_startup():
+    await init_redis()
+    try:
+        await run_in_db_executor(load_entity_dictionary)
+    except Exception as e:
+        print(f"⚠️ 实体词典加载失败（规则与 SQL 模板仅识别数字和日期）: {e}")
+    try:
+        await init_schema_catalog()
+    except Exception as e:
+        print(f"⚠️ 表结构目录加载失败（提示词使用内置表结构）: {e}")
+    if WARMUP_ON_STARTUP and redis_client:
+        # 预热在后台进行，完成前 /ready 返回 503
+        start_background(startup_warmup())
+    else:
+        service_ready.set()
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    for task in list(background_tasks):
+        task.cancel()
+    if redis_client:
+        await redis_client.close()
+    db_executor.shutdown(wait=False)
+    get_pool().dispose()
+    query_log.close()
+
+# 两级缓存：进程内 L1（LRU + TTL + 内存上限）在前，Redis L2 在后；
+# Redis 不可用时只有 L1，内存占用有上限
+sql_cache = TieredCache(LocalCache(), name="sql")
+# 结果集体积大，L1 只分配四分之一内存预算
+result_store = TieredCache(LocalCache(max_bytes=L1_MAX_BYTES // 4), name="result")
+
+# SQL 缓存有效期；过期前 CACHE_STALE_TTL 秒内的命中视为"陈旧"，
+# 先返回旧值，同时在后台刷新（stale-while-revalidate）
+CACHE_TTL = int(os.getenv('CACHE_TTL', 3600))
+CACHE_STALE_TTL = int(os.getenv('CACHE_STALE_TTL', 300))
+
+# 启动预热完成后置位，/ready 据此判断是否可以接收流量
+service_ready = asyncio.Event()
+
+# 同一 prompt 的并发未命中只调用一次 LLM
+sql_flight = SingleFlight()
+# 持有后台任务的引用，防止被垃圾回收
+background_tasks = set()
+
+def start_background(coro):
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
+
+# 近似 prompt 索引：精确 key 未命中时复用相似问题的 SQL
+similarity_index = SimilarityIndex() if SIMILARITY_ENABLED else None
+
+# SQL 模板缓存：只有字面量不同的问题本地填参数，不调用 LLM
+template_store = TemplateStore()
+
+# 结果集缓存的数据版本（数据变化后旧结果自动失效）
+data_version = DataVersion()
+
+# 执行前 EXPLAIN 代价检查
+cost_guard = CostGuard()
+
+# Prometheus：抓取时读取各组件统计
+register_collector(StatsCollector(
+    caches=[sql_cache, result_store],
+    pool_stats=lambda: get_pool().stats(),
+    llm_stats=llm_stats,
+    rule_stats=intent_matcher.stats,
+))
+
+# 指标的 endpoint 标签只取固定的几个值，其余 /ask 开头的路径（/ask/xxx、/ask.php 等）归为 other，避免标签基数无限增长
+METRIC_PATHS = ("/ask", "/ask/stream", "/ask/batch", "/ask/export")
+
+@app.middleware("http")
+async def track_request_metrics(request: Request, call_next):
+    """查询接口的总耗时与处理中请求数"""
+    path = request.url.path
+    if not path.startswith("/ask"):
+        return await call_next(request)
+    if path not in METRIC_PATHS:
+        path = "other"
+    in_flight = IN_FLIGHT.labels(path)
+    in_flight.inc()
+    start = time.perf_counter()
+    try:
+        return await call_next(request)
+    finally:
+        in_flight.dec()
+        REQUEST_SECONDS.labels(path).observe(time.perf_counter() - start)
 
 # 请求模型定义
 class QueryRequest(BaseModel):
     prompt: str
+    # keyset 分页：传 page_size 开启分页，之后用上一页返回的 next_cursor 取下一页
+    page_size: Optional[int] = None
+    cursor: Optional[str] = None
+    # 为 True 时在响应中返回各阶段耗时（timings 字段与 Server-Timing 头）
+    include_timings: bool = False
+    # 响应格式：rows 为逐行字典（data 字段）；columnar 为 {columns, types, rows: [[...]]}，体积更小、编码更快
+    format: str = "rows"
+
+RESPONSE_FORMATS = ("rows", "columnar")
+
+# 查询响应的 ETag / If-None-Match（仪表盘重复刷新时返回 304）；浏览器每次都要协商，不直接使用本地副本
+# 只在 Redis 版本计数器可用时启用：UPDATE_TIME 可能被 MySQL 缓存一天，单靠它会长时间返回过期的 304
+QUERY_ETAG_ENABLED = os.getenv('QUERY_ETAG_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+QUERY_CACHE_CONTROL = "private, no-cache"
+
+# 批量查询：单次最多的 prompt 数，以及同时进行的 LLM 调用数
+BATCH_MAX_PROMPTS = int(os.getenv('BATCH_MAX_PROMPTS', 100))
+BATCH_LLM_CONCURRENCY = int(os.getenv('BATCH_LLM_CONCURRENCY', 4))
+
+class ExportRequest(BaseModel):
+    prompt: str
+    # arrow（Arrow IPC 流）或 parquet
+    format: str = "arrow"
+
+class BatchQueryRequest(BaseModel):
+    prompts: List[str]
+    # 为 False 时只返回 SQL，不执行
+    execute: bool = True
 
 def get_db_connection():
-    """获取 MySQL 数据库连接"""
-    return mysql.connector.connect(**DB_CONFIG)
+    """从连接池借出 MySQL 连接（close() 即归还）"""
+    return get_pool().acquire()
 
-@app.post("/ask")
-async def ask_ai_and_query(request: QueryRequest):
-    """处理前端请求的主接口，支持 Redis 缓存"""
-    prompt = request.prompt.strip()
-    print(f"\n[收到请求] 用户问: {prompt}")
-    
-    # --- Redis 缓存查找 ---
-    cache_hit = False
-    sql = None
-    
-    if redis_client:
+def execute_query(sql, params=None, columnar=False):
+    """
+    同步执行查询（在 db_executor 中调用）；带参数时使用服务端预处理语句
+    返回字典行；columnar 为 True 时使用元组游标，返回 ColumnarResult
+    """
+    with stage("db_acquire"):
+        conn = get_db_connection()
+    try:
+        if EXPLAIN_GUARD_ENABLED:
+            with stage("validate"):
+                cost_guard.check(conn, sql, params)
+        sql = apply_execution_timeout(sql)
+        with stage("db_execute"):
+            if params is not None:
+                cursor = conn.cursor(prepared=True, dictionary=not columnar)
+                cursor.execute(sql, params)
+            else:
+                cursor = conn.cursor(dictionary=not columnar)
+                cursor.execute(sql)
+        with stage("fetch"):
+            rows = cursor.fetchall()
+            if columnar:
+                rows = ColumnarResult.from_cursor(cursor, rows)
+        cursor.close()
+        return rows
+    finally:
+        conn.close()
+
+def load_update_time():
+    conn = get_db_connection()
+    try:
+        return fetch_update_time(conn)
+    finally:
+        conn.close()
+
+async def run_query(sql, params=None, columnar=False):
+    """
+    执行查询，开启结果缓存时优先读取同一数据版本下的缓存结果
+    返回 (rows, 是否命中结果缓存)；columnar 为 True 时 rows 为 ColumnarResult（与字典行共用缓存条目）
+    """
+    if not RESULT_CACHE_ENABLED:
+        return await run_in_db_executor(execute_query, sql, params, columnar), False
+
+    key = None
+    try:
+        version = await data_version.get(redis_client, lambda: run_in_db_executor(load_update_time))
+        key = result_cache_key(sql, params, version)
+        payload, _ = await result_store.get(key)
+        if payload:
+            print("⚡ [结果缓存命中] 跳过数据库查询")
+            return (ColumnarResult.decode(payload) if columnar else decode_rows(payload)), True
+    except Exception as e:
+        print(f"⚠️ 结果缓存读取失败: {e}")
+
+    rows = await run_in_db_executor(execute_query, sql, params, columnar)
+    if key:
         try:
-            sql = redis_client.get(f"cache:{prompt}")
-            if sql:
-                cache_hit = True
-                print(f"🚀 [Redis 命中] 从缓存读取 SQL")
+            payload = (rows if columnar else ColumnarResult.from_dicts(rows)).encode()
+            if len(payload.encode('utf-8')) <= RESULT_CACHE_MAX_BYTES:
+                await result_store.set(key, payload, RESULT_CACHE_TTL)
         except Exception as e:
-            print(f"⚠️ Redis 缓存读取失败: {e}")
-    elif prompt in mock_cache:
-        sql = mock_cache[prompt]
-        cache_hit = True
-        print(f"📦 [Mock 缓存命中] 从内存读取 SQL")
-
-    # --- 未命中缓存则调用 AI 生成 SQL ---
-    if not sql:
+            print(f"⚠️ 结果缓存写入失败: {e}")
+    return rows, False
+
+async def lookup_cached_sql(cache_key):
+    """查找缓存的 SQL，返回 (sql, 是否陈旧)"""
+    sql, ttl = await sql_cache.get(cache_key)
+    if sql is None:
+        return None, False
+    # ttl 为 None 表示没有过期时间（如旧版本写入的 key），视为新鲜
+    return sql, ttl is not None and ttl <= CACHE_STALE_TTL
+
+async def store_cached_sql(cache_key, sql):
+    """写入两级 SQL 缓存"""
+    await sql_cache.set(cache_key, sql, CACHE_TTL + CACHE_STALE_TTL)
+
+async def llm_generate(prompt):
+    """调用 LLM，提示词只带与问题相关的表结构"""
+    with stage("schema_context"):
+        schema_context = schema_catalog.context_for(prompt)
+    with stage("llm"):
+        return await get_sql_from_llm_async(prompt, schema_context)
+
+async def generate_sql(prompt, cache_key):
+    """缓存未命中时生成 SQL：进程内单飞 + 跨 worker Redis 租约"""
+    async def _generate():
         print("🤖 [AI 调用] 正在生成 SQL...")
-        sql = get_sql_from_llm(prompt)
-        
-        # 存入缓存（有效期 1 小时）
         if redis_client:
             try:
-                redis_client.setex(f"cache:{prompt}", 3600, sql)
-                print(f"💾 [Redis 缓存] 已存入: cache:{prompt}")
+                sql = await generate_with_lease(
+                    redis_client, cache_key,
+                    lambda: llm_generate(prompt),
+                    ttl=CACHE_TTL + CACHE_STALE_TTL,
+                    store=sql_cache.set,
+                )
+                print(f"💾 [缓存] 已存入: {cache_key}")
+                return sql
+            except LLMUnavailableError:
+                raise
             except Exception as e:
-                print(f"⚠️ Redis 缓存写入失败: {e}")
-        else:
-            mock_cache[prompt] = sql
+                print(f"⚠️ Redis 单飞租约失败，直接生成: {e}")
+        sql = await llm_generate(prompt)
+        await store_cached_sql(cache_key, sql)
+        return sql
 
-    print(f"[最终 SQL] {sql}")
-    
-    # --- 执行 SQL 查询 MySQL ---
+    return await sql_flight.do(cache_key, _generate)
+
+def match_rule(normalized):
+    """规则快速通道，命中时返回 (sql, 参数, "rule")"""
+    match = intent_matcher.match(normalized)
+    if match is None:
+        return None
+    print(f"⚡ [规则命中] {match[0]} 参数: {match[1]}")
+    return match[0], match[1], "rule"
+
+async def resolve_sql(prompt):
+    """
+    prompt -> SQL，依次尝试：规则快速通道 -> 精确缓存 -> SQL 模板 -> 近似 prompt 索引 -> LLM 生成
+    返回 (sql, 参数, 来源)，来源为 rule / cache / template / similar / llm；
+    只有规则或模板命中时参数可能不为 None，此时 sql 带 %s 占位符
+    """
+    # 规范化后的定长哈希 key：标点、全半角、大小写不同的写法共享缓存
+    with stage("normalize"):
+        cache_key = make_cache_key(prompt)
+        normalized = normalize_prompt(prompt)
+
+    # --- 规则快速通道：常见问题本地直接生成，不访问缓存与 LLM ---
+    with stage("rule"):
+        match = match_rule(normalized)
+    if match:
+        return match
+
+    # --- 精确缓存 ---
+    sql, stale = await lookup_cached_sql(cache_key)
+    if sql is not None:
+        print(f"🚀 [缓存命中] 从缓存读取 SQL{'（陈旧，后台刷新）' if stale else ''}")
+        if stale:
+            refresh_in_background(prompt, cache_key)
+        if similarity_index:
+            similarity_index.add(normalized, sql)
+        return sql, None, "cache"
+
+    return await resolve_uncached(prompt, cache_key, normalized)
+
+async def resolve_uncached(prompt, cache_key, normalized, llm_limiter=None):
+    """精确缓存未命中后的解析：SQL 模板 -> 近似 prompt 索引 -> LLM 生成（llm_limiter 用于限制 LLM 并发）"""
+    # --- SQL 模板 ---
+    with stage("template"):
+        match = template_store.lookup(normalized)
+    if match:
+        template_sql, params = match
+        print(f"🧩 [模板命中] 参数: {params}")
+        await store_cached_sql(cache_key, render_sql(template_sql, params))
+        return template_sql, params, "template"
+
+    # --- 近似 prompt ---
+    if similarity_index:
+        with stage("similarity"):
+            match = similarity_index.lookup(normalized)
+        if match:
+            sql, score, similar_prompt = match
+            print(f"🧭 [近似命中] 相似度 {score:.2f}，复用「{similar_prompt}」的 SQL")
+            await store_cached_sql(cache_key, sql)
+            return sql, None, "similar"
+
+    # --- 未命中缓存则调用 AI 生成 SQL（并发请求合并为一次调用） ---
+    if llm_limiter:
+        async with llm_limiter:
+            sql = await generate_sql(prompt, cache_key)
+    else:
+        sql = await generate_sql(prompt, cache_key)
+    if similarity_index:
+        similarity_index.add(normalized, sql)
+    if template_store.learn(normalized, sql):
+        print("🧩 [模板学习] 已从生成的 SQL 抽取参数化模板")
+    return sql, None, "llm"
+
+async def resolve_sql_or_503(prompt):
+    """resolve_sql 的接口包装：LLM 不可用且没有缓存/模板可用时返回 503，而不是执行默认 SQL"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
+        return await resolve_sql(prompt)
+    except LLMUnavailableError as e:
+        print(f"❌ {e}")
+        raise HTTPException(status_code=503, detail=str(e))
+
+def track_prompt(prompt):
+    """后台记录 prompt 频次，供缓存预热挑选热门问题"""
+    if not redis_client:
+        return
+
+    async def _record():
+        try:
+            await record_prompt(redis_client, prompt)
+        except Exception as e:
+            print(f"⚠️ prompt 计数失败: {e}")
+
+    start_background(_record())
+
+async def startup_warmup():
+    """按热门问题预热 SQL 缓存（Redis 中没有计数时读取查询日志）"""
+    try:
+        prompts = await top_prompts_from_redis(redis_client, WARMUP_TOP_N)
+        if not prompts:
+            prompts = top_prompts_from_log(n=WARMUP_TOP_N)
+        await warm_up(
+            redis_client, prompts, make_cache_key, llm_generate, CACHE_TTL + CACHE_STALE_TTL,
+            skip=lambda prompt: intent_matcher.can_answer(normalize_prompt(prompt)),
+            on_stored=lambda key, sql: sql_cache.l1.set(key, sql, CACHE_TTL + CACHE_STALE_TTL),
+        )
+    except Exception as e:
+        print(f"⚠️ 缓存预热失败: {e}")
+    finally:
+        service_ready.set()
+
+def refresh_in_background(prompt, cache_key):
+    """陈旧缓存在后台重新生成，当前请求不等待"""
+    async def _refresh():
+        print(f"🔄 [后台刷新] {cache_key}")
+        if not redis_client:
+            # 没有 Redis 时只有本进程的 L1，进程内单飞已足够，直接生成并写回
+            sql = await llm_generate(prompt)
+            await store_cached_sql(cache_key, sql)
+            return sql
+        return await generate_with_lease(
+            redis_client, cache_key,
+            lambda: llm_generate(prompt),
+            ttl=CACHE_TTL + CACHE_STALE_TTL,
+            wait=False,
+            store=sql_cache.set,
+        )
+
+    async def _run():
+        try:
+            await sql_flight.do(f"refresh:{cache_key}", _refresh)
+        except Exception as e:
+            print(f"⚠️ 后台刷新失败: {e}")
+
+    start_background(_run())
+
+# 流式查询每批从服务端游标读取的行数
+STREAM_BATCH_SIZE = int(os.getenv('STREAM_BATCH_SIZE', 500))
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+def open_stream_cursor(conn, sql, params=None):
+    """非缓冲（服务端）游标：结果集留在 MySQL 端，按批读取，内存占用与结果大小无关"""
+    if EXPLAIN_GUARD_ENABLED:
+        cost_guard.check(conn, sql, params)
+    sql = apply_execution_timeout(sql)
+    if params is not None:
+        cursor = conn.cursor(prepared=True)
+        cursor.execute(sql, params)
+    else:
+        cursor = conn.cursor(buffered=False)
         cursor.execute(sql)
-        rows = cursor.fetchall()
-        cursor.close()
-        conn.close()
-        
-        return {
+    return cursor
+
+def _ndjson_line(obj):
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':'), default=json_default) + "\n"
+
+async def stream_ndjson(sql, params, meta):
+    """
+    逐批输出 NDJSON：
+    第一行 {"type": "meta", ...}，之后每行 {"type": "row", "data": {...}}，
+    最后一行 {"type": "end", "count": N}；出错时输出 {"type": "error", "message": ...}
+    """
+    conn = None
+    cursor = None
+    finished = False
+    count = 0
+    try:
+        conn = await run_in_db_executor(get_db_connection)
+        cursor = await run_in_db_executor(open_stream_cursor, conn, sql, params)
+        columns = [d[0] for d in cursor.description]
+        yield _ndjson_line({"type": "meta", **meta, "columns": columns})
+        while True:
+            batch = await run_in_db_executor(cursor.fetchmany, STREAM_BATCH_SIZE)
+            if not batch:
+                break
+            count += len(batch)
+            yield "".join(_ndjson_line({"type": "row", "data": dict(zip(columns, row))}) for row in batch)
+        finished = True
+        yield _ndjson_line({"type": "end", "count": count})
+    except Exception as e:
+        print(f"❌ 流式查询失败: {e}")
+        yield _ndjson_line({"type": "error", "message": str(e), "count": count})
+    finally:
+        if conn is not None:
+            # 客户端中途断开时结果集未读完，直接丢弃连接，避免归还时把剩余行全部读完
+            if finished:
+                await run_in_db_executor(conn.close)
+            else:
+                await run_in_db_executor(conn.discard)
+
+@app.post("/ask/stream")
+async def ask_stream(request: QueryRequest):
+    """流式接口：服务端游标 + NDJSON，首行数据无需等待整个结果集"""
+    prompt = request.prompt.strip()
+    print(f"\n[收到流式请求] 用户问: {prompt}")
+    track_prompt(prompt)
+    sql, params, cache_source = await resolve_sql_or_503(prompt)
+    REQUESTS.labels("/ask/stream", cache_source).inc()
+    # 流式模式内存占用恒定，但仍限制总行数，避免一次扫完整张大表
+    sql = enforce_limit(sql, STREAM_MAX_ROWS)
+    query_log.record(prompt, render_sql(sql, params), cache_source)
+    meta = {
+        "sql": render_sql(sql, params),
+        "cache_hit": cache_source != "llm",
+        "cache_source": cache_source,
+    }
+    return StreamingResponse(stream_ndjson(sql, params, meta), media_type=NDJSON_MEDIA_TYPE)
+
+async def stream_export(conn, exporter, first_chunk):
+    """逐批发送导出数据；中途出错时直接中断连接（Arrow 流缺少结束标记 / Parquet 缺少文件尾，客户端可识别）"""
+    finished = False
+    try:
+        if first_chunk:
+            yield first_chunk
+        while not exporter.done:
+            chunk = await run_in_db_executor(exporter.next_chunk)
+            if chunk:
+                yield chunk
+        finished = True
+        print(f"📤 [导出] 完成，共 {exporter.rows} 行")
+    except Exception as e:
+        print(f"❌ 导出失败: {e}")
+        raise
+    finally:
+        await run_in_db_executor(conn.close if finished else conn.discard)
+
+@app.post("/ask/export")
+async def ask_export(request: ExportRequest):
+    """导出接口：执行生成/缓存的 SQL，结果以 Arrow IPC 流或 Parquet 返回，分析侧可直接读成 DataFrame"""
+    if request.format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format 只支持 {', '.join(EXPORT_FORMATS)}")
+    prompt = request.prompt.strip()
+    print(f"\n[收到导出请求] 用户问: {prompt}")
+    track_prompt(prompt)
+    sql, params, cache_source = await resolve_sql_or_503(prompt)
+    REQUESTS.labels("/ask/export", cache_source).inc()
+    sql = enforce_limit(sql, EXPORT_MAX_ROWS)
+    display_sql = render_sql(sql, params)
+    query_log.record(prompt, display_sql, cache_source)
+
+    # 先执行查询并编码首批数据：SQL 出错时还能返回正常的错误响应
+    conn = await run_in_db_executor(get_db_connection)
+    try:
+        cursor = await run_in_db_executor(open_stream_cursor, conn, sql, params)
+        exporter = ResultExporter(cursor, request.format)
+        first_chunk = await run_in_db_executor(exporter.start)
+    except Exception as e:
+        print(f"❌ 导出查询失败: {e}")
+        await run_in_db_executor(conn.discard)
+        return JSONResponse({"status": "error", "sql": display_sql, "message": str(e)}, status_code=400)
+
+    media_type, extension = EXPORT_FORMATS[request.format]
+    headers = {
+        "Content-Disposition": f'attachment; filename="result.{extension}"',
+        "X-Cache-Source": cache_source,
+    }
+    return StreamingResponse(stream_export(conn, exporter, first_chunk), media_type=media_type, headers=headers)
+
+@app.post("/ask")
+async def ask_ai_and_query(request: QueryRequest, http_request: Request):
+    """处理前端请求的主接口，支持 Redis 缓存；Accept: application/x-ndjson 时改为流式返回"""
+    if NDJSON_MEDIA_TYPE in http_request.headers.get("accept", ""):
+        return await ask_stream(request)
+
+    if request.format not in RESPONSE_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format 只支持 {', '.join(RESPONSE_FORMATS)}")
+    columnar = request.format == "columnar"
+
+    timer = start_request_timer()
+    prompt = request.prompt.strip()
+    print(f"\n[收到请求] 用户问: {prompt}")
+    track_prompt(prompt)
+    sql, params, cache_source = await resolve_sql_or_503(prompt)
+    cache_hit = cache_source != "llm"
+    REQUESTS.labels("/ask", cache_source).inc()
+
+    # --- 行数上限 / keyset 分页 ---
+    page = None
+    if request.page_size or request.cursor:
+        try:
+            page = paginate(sql, params, request.page_size, request.cursor)
+        except InvalidCursorError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    if page:
+        exec_sql, exec_params = page.sql, page.params
+        display_sql = render_sql(sql, params)
+    else:
+        exec_sql, exec_params = enforce_limit(sql), params
+        display_sql = render_sql(exec_sql, exec_params)
+
+    print(f"[最终 SQL] {display_sql}")
+    # 记录实际负载，供 index_advisor.py 分析
+    query_log.record(prompt, display_sql, cache_source)
+
+    # --- 条件请求：SQL 与数据版本都没变时返回 304，不查库也不重新下发结果 ---
+    etag = await query_response_etag(exec_sql, exec_params, request.format)
+    if etag and etag_matches(http_request.headers.get("if-none-match"), etag):
+        print("⚡ [304] 结果未变化")
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": QUERY_CACHE_CONTROL})
+
+    # --- 执行 SQL 查询 MySQL ---
+    try:
+        rows, result_cache_hit = await run_query(exec_sql, exec_params, columnar)
+        next_cursor = None
+        if columnar:
+            if page:
+                rows.rows, next_cursor = page.finish(rows.rows, rows.columns)
+            data = {"columns": rows.columns, "types": rows.types, "rows": rows.rows}
+        else:
+            if page:
+                rows, next_cursor = page.finish(rows)
+            data = {"data": rows}
+
+        payload = {
             "status": "success",
-            "sql": sql,
-            "data": rows,
-            "cache_hit": cache_hit
+            "sql": display_sql,
+            **data,
+            "cache_hit": cache_hit,
+            "cache_source": cache_source,
+            "result_cache_hit": result_cache_hit,
+            "next_cursor": next_cursor
         }
     except Exception as e:
         print(f"❌ 数据库查询失败: {e}")
-        return {
+        payload = {
             "status": "error",
-            "sql": sql,
+            "sql": display_sql,
             "message": str(e),
-            "data": [],
+            **({"columns": [], "types": [], "rows": []} if columnar else {"data": []}),
             "cache_hit": False
         }
+    response = timed_json_response(payload, timer, request.include_timings, columnar)
+    if etag and payload["status"] == "success":
+        response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = QUERY_CACHE_CONTROL
+    return response
+
+async def query_response_etag(sql, params, response_format):
+    """由 (规范化 SQL, 参数, 数据版本, 响应格式) 得出 ETag；没有 Redis 或数据版本读取失败时不使用 ETag"""
+    if not QUERY_ETAG_ENABLED or redis_client is None:
+        return None
+    try:
+        version = await data_version.get(redis_client, lambda: run_in_db_executor(load_update_time))
+    except Exception as e:
+        print(f"⚠️ 数据版本读取失败，不生成 ETag: {e}")
+        return None
+    return query_etag(sql, params, version, response_format)
+
+def timed_json_response(payload, timer, include_timings, fast=False):
+    """
+    序列化响应并计时；include_timings 时附带各阶段耗时（序列化耗时只在 Server-Timing 头中）
+    fast 为 True 时用 orjson 直接编码（列式响应），跳过 jsonable_encoder 的逐值遍历
+    """
+    if include_timings:
+        payload["timings"] = timer.as_ms()
+    with stage("serialize"):
+        if fast:
+            response = Response(dumps_json(payload), media_type="application/json")
+        else:
+            response = JSONResponse(jsonable_encoder(payload))
+    if include_timings:
+        response.headers["Server-Timing"] = timer.server_timing()
+    return response
+
+async def resolve_batch(prompts):
+    """
+    批量 prompt -> SQL：按缓存 key 去重，精确缓存一次 MGET 取回，
+    未命中的并发解析，LLM 调用数不超过 BATCH_LLM_CONCURRENCY
+    返回 {cache_key: (sql, 参数, 来源) 或异常}
+    """
+    unique = {}
+    for prompt in prompts:
+        unique.setdefault(make_cache_key(prompt), prompt)
+
+    resolved = {}
+    for cache_key, prompt in unique.items():
+        match = match_rule(normalize_prompt(prompt))
+        if match:
+            resolved[cache_key] = match
+    cached = await sql_cache.mget([k for k in unique if k not in resolved])
+    print(f"📦 [批量] {len(prompts)} 个问题，去重后 {len(unique)} 个，"
+          f"规则命中 {len(resolved)} 个，缓存命中 {len(cached)} 个")
+
+    for cache_key, sql in cached.items():
+        if similarity_index:
+            similarity_index.add(normalize_prompt(unique[cache_key]), sql)
+        resolved[cache_key] = (sql, None, "cache")
+
+    misses = [k for k in unique if k not in cached and k not in resolved]
+    llm_limiter = asyncio.Semaphore(BATCH_LLM_CONCURRENCY)
+    results = await asyncio.gather(
+        *(resolve_uncached(unique[k], k, normalize_prompt(unique[k]), llm_limiter) for k in misses),
+        return_exceptions=True,
+    )
+    resolved.update(zip(misses, results))
+    return resolved
+
+@app.post("/ask/batch")
+async def ask_batch(request: BatchQueryRequest):
+    """批量接口：一次提交多个问题，SQL 生成与执行都并发进行，结果按提交顺序返回"""
+    prompts = [p.strip() for p in request.prompts]
+    if not prompts:
+        raise HTTPException(status_code=400, detail="prompts 不能为空")
+    if len(prompts) > BATCH_MAX_PROMPTS:
+        raise HTTPException(status_code=400, detail=f"单次最多 {BATCH_MAX_PROMPTS} 个问题")
+
+    for prompt in prompts:
+        track_prompt(prompt)
+    resolved = await resolve_batch(prompts)
+
+    # 相同的最终 SQL 只执行一次；并发度由 db_executor 与连接池共同限制
+    executions = {}
+    for cache_key, outcome in resolved.items():
+        if isinstance(outcome, Exception):
+            continue
+        sql, params, _ = outcome
+        exec_sql = enforce_limit(sql)
+        display_sql = render_sql(exec_sql, params)
+        if request.execute and display_sql not in executions:
+            executions[display_sql] = run_query(exec_sql, params)
+    exec_results = dict(zip(executions, await asyncio.gather(*executions.values(), return_exceptions=True)))
+
+    results = []
+    for prompt in prompts:
+        outcome = resolved[make_cache_key(prompt)]
+        if isinstance(outcome, Exception):
+            results.append({"prompt": prompt, "status": "error", "sql": "", "message": str(outcome), "data": []})
+            continue
+        sql, params, cache_source = outcome
+        display_sql = render_sql(enforce_limit(sql), params)
+        query_log.record(prompt, display_sql, cache_source)
+        REQUESTS.labels("/ask/batch", cache_source).inc()
+        item = {
+            "prompt": prompt,
+            "status": "success",
+            "sql": display_sql,
+            "data": [],
+            "cache_hit": cache_source != "llm",
+            "cache_source": cache_source,
+        }
+        if request.execute:
+            executed = exec_results[display_sql]
+            if isinstance(executed, Exception):
+                item.update(status="error", message=str(executed))
+            else:
+                item["data"], item["result_cache_hit"] = executed
+        results.append(item)
+    return {"status": "success", "results": results}
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Prometheus 指标：各阶段耗时直方图、缓存命中率、LLM 调用与 token、连接池利用率、处理中请求数"""
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+@app.get("/ready")
+async def ready():
+    """就绪检查：启动预热完成前返回 503"""
+    if not service_ready.is_set():
+        raise HTTPException(status_code=503, detail="缓存预热中")
+    return {"status": "ready"}
+
+@app.get("/pool/stats")
+async def pool_stats():
+    """连接池状态：利用率、等待时长、超时次数"""
+    return get_pool().stats()
+
+@app.get("/llm/stats")
+async def llm_service_stats():
+    """LLM 调用统计：重试、对冲、熔断器状态与延迟分位数"""
+    return llm_stats()
+
+@app.get("/rules/stats")
+async def rules_stats():
+    """规则快速通道统计：命中率与各意图次数"""
+    return intent_matcher.stats()
+
+@app.get("/schema/stats")
+async def schema_stats():
+    """表结构目录：版本与表/列数量"""
+    return schema_catalog.stats()
+
+@app.get("/singleflight/stats")
+async def singleflight_stats():
+    """单飞合并统计：followers 即被合并掉的 LLM 调用次数"""
+    return sql_flight.stats()
+
+@app.get("/guard/stats")
+async def guard_stats():
+    """EXPLAIN 代价检查统计"""
+    return cost_guard.stats()
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """两级缓存各层命中/未命中计数与 L1 内存占用"""
+    return {"sql": sql_cache.snapshot(), "result": result_store.snapshot()}
+
+@app.get("/template/stats")
+async def template_stats():
+    """SQL 模板缓存统计"""
+    return template_store.stats()
+
+@app.get("/similarity/stats")
+async def similarity_stats():
+    """近似 prompt 索引统计"""
+    return similarity_index.stats() if similarity_index else {"enabled": False}
 
 # 托管前端静态文件
-app.mount("/", StaticFiles(directory=FRONTEND_DIR, html=True), name="frontend")
+app.mount("/", FrontendFiles(FRONTEND_DIR), name="frontend")
 
 @app.get("/")
 async def read_index():
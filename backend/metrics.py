@@ -0,0 +1,128 @@
+"""
+Prometheus 指标与分阶段计时
+- stage(name)：记录一个处理阶段的耗时（直方图 nl2sql_stage_seconds），同时累加到当前请求的计时器
+- RequestTimer：单个请求的分阶段耗时，可随响应返回（timings 字段 / Server-Timing 头）
+- StatsCollector：抓取时读取缓存、连接池、LLM、规则匹配的统计，导出为 Prometheus 指标
+"""
+
+import contextvars
+import time
+from contextlib import contextmanager
+from prometheus_client import Counter, Gauge, Histogram, REGISTRY
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+_STAGE_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+STAGE_SECONDS = Histogram(
+    'nl2sql_stage_seconds', '各处理阶段耗时（秒）', ['stage'], buckets=_STAGE_BUCKETS,
+)
+REQUEST_SECONDS = Histogram(
+    'nl2sql_request_seconds', '接口请求总耗时（秒）', ['endpoint'], buckets=_STAGE_BUCKETS,
+)
+REQUESTS = Counter('nl2sql_requests_total', '按 SQL 来源统计的请求数', ['endpoint', 'source'])
+IN_FLIGHT = Gauge('nl2sql_in_flight_requests', '处理中的请求数', ['endpoint'])
+
+_current_timer = contextvars.ContextVar('request_timer', default=None)
+
+
+class RequestTimer:
+    """单个请求各阶段的累计耗时"""
+
+    def __init__(self):
+        self.stages = {}
+
+    def add(self, name, seconds):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def as_ms(self):
+        return {name: round(seconds * 1000, 3) for name, seconds in self.stages.items()}
+
+    def server_timing(self):
+        """Server-Timing 响应头，浏览器开发者工具可直接展示"""
+        return ', '.join(f"{name};dur={seconds * 1000:.3f}" for name, seconds in self.stages.items())
+
+
+def start_request_timer():
+    """为当前请求（当前 contextvars 上下文）创建计时器"""
+    timer = RequestTimer()
+    _current_timer.set(timer)
+    return timer
+
+
+def current_timer():
+    return _current_timer.get()
+
+
+def observe_stage(name, seconds):
+    STAGE_SECONDS.labels(name).observe(seconds)
+    timer = _current_timer.get()
+    if timer is not None:
+        timer.add(name, seconds)
+
+
+@contextmanager
+def stage(name):
+    """with stage('llm'): ... 记录该阶段耗时"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(name, time.perf_counter() - start)
+
+
+_BREAKER_STATES = {'closed': 0, 'half_open': 1, 'open': 2}
+
+
+class StatsCollector:
+    """抓取时读取各组件的 stats()，不在请求路径上额外计数"""
+
+    def __init__(self, caches=(), pool_stats=None, llm_stats=None, rule_stats=None):
+        self.caches = caches
+        self.pool_stats = pool_stats
+        self.llm_stats = llm_stats
+        self.rule_stats = rule_stats
+
+    def collect(self):
+        hits = CounterMetricFamily('nl2sql_cache_hits', '缓存命中次数', labels=['cache', 'tier'])
+        misses = CounterMetricFamily('nl2sql_cache_misses', '缓存未命中次数', labels=['cache', 'tier'])
+        ratio = GaugeMetricFamily('nl2sql_cache_hit_ratio', '缓存命中率（L1 或 L2 命中 / 查找次数）', labels=['cache'])
+        for cache in self.caches:
+            snapshot = cache.snapshot()
+            for tier in ('l1', 'l2'):
+                hits.add_metric([cache.name, tier], snapshot[f'{tier}_hits'])
+                misses.add_metric([cache.name, tier], snapshot[f'{tier}_misses'])
+            lookups = snapshot['l1_hits'] + snapshot['l1_misses']
+            served = snapshot['l1_hits'] + snapshot['l2_hits']
+            ratio.add_metric([cache.name], served / lookups if lookups else 0.0)
+        yield hits
+        yield misses
+        yield ratio
+
+        if self.pool_stats:
+            pool = self.pool_stats()
+            yield GaugeMetricFamily('nl2sql_db_pool_checked_out', '借出中的连接数', value=pool['checked_out'])
+            yield GaugeMetricFamily('nl2sql_db_pool_open', '已打开的连接数', value=pool['open'])
+            yield GaugeMetricFamily('nl2sql_db_pool_saturation', '连接池利用率（借出数 / 上限）', value=pool['utilization'])
+            yield CounterMetricFamily('nl2sql_db_pool_waits', '需要等待空闲连接的借出次数', value=pool['waits'])
+            yield CounterMetricFamily('nl2sql_db_pool_timeouts', '等待连接超时次数', value=pool['timeouts'])
+
+        if self.llm_stats:
+            llm = self.llm_stats()
+            for key in ('calls', 'retries', 'hedges', 'failures'):
+                yield CounterMetricFamily(f'nl2sql_llm_{key}', f'LLM {key}', value=llm[key])
+            tokens = CounterMetricFamily('nl2sql_llm_tokens', 'LLM token 用量', labels=['type'])
+            tokens.add_metric(['input'], llm.get('input_tokens', 0))
+            tokens.add_metric(['output'], llm.get('output_tokens', 0))
+            yield tokens
+            yield GaugeMetricFamily('nl2sql_llm_breaker_state', '熔断器状态（0 关闭 / 1 半开 / 2 打开）',
+                                    value=_BREAKER_STATES.get(llm['breaker']['state'], 0))
+
+        if self.rule_stats:
+            rules = self.rule_stats()
+            yield CounterMetricFamily('nl2sql_rule_attempts', '规则快速通道尝试次数', value=rules['attempts'])
+            yield CounterMetricFamily('nl2sql_rule_matches', '规则快速通道命中次数', value=rules['matches'])
+
+
+def register_collector(collector):
+    REGISTRY.register(collector)
+    return collector
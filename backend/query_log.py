@@ -0,0 +1,93 @@
+"""
+查询日志 - 记录每次请求的 prompt 与最终执行的 SQL（JSONL，一行一条）
+供索引建议工具（index_advisor.py）分析真实负载
+- record() 只把日志行放入内存队列，由后台线程（QueueListener）写文件，请求路径上没有磁盘 IO
+- 按大小轮转：超过 QUERY_LOG_MAX_BYTES 后改名为 queries.jsonl.1 ...，最多保留 QUERY_LOG_BACKUP_COUNT 个
+"""
+
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from logging.handlers import QueueListener, RotatingFileHandler
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+QUERY_LOG_ENABLED = os.getenv('QUERY_LOG_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+QUERY_LOG_PATH = os.getenv('QUERY_LOG_PATH', os.path.join(BASE_DIR, 'logs', 'queries.jsonl'))
+QUERY_LOG_MAX_BYTES = int(os.getenv('QUERY_LOG_MAX_BYTES', 50 * 1024 * 1024))
+QUERY_LOG_BACKUP_COUNT = int(os.getenv('QUERY_LOG_BACKUP_COUNT', 5))
+# 写盘跟不上时队列中最多积压的条数，超出的日志丢弃（只影响索引建议的统计）
+QUERY_LOG_QUEUE_SIZE = int(os.getenv('QUERY_LOG_QUEUE_SIZE', 10000))
+
+
+class QueryLog:
+    """追加写入的 JSONL 查询日志（线程安全，后台线程写盘，按大小轮转）"""
+
+    def __init__(self, path=QUERY_LOG_PATH, enabled=QUERY_LOG_ENABLED,
+                 max_bytes=QUERY_LOG_MAX_BYTES, backup_count=QUERY_LOG_BACKUP_COUNT,
+                 queue_size=QUERY_LOG_QUEUE_SIZE):
+        self.path = path
+        self.enabled = enabled
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._listener = None
+        self.dropped = 0
+
+    def _start(self):
+        """首次写入时打开文件并启动后台写线程"""
+        with self._lock:
+            if self._listener is None:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                handler = RotatingFileHandler(self.path, maxBytes=self.max_bytes,
+                                              backupCount=self.backup_count, encoding='utf-8')
+                handler.setFormatter(logging.Formatter('%(message)s'))
+                self._listener = QueueListener(self._queue, handler)
+                self._listener.start()
+
+    def record(self, prompt, sql, source):
+        if not self.enabled:
+            return
+        line = json.dumps({'ts': round(time.time(), 3), 'prompt': prompt, 'sql': sql, 'source': source},
+                          ensure_ascii=False)
+        try:
+            if self._listener is None:
+                self._start()
+            self._queue.put_nowait(logging.makeLogRecord({'msg': line}))
+        except queue.Full:
+            self.dropped += 1
+        except Exception as e:
+            print(f"⚠️ 查询日志写入失败: {e}")
+
+    def close(self):
+        """写完队列中剩余的日志并关闭文件"""
+        with self._lock:
+            if self._listener is not None:
+                self._listener.stop()
+                for handler in self._listener.handlers:
+                    handler.close()
+                self._listener = None
+
+
+def query_log_files(path=QUERY_LOG_PATH, backup_count=QUERY_LOG_BACKUP_COUNT):
+    """当前日志及轮转出的旧文件，从旧到新排列"""
+    files = [f"{path}.{i}" for i in range(backup_count, 0, -1)] + [path]
+    return [f for f in files if os.path.exists(f)]
+
+
+def read_query_log(path=QUERY_LOG_PATH):
+    """逐条读取日志（含轮转出的旧文件），跳过损坏的行"""
+    for name in query_log_files(path):
+        with open(name, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+
+# 进程内共享的查询日志
+query_log = QueryLog()
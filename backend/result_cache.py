@@ -0,0 +1,122 @@
+"""
+查询结果缓存 - 相同 SQL 在数据未变化时直接返回缓存的结果集，不访问 MySQL（存储见 cache.py 两级缓存）
+缓存 key 包含数据版本：ai_projects 的 information_schema.TABLES.UPDATE_TIME + Redis 版本计数器，
+写入方（如 init_db.py）调用 bump_data_version() 即可让旧结果全部失效
+
+注意：MySQL 8 会把 UPDATE_TIME 缓存 information_schema_stats_expiry 秒（默认 86400），
+其他途径写入数据后 UPDATE_TIME 可能一天都不变。可靠的失效依赖 Redis 版本计数器；
+没有计数器时结果只靠 RESULT_CACHE_TTL 兜底（或把 information_schema_stats_expiry 设为 0）
+"""
+
+import datetime
+import decimal
+import hashlib
+import json
+import os
+import re
+import time
+
+RESULT_CACHE_ENABLED = os.getenv('RESULT_CACHE_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+RESULT_CACHE_TTL = int(os.getenv('RESULT_CACHE_TTL', 600))
+# 单条结果编码后超过该大小不缓存，避免大结果集占满 Redis
+RESULT_CACHE_MAX_BYTES = int(os.getenv('RESULT_CACHE_MAX_BYTES', 256 * 1024))
+# 数据版本的本地复用时间，避免每个请求都查询 information_schema
+DATA_VERSION_CHECK_INTERVAL = float(os.getenv('DATA_VERSION_CHECK_INTERVAL', 5))
+# 同一查询的 ETag 最长有效时间（秒），UPDATE_TIME 不可靠时限制 304 返回过期数据的时长
+QUERY_ETAG_MAX_AGE = int(os.getenv('QUERY_ETAG_MAX_AGE', 300))
+
+DATA_TABLE = 'ai_projects'
+VERSION_KEY = f"data_version:{DATA_TABLE}"
+
+_SPACES_RE = re.compile(r'\s+')
+
+
+def normalize_sql(sql):
+    """合并空白、去掉末尾分号，格式不同的同一条 SQL 共享缓存"""
+    return _SPACES_RE.sub(' ', sql).strip().rstrip(';').strip()
+
+
+def result_cache_key(sql, params, version):
+    raw = json.dumps([normalize_sql(sql), list(params) if params else None, version],
+                     ensure_ascii=False, default=str)
+    return f"result:{hashlib.sha256(raw.encode('utf-8')).hexdigest()[:32]}"
+
+
+def query_etag(sql, params, version, variant='', max_age=QUERY_ETAG_MAX_AGE):
+    """
+    查询响应的弱 ETag：同一 SQL、参数、数据版本（及响应格式）下结果不变
+    再混入 max_age 秒的时间桶：绕过 bump_data_version() 的写入最多 max_age 秒后也会换 ETag
+    """
+    bucket = int(time.time() // max_age) if max_age > 0 else 0
+    raw = json.dumps([normalize_sql(sql), list(params) if params else None, version, variant, bucket],
+                     ensure_ascii=False, default=str)
+    return f'W/"{hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]}"'
+
+
+def json_default(value):
+    """json.dumps 的 default：数据库类型转 JSON"""
+    # 与 FastAPI 默认编码保持一致：Decimal -> float，日期 -> ISO 字符串
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if isinstance(value, (datetime.date, datetime.datetime, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, datetime.timedelta):
+        return value.total_seconds()
+    if isinstance(value, (bytes, bytearray)):
+        return value.decode('utf-8', errors='replace')
+    raise TypeError(f"无法编码类型 {type(value).__name__}")
+
+
+def encode_rows(rows):
+    """字典行 -> 紧凑格式 {"c": 列名, "r": [[值...]]}，列名只存一次"""
+    columns = list(rows[0].keys()) if rows else []
+    payload = {'c': columns, 'r': [[row[c] for c in columns] for row in rows]}
+    return json.dumps(payload, ensure_ascii=False, separators=(',', ':'), default=json_default)
+
+
+def decode_rows(payload):
+    data = json.loads(payload)
+    columns = data['c']
+    return [dict(zip(columns, values)) for values in data['r']]
+
+
+def fetch_update_time(conn, table=DATA_TABLE):
+    """读取表的最后修改时间（InnoDB 重启后可能为 NULL，此时只依赖版本计数器）"""
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            "SELECT UPDATE_TIME FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+            (table,),
+        )
+        row = cursor.fetchone()
+        return str(row[0]) if row and row[0] is not None else ''
+    finally:
+        cursor.close()
+
+
+def bump_data_version(redis_client):
+    """写入方修改数据后调用：递增版本号，旧的结果缓存自然失效"""
+    return redis_client.incr(VERSION_KEY)
+
+
+class DataVersion:
+    """
+    当前数据版本，本地复用 DATA_VERSION_CHECK_INTERVAL 秒
+    UPDATE_TIME 受 information_schema_stats_expiry 缓存影响，只作为辅助；没有 Redis 时计数器恒为 0
+    """
+
+    def __init__(self, interval=DATA_VERSION_CHECK_INTERVAL):
+        self.interval = interval
+        self._value = None
+        self._checked_at = 0.0
+
+    async def get(self, redis_client, load_update_time):
+        """load_update_time 为异步函数，返回表的 UPDATE_TIME 字符串；redis_client 可为 None"""
+        now = time.monotonic()
+        if self._value is not None and now - self._checked_at < self.interval:
+            return self._value
+        counter = (await redis_client.get(VERSION_KEY) if redis_client else None) or '0'
+        update_time = await load_update_time()
+        self._value = f"{counter}:{update_time}"
+        self._checked_at = now
+        return self._value
@@ -0,0 +1,211 @@
+"""
+表结构目录 - 从 information_schema 加载表、列、类型、注释与示例取值，建 BM25 索引
+每次生成 SQL 只把与问题相关的表/列写进提示词：表多时提示词不会随表数量膨胀
+目录带版本号（结构内容的哈希），可缓存在 Redis 中供多个 worker 共用
+"""
+
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter
+from prompt_normalizer import normalize_prompt
+
+SCHEMA_CACHE_KEY = 'schema:catalog'
+SCHEMA_CACHE_TTL = int(os.getenv('SCHEMA_CACHE_TTL', 3600))
+# 每个字符串列加载的示例取值个数（只取基数不超过 SCHEMA_SAMPLE_MAX_DISTINCT 的列）
+SCHEMA_SAMPLE_VALUES = int(os.getenv('SCHEMA_SAMPLE_VALUES', 5))
+SCHEMA_SAMPLE_MAX_DISTINCT = int(os.getenv('SCHEMA_SAMPLE_MAX_DISTINCT', 50))
+# 提示词中最多放几张表；列数不超过 SCHEMA_FULL_TABLE_COLUMNS 的表整表放入，否则只放相关列
+SCHEMA_PROMPT_MAX_TABLES = int(os.getenv('SCHEMA_PROMPT_MAX_TABLES', 3))
+SCHEMA_FULL_TABLE_COLUMNS = int(os.getenv('SCHEMA_FULL_TABLE_COLUMNS', 20))
+SCHEMA_PROMPT_MAX_COLUMNS = int(os.getenv('SCHEMA_PROMPT_MAX_COLUMNS', 12))
+
+_STRING_TYPES = ('char', 'varchar', 'enum')
+_ASCII_WORD_RE = re.compile(r'[a-z0-9]+')
+_CJK_RUN_RE = re.compile(r'[^\x00-\x7f]+')
+
+
+def tokenize(text):
+    """英文/数字按单词（下划线拆开），中文取单字 + 相邻二字"""
+    text = normalize_prompt(str(text)).replace('_', ' ')
+    tokens = _ASCII_WORD_RE.findall(text)
+    for run in _CJK_RUN_RE.findall(text):
+        tokens.extend(run)
+        tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+class BM25:
+    """小规模 BM25 索引（文档数 = 表数 + 列数）"""
+
+    def __init__(self, documents, k1=1.2, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.term_freqs = [Counter(doc) for doc in documents]
+        self.lengths = [len(doc) for doc in documents]
+        self.avg_length = (sum(self.lengths) / len(documents)) if documents else 0
+        df = Counter()
+        for tf in self.term_freqs:
+            df.update(tf.keys())
+        n = len(documents)
+        self.idf = {term: math.log(1 + (n - freq + 0.5) / (freq + 0.5)) for term, freq in df.items()}
+
+    def scores(self, query_tokens):
+        terms = [t for t in set(query_tokens) if t in self.idf]
+        result = []
+        for tf, length in zip(self.term_freqs, self.lengths):
+            score = 0.0
+            norm = self.k1 * (1 - self.b + self.b * length / (self.avg_length or 1))
+            for term in terms:
+                freq = tf.get(term)
+                if freq:
+                    score += self.idf[term] * freq * (self.k1 + 1) / (freq + norm)
+            result.append(score)
+        return result
+
+
+class SchemaCatalog:
+    """表结构目录：tables = {表名: {'comment', 'columns': [{'name', 'type', 'comment', 'key', 'samples'}]}}"""
+
+    def __init__(self):
+        self.tables = {}
+        self.version = None
+        self._docs = []
+        self._index = None
+        self._lock = threading.Lock()
+
+    def load(self, conn):
+        """从 information_schema 加载当前库的所有表"""
+        tables = {}
+        cursor = conn.cursor()
+        try:
+            cursor.execute(
+                "SELECT TABLE_NAME, TABLE_COMMENT FROM information_schema.TABLES "
+                "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_TYPE IN ('BASE TABLE', 'VIEW') ORDER BY TABLE_NAME"
+            )
+            for name, comment in cursor.fetchall():
+                tables[name] = {'comment': comment or '', 'columns': []}
+            cursor.execute(
+                "SELECT TABLE_NAME, COLUMN_NAME, COLUMN_TYPE, COLUMN_COMMENT, COLUMN_KEY, DATA_TYPE "
+                "FROM information_schema.COLUMNS WHERE TABLE_SCHEMA = DATABASE() "
+                "ORDER BY TABLE_NAME, ORDINAL_POSITION"
+            )
+            string_columns = []
+            for table, column, column_type, comment, key, data_type in cursor.fetchall():
+                if table not in tables:
+                    continue
+                tables[table]['columns'].append({
+                    'name': column, 'type': column_type, 'comment': comment or '', 'key': key or '', 'samples': [],
+                })
+                if data_type in _STRING_TYPES:
+                    string_columns.append((table, len(tables[table]['columns']) - 1))
+
+            # 低基数字符串列的示例取值，帮助模型写出正确的字面量（如 status='已交付'）
+            for table, index in string_columns:
+                column = tables[table]['columns'][index]
+                cursor.execute(
+                    f"SELECT DISTINCT `{column['name']}` FROM `{table}` "
+                    f"WHERE `{column['name']}` IS NOT NULL LIMIT {SCHEMA_SAMPLE_MAX_DISTINCT + 1}"
+                )
+                values = [str(v) for (v,) in cursor.fetchall()]
+                if len(values) <= SCHEMA_SAMPLE_MAX_DISTINCT:
+                    column['samples'] = values[:SCHEMA_SAMPLE_VALUES]
+        finally:
+            cursor.close()
+        self.set_tables(tables)
+        return len(tables)
+
+    def set_tables(self, tables):
+        """设置目录内容并重建索引"""
+        version = hashlib.sha256(
+            json.dumps(tables, ensure_ascii=False, sort_keys=True).encode('utf-8')
+        ).hexdigest()[:12]
+        docs = []
+        tokens = []
+        for table, info in tables.items():
+            docs.append((table, None))
+            tokens.append(tokenize(table) * 2 + tokenize(info['comment']))
+            for column in info['columns']:
+                docs.append((table, column['name']))
+                tokens.append(
+                    tokenize(column['name']) * 2 + tokenize(column['comment']) * 2
+                    + [t for sample in column['samples'] for t in tokenize(sample)]
+                )
+        index = BM25(tokens) if tokens else None
+        with self._lock:
+            self.tables = tables
+            self.version = version
+            self._docs = docs
+            self._index = index
+
+    def to_json(self):
+        return json.dumps({'version': self.version, 'tables': self.tables}, ensure_ascii=False)
+
+    def load_json(self, payload):
+        self.set_tables(json.loads(payload)['tables'])
+
+    def relevant(self, prompt, max_tables=SCHEMA_PROMPT_MAX_TABLES):
+        """按相关度返回 [(表名, [列名] 或 None 表示整表)]；没有任何匹配时返回前 max_tables 张表"""
+        with self._lock:
+            tables, docs, index = self.tables, self._docs, self._index
+        if not tables:
+            return []
+        table_scores = Counter()
+        column_scores = Counter()
+        if index is not None:
+            for (table, column), score in zip(docs, index.scores(tokenize(prompt))):
+                if score <= 0:
+                    continue
+                table_scores[table] += score
+                if column is not None:
+                    column_scores[(table, column)] = score
+
+        ranked = [t for t, _ in table_scores.most_common(max_tables)] or list(tables)[:max_tables]
+        selection = []
+        for table in ranked:
+            columns = tables[table]['columns']
+            if len(columns) <= SCHEMA_FULL_TABLE_COLUMNS:
+                selection.append((table, None))
+                continue
+            # 宽表只保留主键/索引列和得分最高的列
+            keyed = [c['name'] for c in columns if c['key']]
+            scored = sorted((c['name'] for c in columns if column_scores.get((table, c['name']))),
+                            key=lambda name: -column_scores[(table, name)])
+            chosen = set(keyed + scored[:SCHEMA_PROMPT_MAX_COLUMNS])
+            selection.append((table, [c['name'] for c in columns if c['name'] in chosen]))
+        return selection
+
+    def context_for(self, prompt):
+        """生成提示词中的【数据库结构】段落；目录为空时返回 None（由调用方使用内置结构）"""
+        selection = self.relevant(prompt)
+        if not selection:
+            return None
+        lines = ["【数据库结构】"]
+        for table, names in selection:
+            info = self.tables[table]
+            comment = f"（{info['comment']}）" if info['comment'] else ''
+            lines.append(f"表名: `{table}`{comment}")
+            for column in info['columns']:
+                if names is not None and column['name'] not in names:
+                    continue
+                parts = [f"- {column['name']} {column['type']}"]
+                if column['comment']:
+                    parts.append(column['comment'])
+                if column['samples']:
+                    parts.append(f"取值如: {', '.join(column['samples'])}")
+                lines.append(' '.join(parts))
+        return '\n'.join(lines)
+
+    def stats(self):
+        return {
+            'version': self.version,
+            'tables': len(self.tables),
+            'columns': sum(len(t['columns']) for t in self.tables.values()),
+        }
+
+
+# 进程内共享的表结构目录
+schema_catalog = SchemaCatalog()
@@ -0,0 +1,151 @@
+"""
+近似 prompt 查找 - 精确缓存未命中时，复用相似问题已生成的 SQL
+"看看张三负责的项目" 与 "查看张三负责的项目" 字符 bigram 相似度足够高，直接复用，不再调用 LLM
+
+实现：字符 n-gram -> MinHash 签名（NumPy 向量化）-> LSH 分桶找候选 -> 精确 Jaccard 复核
+容量有上限，写满后覆盖最早的条目（环形缓冲）
+相似但槽位不同（"张三的项目" vs "李四的项目"、"大于十万" vs "大于二十万"）的问题 SQL 条件不同，不复用
+"""
+
+import os
+import threading
+import zlib
+import numpy as np
+from sql_template import extract_slots
+
+SIMILARITY_ENABLED = os.getenv('SIMILARITY_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+SIMILARITY_THRESHOLD = float(os.getenv('SIMILARITY_THRESHOLD', 0.75))
+SIMILARITY_CAPACITY = int(os.getenv('SIMILARITY_CAPACITY', 100000))
+
+_MERSENNE_PRIME = np.uint64((1 << 31) - 1)
+
+
+def _shingles(text, n=2):
+    """字符 n-gram 集合；不足 n 个字符时退化为整串"""
+    if len(text) <= n:
+        return {text} if text else set()
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+def _jaccard(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class SimilarityIndex:
+    """MinHash + LSH 近似索引，支持增量插入、有界容量、按阈值查找"""
+
+    def __init__(self, capacity=SIMILARITY_CAPACITY, threshold=SIMILARITY_THRESHOLD,
+                 bands=8, rows=4, ngram=2, seed=20240601):
+        self.capacity = capacity
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = rows
+        self.ngram = ngram
+        num_perm = bands * rows
+
+        rng = np.random.default_rng(seed)
+        # 哈希族 h(x) = (a*x + b) mod p，a、b < 2^31，x < 2^32，乘积不会溢出 uint64
+        self._a = rng.integers(1, int(_MERSENNE_PRIME), size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, int(_MERSENNE_PRIME), size=num_perm, dtype=np.uint64)
+        # 每个 band 的 rows 个签名值压成一个 uint64 桶号
+        self._band_mult = rng.integers(1, 1 << 63, size=rows, dtype=np.uint64)
+
+        self._band_keys = np.zeros((capacity, bands), dtype=np.uint64)
+        self._buckets = [dict() for _ in range(bands)]   # 每个 band: 桶号 -> {slot}
+        self._texts = [None] * capacity
+        self._shingle_sets = [None] * capacity
+        self._sqls = [None] * capacity
+        self._slot_of = {}      # 规范化文本 -> slot，重复插入时原地更新
+        self._next = 0
+        self._size = 0
+        self._lock = threading.Lock()
+
+        self.lookups = 0
+        self.hits = 0
+
+    def _band_keys_for(self, shingles):
+        hashed = np.fromiter((zlib.crc32(s.encode('utf-8')) for s in shingles),
+                             dtype=np.uint64, count=len(shingles))
+        # (num_shingles, num_perm) 取每列最小值即 MinHash 签名
+        signature = ((hashed[:, None] * self._a + self._b) % _MERSENNE_PRIME).min(axis=0)
+        return (signature.reshape(self.bands, self.rows) * self._band_mult).sum(axis=1)
+
+    def _remove_slot(self, slot):
+        text = self._texts[slot]
+        if text is None:
+            return
+        for band, key in enumerate(self._band_keys[slot].tolist()):
+            bucket = self._buckets[band].get(key)
+            if bucket is not None:
+                bucket.discard(slot)
+                if not bucket:
+                    del self._buckets[band][key]
+        self._slot_of.pop(text, None)
+        self._texts[slot] = self._shingle_sets[slot] = self._sqls[slot] = None
+        self._size -= 1
+
+    def add(self, text, sql):
+        """插入（或更新）一条 规范化 prompt -> SQL 记录"""
+        shingles = _shingles(text, self.ngram)
+        if not shingles:
+            return
+        keys = self._band_keys_for(shingles)
+        with self._lock:
+            slot = self._slot_of.get(text)
+            if slot is not None:
+                self._sqls[slot] = sql
+                return
+            slot = self._next
+            self._next = (self._next + 1) % self.capacity
+            # 环形缓冲写满后淘汰最早的记录
+            self._remove_slot(slot)
+
+            self._band_keys[slot] = keys
+            for band, key in enumerate(keys.tolist()):
+                self._buckets[band].setdefault(key, set()).add(slot)
+            self._texts[slot] = text
+            self._shingle_sets[slot] = shingles
+            self._sqls[slot] = sql
+            self._slot_of[text] = slot
+            self._size += 1
+
+    def lookup(self, text):
+        """返回 (sql, 相似度, 命中的原 prompt)，没有足够相似的记录时返回 None"""
+        shingles = _shingles(text, self.ngram)
+        if not shingles:
+            return None
+        keys = self._band_keys_for(shingles).tolist()
+        literals = extract_slots(text)[1]
+
+        with self._lock:
+            self.lookups += 1
+            candidates = set()
+            for band, key in enumerate(keys):
+                bucket = self._buckets[band].get(key)
+                if bucket:
+                    candidates.update(bucket)
+
+            best = None
+            for slot in candidates:
+                score = _jaccard(shingles, self._shingle_sets[slot])
+                if score < self.threshold or (best and score <= best[1]):
+                    continue
+                # 实体、日期或数字（含中文数字）不同意味着 SQL 条件不同，不能复用
+                if extract_slots(self._texts[slot])[1] != literals:
+                    continue
+                best = (self._sqls[slot], score, self._texts[slot])
+
+            if best:
+                self.hits += 1
+            return best
+
+    def stats(self):
+        return {
+            'size': self._size,
+            'capacity': self.capacity,
+            'threshold': self.threshold,
+            'lookups': self.lookups,
+            'hits': self.hits,
+        }
@@ -0,0 +1,102 @@
+"""
+单飞（single-flight）合并 - 同一个缓存 key 同时只生成一次
+进程内：相同 key 的并发请求共享同一个 asyncio Task
+跨 worker：通过 Redis SET NX PX 租约，只有拿到租约的 worker 调用 LLM，其余轮询结果
+"""
+
+import asyncio
+import os
+import time
+import uuid
+
+# 租约时长需覆盖一次 LLM 调用的最长耗时
+LEASE_TTL_MS = int(os.getenv('SINGLEFLIGHT_LEASE_MS', 30000))
+# 未拿到租约时等待其他 worker 结果的最长时间、轮询间隔
+WAIT_TIMEOUT = float(os.getenv('SINGLEFLIGHT_WAIT_TIMEOUT', 30))
+POLL_INTERVAL = float(os.getenv('SINGLEFLIGHT_POLL_INTERVAL', 0.05))
+
+# 仅当 value 仍是自己的 token 时才删除，避免误删其他 worker 续上的租约
+_RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class SingleFlight:
+    """进程内合并：同一 key 只有一个协程在执行，其余等待同一个结果"""
+
+    def __init__(self):
+        self._inflight = {}
+        self.leaders = 0
+        self.followers = 0
+
+    async def do(self, key, factory):
+        task = self._inflight.get(key)
+        if task is None:
+            self.leaders += 1
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.followers += 1
+        # shield：发起方请求被取消时，不影响其他等待者拿到结果
+        return await asyncio.shield(task)
+
+    def stats(self):
+        return {
+            'inflight': len(self._inflight),
+            'leaders': self.leaders,
+            'followers': self.followers,
+        }
+
+
+async def _release_lease(redis_client, lock_key, token):
+    try:
+        await redis_client.eval(_RELEASE_SCRIPT, 1, lock_key, token)
+    except Exception as e:
+        print(f"⚠️ 释放生成租约失败: {e}")
+
+
+async def generate_with_lease(redis_client, cache_key, generate, ttl, wait=True, store=None):
+    """
+    跨 worker 单飞：拿到租约的 worker 执行 generate() 并写入 cache_key（有效期 ttl 秒），
+    其他 worker 轮询 cache_key 直到结果出现。
+    wait=False 时（后台刷新）拿不到租约直接返回 None。
+    store(key, value, ttl) 为写入缓存的协程函数，默认直接 SETEX。
+    """
+    lock_key = f"lock:{cache_key}"
+    if store is None:
+        async def store(key, value, ttl):
+            await redis_client.setex(key, ttl, value)
+    deadline = time.monotonic() + WAIT_TIMEOUT
+
+    while True:
+        token = uuid.uuid4().hex
+        if await redis_client.set(lock_key, token, nx=True, px=LEASE_TTL_MS):
+            try:
+                value = await generate()
+                await store(cache_key, value, ttl)
+                return value
+            finally:
+                await _release_lease(redis_client, lock_key, token)
+
+        if not wait:
+            return None
+
+        # 其他 worker 正在生成，等待其写入结果
+        while time.monotonic() < deadline:
+            await asyncio.sleep(POLL_INTERVAL)
+            value = await redis_client.get(cache_key)
+            if value:
+                return value
+            if not await redis_client.exists(lock_key):
+                # 持有者已释放（或崩溃后租约过期）却没有写入结果，重新竞争租约
+                break
+        else:
+            # 等待超时，自己生成兜底，保证请求不会无限期挂起
+            print(f"⚠️ 等待其他 worker 生成超时，本地直接生成: {cache_key}")
+            value = await generate()
+            await store(cache_key, value, ttl)
+            return value
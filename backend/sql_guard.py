@@ -0,0 +1,331 @@
+"""
+生成 SQL 的行数上限与 keyset 分页
+- enforce_limit：注入/收紧 LIMIT，单次请求最多返回 MAX_ROWS 行
+- paginate：按 ORDER BY 列（默认 id）做 keyset 分页，续页令牌不透明，翻页不需要 OFFSET 扫描
+"""
+
+import base64
+import hashlib
+import json
+import os
+import re
+
+MAX_ROWS = int(os.getenv('SQL_MAX_ROWS', 1000))
+STREAM_MAX_ROWS = int(os.getenv('SQL_STREAM_MAX_ROWS', 100000))
+# Arrow / Parquet 导出按列编码、内存按批占用，上限可以更高
+EXPORT_MAX_ROWS = int(os.getenv('SQL_EXPORT_MAX_ROWS', 1000000))
+DEFAULT_PAGE_SIZE = int(os.getenv('SQL_DEFAULT_PAGE_SIZE', 100))
+
+_WORD_RE = re.compile(r'[A-Za-z_][A-Za-z0-9_]*')
+_LIMIT_TAIL_RE = re.compile(r'^LIMIT\s+(\d+)(?:\s*,\s*(\d+))?(?:\s+OFFSET\s+(\d+))?\s*$', re.IGNORECASE)
+_COLUMN_RE = re.compile(r'^(?:`?\w+`?\.)?`?(\w+)`?$')
+_ORDER_ITEM_RE = re.compile(r'^(.+?)(?:\s+(ASC|DESC))?$', re.IGNORECASE | re.DOTALL)
+
+
+class InvalidCursorError(ValueError):
+    """续页令牌无效或不属于当前查询"""
+
+
+def strip_comments(sql):
+    """去掉引号外的 -- / # 行注释与 /* */ 块注释（保留 /*+ */ 优化器提示）"""
+    out = []
+    quote = None
+    i = 0
+    n = len(sql)
+    while i < n:
+        ch = sql[i]
+        if quote:
+            out.append(ch)
+            if ch == '\\' and quote != '`' and i + 1 < n:
+                out.append(sql[i + 1])
+                i += 2
+                continue
+            if ch == quote:
+                quote = None
+            i += 1
+            continue
+        if ch in ("'", '"', '`'):
+            quote = ch
+        elif ch == '#' or (sql.startswith('--', i) and (i + 2 >= n or sql[i + 2].isspace())):
+            end = sql.find('\n', i)
+            i = n if end < 0 else end
+            continue
+        elif sql.startswith('/*', i) and not sql.startswith('/*+', i):
+            end = sql.find('*/', i + 2)
+            i = n if end < 0 else end + 2
+            out.append(' ')
+            continue
+        out.append(ch)
+        i += 1
+    return ''.join(out)
+
+
+def strip_sql(sql):
+    """去掉注释、首尾空白与末尾分号"""
+    return strip_comments(sql).strip().rstrip(';').strip()
+
+
+def _top_level_words(sql):
+    """返回括号外、引号外的关键字 [(大写单词, 起始位置)]"""
+    words = []
+    depth = 0
+    quote = None
+    i = 0
+    n = len(sql)
+    while i < n:
+        ch = sql[i]
+        if quote:
+            if ch == '\\' and quote != '`':
+                i += 2
+                continue
+            if ch == quote:
+                if i + 1 < n and sql[i + 1] == quote:
+                    i += 2
+                    continue
+                quote = None
+            i += 1
+            continue
+        if ch in ("'", '"', '`'):
+            quote = ch
+        elif ch == '(':
+            depth += 1
+        elif ch == ')':
+            depth -= 1
+        elif depth == 0 and (ch.isalpha() or ch == '_'):
+            m = _WORD_RE.match(sql, i)
+            words.append((m.group(0).upper(), i))
+            i = m.end()
+            continue
+        i += 1
+    return words
+
+
+def _clause_positions(sql):
+    """顶层子句起始位置：{'FROM': pos, 'ORDER BY': pos, 'LIMIT': pos, ...}（取最后一次出现）"""
+    words = _top_level_words(sql)
+    positions = {}
+    for index, (word, pos) in enumerate(words):
+        following = words[index + 1][0] if index + 1 < len(words) else None
+        if word in ('ORDER', 'GROUP') and following == 'BY':
+            positions[f"{word} BY"] = pos
+        elif word in ('SELECT', 'FROM', 'WHERE', 'HAVING', 'LIMIT', 'UNION', 'DISTINCT', 'FOR', 'INTO'):
+            if word == 'SELECT' and word in positions:
+                continue
+            positions[word] = pos
+    return positions
+
+
+def _split_top_level_commas(text):
+    parts = []
+    depth = 0
+    quote = None
+    start = 0
+    for i, ch in enumerate(text):
+        if quote:
+            if ch == quote:
+                quote = None
+            continue
+        if ch in ("'", '"', '`'):
+            quote = ch
+        elif ch == '(':
+            depth += 1
+        elif ch == ')':
+            depth -= 1
+        elif ch == ',' and depth == 0:
+            parts.append(text[start:i].strip())
+            start = i + 1
+    parts.append(text[start:].strip())
+    return [p for p in parts if p]
+
+
+def clause_text(sql, clause):
+    """顶层子句内容（不含关键字本身），如 clause_text(sql, 'WHERE')；不存在时返回空串"""
+    sql = strip_sql(sql)
+    positions = _clause_positions(sql)
+    start = positions.get(clause)
+    if start is None:
+        return ''
+    following = [pos for pos in positions.values() if pos > start]
+    end = min(following) if following else len(sql)
+    keyword = re.match(r'\s+'.join(clause.split()) + r'\b', sql[start:end], re.IGNORECASE)
+    return sql[start + keyword.end():end].strip()
+
+
+def split_limit(sql):
+    """拆出末尾的 LIMIT：返回 (不含 LIMIT 的 SQL, limit, offset)；LIMIT 不是字面量时 limit 为 None"""
+    sql = strip_sql(sql)
+    pos = _clause_positions(sql).get('LIMIT')
+    if pos is None:
+        return sql, None, 0
+    m = _LIMIT_TAIL_RE.match(sql[pos:])
+    if not m:
+        return sql, None, 0
+    first, second, offset = m.groups()
+    body = sql[:pos].rstrip()
+    if second is not None:            # LIMIT offset, count
+        return body, int(second), int(first)
+    return body, int(first), int(offset or 0)
+
+
+def enforce_limit(sql, max_rows=MAX_ROWS):
+    """保证 SQL 最多返回 max_rows 行：没有 LIMIT 则追加，超出则收紧，无法解析则外包一层"""
+    sql = strip_sql(sql)
+    positions = _clause_positions(sql)
+    body, limit, offset = split_limit(sql)
+    if 'LIMIT' in positions and limit is None:
+        # LIMIT 使用了占位符等无法静态判断的写法，外包一层保证上限
+        return f"SELECT * FROM ({sql}) AS _capped LIMIT {max_rows}"
+    if 'UNION' in positions and limit is None:
+        return f"SELECT * FROM ({sql}) AS _capped LIMIT {max_rows}"
+    limit = max_rows if limit is None else min(limit, max_rows)
+    return f"{body} LIMIT {offset}, {limit}" if offset else f"{body} LIMIT {limit}"
+
+
+def _order_keys(body, positions):
+    """解析顶层 ORDER BY，返回 ([列名], 方向) ；不是简单列或方向不一致时返回 None"""
+    pos = positions.get('ORDER BY')
+    if pos is None:
+        return [], 'ASC'
+    clause = body[pos:].split(None, 2)[2]
+    keys = []
+    directions = set()
+    for item in _split_top_level_commas(clause):
+        m = _ORDER_ITEM_RE.match(item.strip())
+        column = _COLUMN_RE.match(m.group(1).strip())
+        if not column:
+            return None
+        keys.append(column.group(1))
+        directions.add((m.group(2) or 'ASC').upper())
+    if len(directions) > 1:
+        return None
+    return keys, directions.pop()
+
+
+def _selected_columns(body, positions):
+    """select 列表中可用作分页键的输出列名；SELECT * 返回 None 表示所有列都可用"""
+    select_pos = positions.get('SELECT')
+    from_pos = positions.get('FROM')
+    if select_pos is None or from_pos is None:
+        return set()
+    items = _split_top_level_commas(body[select_pos + len('SELECT'):from_pos])
+    names = set()
+    for item in items:
+        if item == '*' or item.endswith('.*'):
+            return None
+        alias = re.search(r'\s+(?:AS\s+)?`?(\w+)`?$', item, re.IGNORECASE)
+        column = _COLUMN_RE.match(item)
+        if column:
+            names.add(column.group(1))
+        elif alias:
+            names.add(alias.group(1))
+    return names
+
+
+def _sql_fingerprint(sql):
+    return hashlib.sha256(strip_sql(sql).encode('utf-8')).hexdigest()[:12]
+
+
+def encode_cursor(sql, values):
+    raw = json.dumps({'h': _sql_fingerprint(sql), 'v': values}, ensure_ascii=False, default=str)
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(sql, token):
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8'))
+        values = data['v']
+        fingerprint = data['h']
+    except Exception:
+        raise InvalidCursorError("续页令牌格式错误")
+    if fingerprint != _sql_fingerprint(sql) or not isinstance(values, list):
+        raise InvalidCursorError("续页令牌与当前查询不匹配")
+    if not all(v is None or isinstance(v, (str, int, float)) for v in values):
+        raise InvalidCursorError("续页令牌格式错误")
+    return values
+
+
+class Page:
+    """一次分页查询：sql / params 为实际执行的语句，keys 为分页键列名"""
+
+    def __init__(self, sql, params, keys, page_size, base_sql):
+        self.sql = sql
+        self.params = params
+        self.keys = keys
+        self.page_size = page_size
+        self.base_sql = base_sql
+
+    def finish(self, rows, columns=None):
+        """
+        多取的一行用来判断是否还有下一页；返回 (本页行, 下一页令牌或 None)
+        rows 为字典行；传入 columns 时 rows 为按 columns 顺序的元组行（列式响应）
+        """
+        if len(rows) <= self.page_size:
+            return rows, None
+        rows = rows[:self.page_size]
+        last = rows[-1]
+        if columns is None:
+            values = [last.get(k) for k in self.keys]
+        else:
+            values = [last[columns.index(k)] if k in columns else None for k in self.keys]
+        if any(v is None for v in values):
+            # 分页键为 NULL 时行值比较不成立，无法安全续页
+            return rows, None
+        return rows, encode_cursor(self.base_sql, values)
+
+
+def paginate(sql, params=None, page_size=None, cursor=None, max_rows=MAX_ROWS):
+    """
+    构造 keyset 分页查询；SQL 不适合 keyset（聚合、UNION、混合排序方向、未选出分页键等）时返回 None，
+    调用方应退回 enforce_limit
+    """
+    page_size = max(1, min(page_size or DEFAULT_PAGE_SIZE, max_rows))
+    base = strip_sql(sql)
+    positions = _clause_positions(base)
+    if any(k in positions for k in ('GROUP BY', 'HAVING', 'UNION', 'DISTINCT', 'FOR', 'INTO')):
+        return None
+    # 模板参数与分页参数会一起绑定，残留字符串里的 %s 会被误当成占位符
+    if params is None and '%s' in base:
+        return None
+
+    body, limit, offset = split_limit(base)
+    if 'LIMIT' in positions and limit is None:
+        return None
+    order = _order_keys(body, _clause_positions(body))
+    if order is None:
+        return None
+    keys, direction = order
+    needs_tiebreak = 'id' not in keys
+    if needs_tiebreak:
+        keys = keys + ['id']
+    selected = _selected_columns(body, _clause_positions(body))
+    if selected is not None and not set(keys) <= selected:
+        return None
+
+    if limit is not None:
+        # 原 SQL 自带 LIMIT（如"预算最高的 10 个"）：在该范围内分页；
+        # 内层排序补上 id 作为唯一的次要排序键，否则并列值在 LIMIT 边界上取到哪些行不确定，各页会不一致
+        limit = min(limit, max_rows)
+        if needs_tiebreak:
+            has_order = _clause_positions(body).get('ORDER BY') is not None
+            body = f"{body}, `id` {direction}" if has_order else f"{body} ORDER BY `id`"
+        inner = f"{body} LIMIT {offset}, {limit}" if offset else f"{body} LIMIT {limit}"
+    else:
+        # 没有 LIMIT 时去掉内层 ORDER BY，便于优化器把派生表合并进外层并走索引
+        order_pos = _clause_positions(body).get('ORDER BY')
+        inner = body[:order_pos].rstrip() if order_pos is not None else body
+
+    key_list = ', '.join(f"`_page`.`{k}`" for k in keys)
+    order_list = ', '.join(f"`_page`.`{k}` {direction}" for k in keys)
+    page_params = list(params or [])
+    where = ''
+    if cursor:
+        values = decode_cursor(base, cursor)
+        if len(values) != len(keys):
+            raise InvalidCursorError("续页令牌与当前查询不匹配")
+        op = '<' if direction == 'DESC' else '>'
+        where = f" WHERE ({key_list}) {op} ({', '.join(['%s'] * len(keys))})"
+        page_params.extend(values)
+
+    paged_sql = f"SELECT * FROM ({inner}) AS `_page`{where} ORDER BY {order_list} LIMIT {page_size + 1}"
+    return Page(paged_sql, tuple(page_params) if page_params else None, keys, page_size, base)
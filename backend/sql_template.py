@@ -0,0 +1,224 @@
+"""
+参数化 SQL 模板缓存 - 只有字面量不同的问题复用同一条 SQL 模板
+"预算大于10万的项目" 与 "预算大于20万的项目" 都会规范化成 "预算大于{number}的项目"，
+第一次由 LLM 生成 SQL 后抽出模板，之后本地填入参数即可执行，不再调用 LLM
+"""
+
+import os
+import re
+import threading
+from collections import OrderedDict
+from entity_dictionary import entity_dictionary
+
+TEMPLATE_CACHE_SIZE = int(os.getenv('TEMPLATE_CACHE_SIZE', 10000))
+
+_UNITS = {'千': 1000, 'k': 1000, '万': 10000, 'w': 10000, '亿': 100000000}
+_DATE_RE = re.compile(r'(\d{4})(?:-|年)(\d{1,2})(?:-|月)(\d{1,2})日?')
+_NUMBER_RE = re.compile(r'(?<![\d.])(\d+(?:\.\d+)?)(千|k|万|w|亿)?(?![\d.])')
+# 中文数字（"二十万"、"三千五百"）：至少两个字且带十/百/千/万/亿，或 "前五个" 这类单字，避免把 "一下"、"一个" 当成数字
+_CN_NUMBER_RE = re.compile(
+    r'(?=[零〇一二两三四五六七八九十百千万亿]*[十百千万亿])[零〇一二两三四五六七八九十百千万亿]{2,}'
+    r'|(?<=前)[一二两三四五六七八九十](?=[个条名位])'
+)
+_CN_DIGITS = {'零': 0, '〇': 0, '一': 1, '二': 2, '两': 2, '三': 3, '四': 4, '五': 5, '六': 6, '七': 7, '八': 8, '九': 9}
+_CN_SMALL_UNITS = {'十': 10, '百': 100, '千': 1000}
+# SQL 字面量：字符串（支持 '' 与 \' 转义）或独立的数字
+_SQL_LITERAL_RE = re.compile(r"'((?:[^'\\]|\\.|'')*)'|(?<![\w.`])(\d+(?:\.\d+)?)(?![\w.`])")
+
+
+def _to_number(text, unit=None):
+    value = float(text) * _UNITS.get(unit, 1)
+    return int(value) if value.is_integer() else value
+
+
+def parse_chinese_number(text):
+    """中文数字转整数："二十万" -> 200000，"十五" -> 15，"一亿两千万" -> 120000000"""
+    total = section = number = 0
+    for ch in text:
+        if ch in _CN_DIGITS:
+            number = _CN_DIGITS[ch]
+        elif ch in _CN_SMALL_UNITS:
+            # "十五" 省略了 "一"
+            section += (number or 1) * _CN_SMALL_UNITS[ch]
+            number = 0
+        elif ch == '万':
+            total += (section + number or 1) * 10000
+            section = number = 0
+        elif ch == '亿':
+            total = (total + section + number or 1) * 100000000
+            section = number = 0
+    return total + section + number
+
+
+def extract_slots(text):
+    """
+    从规范化后的 prompt 中抽取字面量槽位
+    返回 (模板文本, [(槽位类型, 取值)])，槽位类型为实体列名 / date / number（含中文数字）
+    """
+    spans = []
+    for start, end, column, value in entity_dictionary.find(text):
+        spans.append((start, end, column, value))
+
+    def _free(start, end):
+        return all(end <= s or start >= e for s, e, _, _ in spans)
+
+    for m in _DATE_RE.finditer(text):
+        if _free(m.start(), m.end()):
+            year, month, day = m.groups()
+            spans.append((m.start(), m.end(), 'date', f"{year}-{int(month):02d}-{int(day):02d}"))
+
+    for m in _NUMBER_RE.finditer(text):
+        if _free(m.start(), m.end()):
+            spans.append((m.start(), m.end(), 'number', _to_number(m.group(1), m.group(2))))
+
+    for m in _CN_NUMBER_RE.finditer(text):
+        if _free(m.start(), m.end()):
+            spans.append((m.start(), m.end(), 'number', parse_chinese_number(m.group(0))))
+
+    spans.sort()
+    parts = []
+    slots = []
+    pos = 0
+    for start, end, kind, value in spans:
+        parts.append(text[pos:start])
+        parts.append('{' + kind + '}')
+        slots.append((kind, value))
+        pos = end
+    parts.append(text[pos:])
+    return ''.join(parts), slots
+
+
+def _unescape(content):
+    return content.replace("''", "'").replace("\\'", "'").replace('\\\\', '\\')
+
+
+def _match_literal(kind, value, string_content, number_text):
+    """判断一个 SQL 字面量是否来自该槽位，返回 (前缀, 后缀) 或 None"""
+    if kind == 'number':
+        if number_text is not None and float(number_text) == float(value):
+            return '', ''
+        return None
+    if string_content is None:
+        return None
+    content = _unescape(string_content)
+    value = str(value)
+    # 支持 LIKE 模糊匹配的 '%值%'
+    for prefix, suffix in (('', ''), ('%', '%'), ('%', ''), ('', '%')):
+        if content == f"{prefix}{value}{suffix}":
+            return prefix, suffix
+    return None
+
+
+class SqlTemplate:
+    """参数化 SQL：sql 中的 %s 依次由 param_map 指定的槽位填充"""
+
+    __slots__ = ('sql', 'param_map')
+
+    def __init__(self, sql, param_map):
+        self.sql = sql
+        self.param_map = param_map  # [(槽位序号, 前缀, 后缀)]
+
+    def bind(self, slots):
+        params = []
+        for index, prefix, suffix in self.param_map:
+            kind, value = slots[index]
+            params.append(value if kind == 'number' else f"{prefix}{value}{suffix}")
+        return tuple(params)
+
+
+def build_template(sql, slots):
+    """从 LLM 生成的 SQL 中抽取模板；每个槽位必须且只能对应一个字面量，否则返回 None"""
+    literals = list(_SQL_LITERAL_RE.finditer(sql))
+    owner = {}  # 字面量序号 -> (槽位序号, 前缀, 后缀)
+    for slot_index, (kind, value) in enumerate(slots):
+        matches = []
+        for lit_index, m in enumerate(literals):
+            affix = _match_literal(kind, value, m.group(1), m.group(2))
+            if affix is not None:
+                matches.append((lit_index, affix))
+        if len(matches) != 1 or matches[0][0] in owner:
+            return None
+        lit_index, (prefix, suffix) = matches[0]
+        owner[lit_index] = (slot_index, prefix, suffix)
+
+    parts = []
+    param_map = []
+    pos = 0
+    for lit_index, m in enumerate(literals):
+        if lit_index in owner:
+            parts.append(sql[pos:m.start()])
+            parts.append('%s')
+            param_map.append(owner[lit_index])
+            pos = m.end()
+        elif m.group(1) is not None and '%s' in m.group(1):
+            # 残留的字面量里有 %s，会被当成占位符，放弃模板化
+            return None
+    parts.append(sql[pos:])
+    return SqlTemplate(''.join(parts), param_map)
+
+
+def render_sql(sql, params):
+    """把参数内联回 SQL，仅用于展示与缓存"""
+    if not params:
+        return sql
+    pieces = sql.split('%s')
+    out = [pieces[0]]
+    for value, piece in zip(params, pieces[1:]):
+        if isinstance(value, (int, float)):
+            out.append(str(value))
+        else:
+            out.append("'" + str(value).replace('\\', '\\\\').replace("'", "''") + "'")
+        out.append(piece)
+    return ''.join(out)
+
+
+class TemplateStore:
+    """prompt 模板 -> SQL 模板 的有界 LRU 缓存"""
+
+    def __init__(self, capacity=TEMPLATE_CACHE_SIZE):
+        self.capacity = capacity
+        self._templates = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.learned = 0
+
+    def lookup(self, text):
+        """命中时返回 (模板 SQL, 参数)，否则返回 None"""
+        prompt_template, slots = extract_slots(text)
+        if not slots:
+            return None
+        with self._lock:
+            template = self._templates.get(prompt_template)
+            if template is None:
+                self.misses += 1
+                return None
+            self._templates.move_to_end(prompt_template)
+            self.hits += 1
+        return template.sql, template.bind(slots)
+
+    def learn(self, text, sql):
+        """记录一次 LLM 生成结果；能抽出模板时返回 True"""
+        prompt_template, slots = extract_slots(text)
+        if not slots:
+            return False
+        template = build_template(sql, slots)
+        if template is None:
+            return False
+        with self._lock:
+            self._templates[prompt_template] = template
+            self._templates.move_to_end(prompt_template)
+            while len(self._templates) > self.capacity:
+                self._templates.popitem(last=False)
+            self.learned += 1
+        return True
+
+    def stats(self):
+        return {
+            'size': len(self._templates),
+            'capacity': self.capacity,
+            'hits': self.hits,
+            'misses': self.misses,
+            'learned': self.learned,
+            'entities': len(entity_dictionary),
+        }
@@ -0,0 +1,74 @@
+"""
+前端静态文件 - 带内容指纹的长缓存
+index.html 中引用的本地资源改写为 app.js?v=<内容哈希>，带正确指纹的请求返回一年期 immutable 缓存；
+index.html 本身每次协商（ETag），前端发布后刷新页面即可拿到新指纹
+"""
+
+import hashlib
+import os
+import re
+from urllib.parse import parse_qs
+from starlette.responses import Response
+from starlette.staticfiles import StaticFiles
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+REVALIDATE_CACHE_CONTROL = 'no-cache'
+
+_ASSET_REF_RE = re.compile(r'''(\b(?:src|href)=["'])([^"':?#]+)(["'])''')
+
+
+def _file_hash(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()[:12]
+
+
+def etag_matches(if_none_match, etag):
+    """If-None-Match 弱比较：忽略 W/ 前缀，支持逗号分隔的多个值与 *"""
+    if not if_none_match:
+        return False
+    target = etag.removeprefix('W/')
+    return any(tag.strip() == '*' or tag.strip().removeprefix('W/') == target for tag in if_none_match.split(','))
+
+
+class FrontendFiles(StaticFiles):
+    """StaticFiles + 资源指纹与缓存头（文件在启动时计算指纹，发布新前端需重启服务）"""
+
+    def __init__(self, directory, index='index.html'):
+        super().__init__(directory=directory, html=True)
+        self.index = index
+        self.fingerprints = {}
+        for root, _, files in os.walk(directory):
+            for name in files:
+                if name == index:
+                    continue
+                full = os.path.join(root, name)
+                self.fingerprints[os.path.relpath(full, directory).replace(os.sep, '/')] = _file_hash(full)
+        with open(os.path.join(directory, index), encoding='utf-8') as f:
+            self.index_html = _ASSET_REF_RE.sub(self._versioned, f.read()).encode('utf-8')
+        self.index_etag = f'"{hashlib.sha256(self.index_html).hexdigest()[:16]}"'
+
+    def _versioned(self, m):
+        name = m.group(2).removeprefix('./')
+        version = self.fingerprints.get(name)
+        if version is None:
+            return m.group(0)
+        return f"{m.group(1)}{m.group(2)}?v={version}{m.group(3)}"
+
+    def index_response(self, scope):
+        headers = {'ETag': self.index_etag, 'Cache-Control': REVALIDATE_CACHE_CONTROL}
+        if_none_match = dict(scope['headers']).get(b'if-none-match', b'').decode('latin-1')
+        if etag_matches(if_none_match, self.index_etag):
+            return Response(status_code=304, headers=headers)
+        return Response(self.index_html, media_type='text/html', headers=headers)
+
+    async def get_response(self, path, scope):
+        if path in ('.', self.index):
+            return self.index_response(scope)
+        response = await super().get_response(path, scope)
+        version = parse_qs(scope.get('query_string', b'').decode('latin-1')).get('v', [None])[0]
+        expected = self.fingerprints.get(path.replace(os.sep, '/'))
+        if response.status_code in (200, 304) and version and version == expected:
+            response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+        else:
+            response.headers.setdefault('Cache-Control', REVALIDATE_CACHE_CONTROL)
+        return response
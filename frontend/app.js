@@ -8,6 +8,8 @@ createApp({
         const isLoading = ref(false)
         const errorMessage = ref('')
         const isCacheHit = ref(false)
+        // 上次的响应与 ETag（按问题缓存），重复查询时带 If-None-Match，结果未变化则服务端返回 304
+        const etagCache = new Map()
 
         const doQuery = async () => {
             if (!userQuestion.value) return;
@@ -20,17 +22,30 @@ createApp({
             isCacheHit.value = false;
 
             try {
+                const prompt = userQuestion.value;
+                const cached = etagCache.get(prompt);
+                const headers = { 'Content-Type': 'application/json' };
+                if (cached) {
+                    headers['If-None-Match'] = cached.etag;
+                }
                 // 后端 API 地址
                 const response = await fetch('/ask', {
                     method: 'POST',
-                    headers: {
-                        'Content-Type': 'application/json'
-                    },
-                    body: JSON.stringify({ prompt: userQuestion.value })
+                    headers,
+                    body: JSON.stringify({ prompt })
                 });
                 
                 console.log("📡 [前端] 收到后端原始响应:", response.status);
-                const data = await response.json();
+                let data;
+                if (response.status === 304 && cached) {
+                    data = cached.data;
+                } else {
+                    data = await response.json();
+                    const etag = response.headers.get('ETag');
+                    if (etag && data.status === 'success') {
+                        etagCache.set(prompt, { etag, data });
+                    }
+                }
                 console.log("📦 [前端] 解析后的数据:", data);
                 
                 if (data.status === 'success') {
@@ -38,7 +53,7 @@ createApp({
                     generatedSql.value = data.sql;
                     isCacheHit.value = data.cache_hit;
                 } else {
-                    errorMessage.value = '查询出错了：' + data.message;
+                    errorMessage.value = '查询出错了：' + (data.message || data.detail);
                     generatedSql.value = data.sql;
                 }
             } catch (err) {
@@ -1,7 +1,15 @@
 import os
 from volcenginesdkarkruntime import Ark
+from dotenv import load_dotenv
 import re
 
+# 无法理解的输入时返回的默认查询（不应写入缓存）
+DEFAULT_SQL = "SELECT * FROM ai_projects LIMIT 10;"
+
+
+class LLMServiceError(Exception):
+    """LLM 调用失败（网络、鉴权、限流等），由调用方返回错误，不能当作生成结果缓存"""
+
 # 延迟初始化的客户端
 _client = None
 
@@ -70,9 +78,9 @@ def get_sql_from_llm(user_prompt: str):
         # 3. 终极防御：如果输出不以 SELECT 开头，强制返回默认查询
         if not sql.upper().startswith("SELECT"):
             print(f"⚠️ 拦截到非 SQL 输出: {sql[:50]}...")
-            return "SELECT * FROM ai_projects LIMIT 10;"
+            return DEFAULT_SQL
             
         return sql
     except Exception as e:
         print(f"❌ AI 调用失败: {e}")
-        return "SELECT * FROM ai_projects LIMIT 10;"
+        raise LLMServiceError(str(e)) from e
@@ -1,10 +1,16 @@
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
+from typing import List
 import os
+import asyncio
+import time
+from collections import OrderedDict
 from dotenv import load_dotenv
 
 # 引入你的LLM服务（已验证可用）
-from llm_service import get_sql_from_llm
+from llm_service import get_sql_from_llm, DEFAULT_SQL, LLMServiceError
+# 与 backend 共用同一套 prompt 规范化与缓存 key 规则
+from prompt_normalizer import make_cache_key
 
 # ========== 基础配置 ==========
 # 加载环境变量（适配函数服务，优先读取函数的环境变量）
@@ -19,6 +25,36 @@ app = FastAPI(
     description="仅返回SQL代码的NLP2SQL MCP服务"
 )
 
+# ========== SQL 缓存 ==========
+# 函数服务实例内的有界 LRU 缓存，规范化后相同的 prompt 不重复调用 LLM
+# 条目带 TTL，表结构或模型调整后旧 SQL 最多保留 SQL_CACHE_TTL 秒
+SQL_CACHE_SIZE = int(os.getenv("SQL_CACHE_SIZE", 1024))
+SQL_CACHE_TTL = int(os.getenv("SQL_CACHE_TTL", 3600))
+# 批量接口：单次最多的 prompt 数与同时进行的 LLM 调用数
+BATCH_MAX_PROMPTS = int(os.getenv("BATCH_MAX_PROMPTS", 100))
+BATCH_LLM_CONCURRENCY = int(os.getenv("BATCH_LLM_CONCURRENCY", 4))
+sql_cache = OrderedDict()
+
+def get_cached_sql(cache_key: str):
+    entry = sql_cache.get(cache_key)
+    if entry is None:
+        return None
+    sql, expires_at = entry
+    if expires_at <= time.monotonic():
+        sql_cache.pop(cache_key, None)
+        return None
+    sql_cache.move_to_end(cache_key)
+    return sql
+
+def put_cached_sql(cache_key: str, sql: str):
+    # 默认查询说明 LLM 没有理解这个问题，不缓存，下次重新生成
+    if sql == DEFAULT_SQL:
+        return
+    sql_cache[cache_key] = (sql, time.monotonic() + SQL_CACHE_TTL)
+    sql_cache.move_to_end(cache_key)
+    while len(sql_cache) > SQL_CACHE_SIZE:
+        sql_cache.popitem(last=False)
+
 # ========== 数据模型（适配MCP的请求/响应规范） ==========
 # 请求体：接收用户的自然语言查询
 class NLP2SQLRequest(BaseModel):
@@ -30,6 +66,14 @@ class NLP2SQLResponse(BaseModel):
     sql: str     # 生成的SQL代码
     message: str = ""  # 错误信息（可选）
 
+# 批量请求 / 响应
+class NLP2SQLBatchRequest(BaseModel):
+    prompts: List[str]
+
+class NLP2SQLBatchResponse(BaseModel):
+    status: str  # success/partial/error
+    results: List[NLP2SQLResponse]
+
 # ========== 核心接口（适配MCP） ==========
 @app.post(
     "/generate-sql",  # 简洁的接口路径
@@ -47,13 +91,23 @@ async def generate_sql(request: NLP2SQLRequest):
     try:
         # 调用你的LLM服务生成SQL（核心逻辑，保留不变）
         prompt = request.prompt.strip()
-        sql = get_sql_from_llm(prompt)
+        cache_key = make_cache_key(prompt)
+        sql = get_cached_sql(cache_key)
+        if sql is None:
+            sql = get_sql_from_llm(prompt)
+            put_cached_sql(cache_key, sql)
         
         # 仅返回SQL，去掉数据库执行、缓存等逻辑
         return NLP2SQLResponse(
             status="success",
             sql=sql
         )
+    except LLMServiceError as e:
+        # LLM 暂时不可用：返回 503 让调用方重试，不返回也不缓存默认 SQL
+        raise HTTPException(
+            status_code=503,
+            detail=f"生成SQL失败：{str(e)}"
+        )
     except Exception as e:
         # 异常处理，返回错误信息
         raise HTTPException(
@@ -61,6 +115,53 @@ async def generate_sql(request: NLP2SQLRequest):
             detail=f"生成SQL失败：{str(e)}"
         )
 
+@app.post(
+    "/generate-sql/batch",
+    operation_id="generate_sql_batch",
+    response_model=NLP2SQLBatchResponse
+)
+async def generate_sql_batch(request: NLP2SQLBatchRequest):
+    """
+    批量接口：一次接收多条自然语言，按提交顺序返回 SQL（相同问题只生成一次，LLM 调用并发受限）
+    """
+    prompts = [p.strip() for p in request.prompts]
+    if not prompts or not all(prompts):
+        raise HTTPException(status_code=400, detail="输入的自然语言查询不能为空")
+    if len(prompts) > BATCH_MAX_PROMPTS:
+        raise HTTPException(status_code=400, detail=f"单次最多 {BATCH_MAX_PROMPTS} 条查询")
+
+    unique = {}
+    for prompt in prompts:
+        unique.setdefault(make_cache_key(prompt), prompt)
+
+    limiter = asyncio.Semaphore(BATCH_LLM_CONCURRENCY)
+
+    async def resolve(cache_key, prompt):
+        sql = get_cached_sql(cache_key)
+        if sql is not None:
+            return sql
+        async with limiter:
+            # 同步的 LLM 调用放到线程中，多个未命中并发生成；失败时抛出 LLMServiceError，
+            # 由 gather 收集为该条的错误，不写缓存
+            sql = await asyncio.to_thread(get_sql_from_llm, prompt)
+        put_cached_sql(cache_key, sql)
+        return sql
+
+    outcomes = await asyncio.gather(*(resolve(k, p) for k, p in unique.items()), return_exceptions=True)
+    resolved = dict(zip(unique, outcomes))
+
+    results = []
+    for prompt in prompts:
+        outcome = resolved[make_cache_key(prompt)]
+        if isinstance(outcome, Exception):
+            results.append(NLP2SQLResponse(status="error", sql="", message=f"生成SQL失败：{outcome}"))
+        else:
+            results.append(NLP2SQLResponse(status="success", sql=outcome))
+    # 整体状态：全部成功 success，部分失败 partial，全部失败 error
+    failed = sum(r.status == "error" for r in results)
+    status = "success" if not failed else ("error" if failed == len(results) else "partial")
+    return NLP2SQLBatchResponse(status=status, results=results)
+
 # ========== 函数服务启动配置 ==========
 # 适配火山引擎函数服务的启动逻辑（监听0.0.0.0，端口固定8000）
 if __name__ == "__main__":
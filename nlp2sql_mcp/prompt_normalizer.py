@@ -0,0 +1,70 @@
+"""
+Prompt 规范化与缓存 key 生成
+"查询所有项目" / "查询所有项目？" / "查询 所有项目吗" 等写法规范化后命中同一个缓存 key
+（nlp2sql_mcp/prompt_normalizer.py 为同一份代码，修改时请同步）
+"""
+
+import hashlib
+import os
+import re
+import unicodedata
+
+# SQL 生成逻辑（提示词、表结构）变化时递增，旧缓存自动失效
+SCHEMA_VERSION = os.getenv('SCHEMA_VERSION', 'v1')
+
+# 句末语气词，不影响查询意图
+TRAILING_PARTICLES = '吗呢吧啊呀嘛哦'
+
+# 有查询含义、需要保留的标点（如 "完成率大于80%"）
+KEEP_PUNCTUATION = {'%'}
+
+# 数字/字母之间有意义的连接符（日期 2023-01-01、小数 10.5、时间 10:30）
+_JOINERS = {'.', '-', '/', ':'}
+
+_CJK_SPACE_RE = re.compile(r'(?<=[^\x00-\x7f])\s+|\s+(?=[^\x00-\x7f])')
+_SPACES_RE = re.compile(r'\s+')
+# 只去掉一个句末语气词，"啊呀"、"哦" 等也可能是名字或内容的一部分
+_TRAILING_PARTICLE_RE = re.compile(f'[{TRAILING_PARTICLES}]$')
+
+
+def _fold_punctuation(text):
+    """标点替换为空格，保留 KEEP_PUNCTUATION 和数字/字母之间的连接符"""
+    chars = []
+    last = len(text) - 1
+    for i, ch in enumerate(text):
+        if not unicodedata.category(ch).startswith('P') or ch in KEEP_PUNCTUATION:
+            chars.append(ch)
+        elif ch in _JOINERS and 0 < i < last and text[i - 1].isalnum() and text[i + 1].isalnum():
+            chars.append(ch)
+        else:
+            chars.append(' ')
+    return ''.join(chars)
+
+
+def normalize_prompt(prompt: str) -> str:
+    """
+    规范化用户输入：
+    1. Unicode NFKC（全角转半角、兼容字符统一）
+    2. 大小写折叠
+    3. 标点折叠为空格，合并空白；中文字符之间的空格去掉
+    4. 去掉一个句末语气词
+    """
+    text = unicodedata.normalize('NFKC', prompt or '')
+    text = text.casefold()
+    text = _fold_punctuation(text)
+    text = _SPACES_RE.sub(' ', text).strip()
+    text = _CJK_SPACE_RE.sub('', text)
+    text = _TRAILING_PARTICLE_RE.sub('', text).strip()
+    return text
+
+
+def make_cache_key(prompt: str, model_id: str = None, schema_version: str = None, prefix: str = 'cache') -> str:
+    """
+    生成定长缓存 key：{prefix}:{schema_version}:{sha256 前 32 位}
+    哈希内容包含模型 ID，切换模型后不会复用旧模型生成的 SQL
+    """
+    model_id = model_id or os.getenv("ARK_ENDPOINT_ID", "doubao-seed-1-6-251015")
+    schema_version = schema_version or SCHEMA_VERSION
+    raw = '\x1f'.join((model_id, schema_version, normalize_prompt(prompt)))
+    digest = hashlib.sha256(raw.encode('utf-8')).hexdigest()[:32]
+    return f"{prefix}:{schema_version}:{digest}"
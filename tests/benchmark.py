@@ -0,0 +1,410 @@
+#!/usr/bin/env python3
+"""
+离线压测 - 不访问付费的 LLM 接口、不依赖 MySQL / Redis，可重复地测量 /ask 的吞吐与各阶段延迟
+- LLM：可配置延迟分布（对数正态，按中位数与 p95 设定）的假模型
+- 缓存：fakeredis（需要 pip install -r tests/requirements-dev.txt，lupa 用于生成租约的 Lua 脚本；
+  未安装时自动退回 --redis none），或 --redis none 只用进程内 L1
+- 数据库：由 data/ai_projects.csv 生成的 SQLite 替身（可按倍数扩充行数），
+  Decimal / date 类型与 mysql-connector 的返回保持一致
+- 负载：规则命中占比、缓存命中率、并发数、结果行数均可配置，随机种子固定
+- 输出：吞吐量、端到端与各阶段 p50/p95/p99；可保存为 JSON 基线并与之对比
+
+用法:
+    python tests/benchmark.py                                  # 默认负载
+    python tests/benchmark.py --requests 2000 --concurrency 64 --hit-ratio 0.9
+    python tests/benchmark.py --rows 500 --scale 20            # 大结果集
+    python tests/benchmark.py --format columnar                # 列式响应
+    python tests/benchmark.py --save-baseline bench_baseline.json
+    python tests/benchmark.py --compare bench_baseline.json    # p95 / 吞吐退化超过阈值时返回非 0
+"""
+
+import argparse
+import asyncio
+import csv
+import datetime
+import decimal
+import json
+import math
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(BASE_DIR, 'backend'))
+
+CSV_PATH = os.path.join(BASE_DIR, 'data', 'ai_projects.csv')
+DECIMAL_COLUMNS = {'total_budget', 'performance_score'}
+DATE_COLUMNS = {'start_date', 'end_date'}
+
+_CREATE_TABLE = """
+CREATE TABLE ai_projects (
+    id INTEGER PRIMARY KEY,
+    architect_name TEXT NOT NULL,
+    project_name TEXT NOT NULL,
+    client_industry TEXT,
+    tech_stack TEXT,
+    episode_count INTEGER,
+    total_budget TEXT,
+    completion_rate INTEGER,
+    start_date TEXT,
+    end_date TEXT,
+    status TEXT,
+    ai_tools_used TEXT,
+    performance_score TEXT
+)
+"""
+
+
+# ========== SQLite 替身 ==========
+
+class SQLiteCursor:
+    """模拟 mysql-connector 游标：%s 占位符、dictionary 行、Decimal / date 类型"""
+
+    def __init__(self, conn, dictionary=False):
+        self._cursor = conn.cursor()
+        self.dictionary = dictionary
+        self.column_names = ()
+        self.description = None
+
+    def execute(self, sql, params=None):
+        self._cursor.execute(sql.replace('%s', '?'), tuple(params or ()))
+        self.description = self._cursor.description
+        self.column_names = tuple(d[0] for d in self.description or ())
+
+    @property
+    def with_rows(self):
+        return self.description is not None
+
+    def _convert(self, row):
+        values = []
+        for column, value in zip(self.column_names, row):
+            if value is not None and column in DECIMAL_COLUMNS:
+                value = decimal.Decimal(str(value))
+            elif value is not None and column in DATE_COLUMNS:
+                value = datetime.date.fromisoformat(value)
+            values.append(value)
+        return dict(zip(self.column_names, values)) if self.dictionary else tuple(values)
+
+    def fetchall(self):
+        return [self._convert(row) for row in self._cursor.fetchall()]
+
+    def fetchmany(self, size):
+        return [self._convert(row) for row in self._cursor.fetchmany(size)]
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        return self._convert(row) if row is not None else None
+
+    def close(self):
+        self._cursor.close()
+
+
+class SQLiteConnection:
+    """每个线程一个 SQLite 连接；close() 与连接池一样只是"归还" """
+
+    def __init__(self, path):
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+
+    def cursor(self, dictionary=False, prepared=False, buffered=None):
+        return SQLiteCursor(self._conn, dictionary)
+
+    def close(self):
+        pass
+
+    def discard(self):
+        pass
+
+
+def seed_sqlite(path, scale=1):
+    """从 CSV 建表，scale > 1 时复制数据（id 重新编号）"""
+    with open(CSV_PATH, encoding='utf-8') as f:
+        rows = list(csv.DictReader(f))
+    conn = sqlite3.connect(path)
+    conn.execute(_CREATE_TABLE)
+    columns = [c for c in rows[0].keys() if c != 'id']
+    records = []
+    next_id = 1
+    for copy in range(scale):
+        for row in rows:
+            name = row['project_name'] if copy == 0 else f"{row['project_name']}_{copy}"
+            records.append([next_id] + [name if c == 'project_name' else row[c] for c in columns])
+            next_id += 1
+    placeholders = ', '.join(['?'] * (len(columns) + 1))
+    conn.executemany(f"INSERT INTO ai_projects (id, {', '.join(columns)}) VALUES ({placeholders})", records)
+    conn.commit()
+    conn.close()
+    return len(records)
+
+
+# ========== 假 LLM ==========
+
+class FakeLLM:
+    """延迟服从对数正态分布（median / p95 相同时为固定延迟），返回 SELECT * ... LIMIT rows"""
+
+    def __init__(self, median_ms, p95_ms, rows, rng):
+        self.mu = math.log(max(median_ms, 0.001) / 1000)
+        self.sigma = max(math.log(max(p95_ms, median_ms) / max(median_ms, 0.001)) / 1.645, 0.0)
+        self.rows = rows
+        self.rng = rng
+        self.calls = 0
+
+    async def __call__(self, prompt, schema_context=None):
+        self.calls += 1
+        await asyncio.sleep(math.exp(self.rng.gauss(self.mu, self.sigma)))
+        return f"SELECT * FROM ai_projects ORDER BY id LIMIT {self.rows};"
+
+
+# ========== 负载 ==========
+
+_CHARS = '赤橙黄绿青蓝紫金银铜铁锡山川河海风云雷电星月日春夏秋冬东南西北甲乙丙丁戊己庚辛'
+_AGGREGATES = ('平均预算走势', '项目数量分布', '评分排行榜', '进度对比分析')
+_ARCHITECTS = ('张三', '李四', '王五', '赵六')
+_STATUSES = ('已交付', '制作中', '策划中', '后期中')
+
+
+def _random_phrase(rng):
+    """随机字串，彼此几乎不相似，避免近似 prompt 索引改变设定的命中率"""
+    return ''.join(rng.choice(_CHARS) for _ in range(6)) + '的' + rng.choice(_AGGREGATES)
+
+
+def _rule_prompt(rng):
+    kind = rng.randrange(3)
+    if kind == 0:
+        return f"预算大于{rng.randint(5, 50)}万的项目"
+    if kind == 1:
+        return f"查看{rng.choice(_ARCHITECTS)}负责的项目"
+    return f"{rng.choice(_STATUSES)}的项目有哪些"
+
+
+def build_workload(args, rng):
+    """返回 (预热用的热门 prompt, 压测请求序列)"""
+    hot = [_random_phrase(rng) for _ in range(args.hot_prompts)]
+    prompts = []
+    for _ in range(args.requests):
+        roll = rng.random()
+        if roll < args.rule_share:
+            prompts.append(_rule_prompt(rng))
+        elif rng.random() < args.hit_ratio:
+            prompts.append(rng.choice(hot))
+        else:
+            prompts.append(_random_phrase(rng) + f"（{rng.randrange(10 ** 9)}号）")
+    return hot, prompts
+
+
+# ========== 统计 ==========
+
+def percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(math.ceil(q * len(ordered))) - 1))
+    return round(ordered[index], 3)
+
+
+def summarize(values):
+    return {
+        'count': len(values),
+        'p50': percentile(values, 0.50),
+        'p95': percentile(values, 0.95),
+        'p99': percentile(values, 0.99),
+    }
+
+
+# ========== 运行 ==========
+
+async def run_benchmark(args):
+    import httpx
+    import main
+    from entity_dictionary import entity_dictionary
+
+    rng = random.Random(args.seed)
+    workdir = tempfile.mkdtemp(prefix='nl2sql_bench_')
+    db_path = os.path.join(workdir, 'bench.db')
+    table_rows = seed_sqlite(db_path, args.scale)
+
+    local = threading.local()
+
+    def get_connection():
+        if not hasattr(local, 'conn'):
+            local.conn = SQLiteConnection(db_path)
+        return local.conn
+
+    fake_llm = FakeLLM(args.llm_median_ms, args.llm_p95_ms, args.rows, random.Random(args.seed + 1))
+
+    # --- 替换外部依赖 ---
+    main.get_db_connection = get_connection
+    main.get_sql_from_llm_async = fake_llm
+    main.EXPLAIN_GUARD_ENABLED = False         # SQLite 没有 EXPLAIN FORMAT=JSON
+    main.query_log.enabled = False
+    main.RESULT_CACHE_ENABLED = args.result_cache
+    main.load_update_time = lambda: 'bench'
+    if args.no_similarity:
+        main.similarity_index = None
+
+    async def init_redis():
+        if args.redis == 'none':
+            return
+        import fakeredis.aioredis
+        client = fakeredis.aioredis.FakeRedis(decode_responses=True)
+        main.redis_client = client
+        main.sql_cache.redis = client
+        main.result_store.redis = client
+
+    async def init_schema_catalog():
+        pass
+
+    main.init_redis = init_redis
+    main.init_schema_catalog = init_schema_catalog
+    main.load_entity_dictionary = lambda: entity_dictionary.load(get_connection())
+
+    hot, prompts = build_workload(args, rng)
+    await main.on_startup()
+    transport = httpx.ASGITransport(app=main.app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url='http://bench', timeout=None) as client:
+            # 预热：热门问题各请求一次，之后的命中率即为设定值
+            for prompt in hot:
+                await client.post('/ask', json={'prompt': prompt})
+            llm_calls_before = fake_llm.calls
+
+            latencies = []
+            stages = defaultdict(list)
+            sources = Counter()
+            errors = 0
+            response_bytes = []
+            queue = iter(prompts)
+
+            async def worker():
+                nonlocal errors
+                for prompt in queue:
+                    started = time.perf_counter()
+                    response = await client.post(
+                        '/ask', json={'prompt': prompt, 'include_timings': True, 'format': args.format})
+                    latencies.append((time.perf_counter() - started) * 1000)
+                    response_bytes.append(len(response.content))
+                    body = response.json()
+                    if response.status_code != 200 or body.get('status') != 'success':
+                        errors += 1
+                        continue
+                    sources[body.get('cache_source')] += 1
+                    for name, ms in body.get('timings', {}).items():
+                        stages[name].append(ms)
+                    for item in response.headers.get('server-timing', '').split(','):
+                        if item.strip().startswith('serialize;dur='):
+                            stages['serialize'].append(float(item.split('=')[1]))
+
+            started = time.perf_counter()
+            await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+            elapsed = time.perf_counter() - started
+    finally:
+        await main.on_shutdown()
+
+    return {
+        'config': {k: v for k, v in vars(args).items() if k not in ('save_baseline', 'compare', 'tolerance')},
+        'table_rows': table_rows,
+        'requests': len(prompts),
+        'errors': errors,
+        'elapsed_s': round(elapsed, 3),
+        'throughput_rps': round(len(prompts) / elapsed, 2) if elapsed else None,
+        'llm_calls': fake_llm.calls - llm_calls_before,
+        'avg_response_bytes': round(sum(response_bytes) / len(response_bytes)) if response_bytes else 0,
+        'sources': dict(sources),
+        'latency_ms': summarize(latencies),
+        'stages_ms': {name: summarize(values) for name, values in sorted(stages.items())},
+    }
+
+
+def print_report(result):
+    print("\n" + "=" * 72)
+    print(f"📊 请求 {result['requests']} 个，错误 {result['errors']} 个，耗时 {result['elapsed_s']}s，"
+          f"吞吐 {result['throughput_rps']} req/s，LLM 调用 {result['llm_calls']} 次，"
+          f"平均响应 {result['avg_response_bytes']} 字节")
+    print(f"   来源分布: {result['sources']}")
+    print("-" * 72)
+    print(f"{'阶段':<22}{'次数':>8}{'p50(ms)':>12}{'p95(ms)':>12}{'p99(ms)':>12}")
+    rows = [('end_to_end', result['latency_ms'])] + list(result['stages_ms'].items())
+    for name, stats in rows:
+        print(f"{name:<22}{stats['count']:>8}{stats['p50']!s:>12}{stats['p95']!s:>12}{stats['p99']!s:>12}")
+    print("=" * 72)
+
+
+def compare_baseline(result, baseline, tolerance):
+    """p95 变慢或吞吐下降超过 tolerance（比例）视为退化，返回退化项列表"""
+    regressions = []
+    base_rps, rps = baseline.get('throughput_rps'), result.get('throughput_rps')
+    if base_rps and rps is not None and rps < base_rps * (1 - tolerance):
+        regressions.append(f"throughput_rps: {base_rps} -> {rps}")
+    pairs = [('end_to_end', baseline.get('latency_ms', {}), result['latency_ms'])]
+    pairs += [(name, baseline.get('stages_ms', {}).get(name, {}), stats)
+              for name, stats in result['stages_ms'].items()]
+    for name, old, new in pairs:
+        before, after = old.get('p95'), new.get('p95')
+        # 亚毫秒级阶段的抖动不算退化
+        if before is not None and after is not None and after > max(before * (1 + tolerance), before + 0.5):
+            regressions.append(f"{name} p95: {before}ms -> {after}ms")
+    return regressions
+
+
+def fakeredis_available():
+    """fakeredis 执行租约的 Lua 脚本还需要 lupa"""
+    try:
+        import fakeredis.aioredis  # noqa: F401
+        import lupa  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="NL2SQL 离线压测")
+    parser.add_argument('--requests', type=int, default=500, help="压测请求数")
+    parser.add_argument('--concurrency', type=int, default=32, help="并发数")
+    parser.add_argument('--hit-ratio', type=float, default=0.8, help="非规则请求中命中热门（已缓存）问题的比例")
+    parser.add_argument('--rule-share', type=float, default=0.3, help="规则快速通道能直接回答的请求占比")
+    parser.add_argument('--hot-prompts', type=int, default=50, help="热门问题个数")
+    parser.add_argument('--rows', type=int, default=100, help="LLM 生成的 SQL 返回行数")
+    parser.add_argument('--scale', type=int, default=1, help="数据行数倍数（CSV 约 100 行）")
+    parser.add_argument('--llm-median-ms', type=float, default=800, help="假 LLM 延迟中位数")
+    parser.add_argument('--llm-p95-ms', type=float, default=2000, help="假 LLM 延迟 p95")
+    parser.add_argument('--format', choices=('rows', 'columnar'), default='rows', help="/ask 响应格式")
+    parser.add_argument('--redis', choices=('fake', 'none'), default='fake', help="L2 缓存：fakeredis 或不使用")
+    parser.add_argument('--result-cache', action='store_true', help="开启结果集缓存")
+    parser.add_argument('--no-similarity', action='store_true', help="关闭近似 prompt 索引")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--save-baseline', help="把结果保存为 JSON 基线")
+    parser.add_argument('--compare', help="与 JSON 基线对比")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="允许的退化比例")
+    args = parser.parse_args()
+
+    if args.redis == 'fake' and not fakeredis_available():
+        print("⚠️  未安装 fakeredis / lupa，改用 --redis none（只用进程内 L1）；"
+              "需要 L2 时请 pip install -r tests/requirements-dev.txt")
+        args.redis = 'none'
+
+    result = asyncio.run(run_benchmark(args))
+    print_report(result)
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"💾 基线已保存: {args.save_baseline}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare_baseline(result, baseline, args.tolerance)
+        if regressions:
+            print("❌ 性能退化:")
+            for item in regressions:
+                print(f"   • {item}")
+            sys.exit(1)
+        print(f"✅ 与基线相比没有超过 {args.tolerance:.0%} 的退化")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+import asyncio
+import os
+import sys
+
+# 将 backend 目录添加到 sys.path，以便导入 main
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(BASE_DIR, 'backend'))
+
+import main
+from prompt_normalizer import make_cache_key
+
+
+def test_stale_refresh_without_redis(monkeypatch):
+    """没有 Redis 时，陈旧的 L1 条目在后台重新生成并写回，而不是刷新失败后一直返回旧 SQL"""
+    async def fake_llm(prompt, schema_context=None):
+        return "SELECT id FROM ai_projects LIMIT 5;"
+
+    monkeypatch.setattr(main, 'redis_client', None)
+    monkeypatch.setattr(main.sql_cache, 'redis', None)
+    monkeypatch.setattr(main, 'get_sql_from_llm_async', fake_llm)
+
+    prompt = '后台刷新测试问题'
+    cache_key = make_cache_key(prompt)
+
+    async def scenario():
+        # 剩余有效期不超过 CACHE_STALE_TTL，即陈旧条目
+        await main.sql_cache.set(cache_key, "SELECT 1;", main.CACHE_STALE_TTL)
+        sql, stale = await main.lookup_cached_sql(cache_key)
+        assert sql == "SELECT 1;" and stale
+
+        main.refresh_in_background(prompt, cache_key)
+        await asyncio.gather(*list(main.background_tasks))
+
+        sql, stale = await main.lookup_cached_sql(cache_key)
+        assert sql == "SELECT id FROM ai_projects LIMIT 5;" and not stale
+
+    asyncio.run(scenario())
@@ -0,0 +1,52 @@
+import os
+import sys
+
+# 将 backend 目录添加到 sys.path，以便导入 intent_rules
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(BASE_DIR, 'backend'))
+
+from intent_rules import intent_matcher
+from prompt_normalizer import normalize_prompt
+
+
+def match(text):
+    return intent_matcher.match(normalize_prompt(text))
+
+
+def test_date_after_is_exclusive():
+    assert match('2023-06-01之后开始的项目') == \
+        ('SELECT * FROM ai_projects WHERE start_date > %s;', ('2023-06-01',))
+    assert match('2023-06-01后交付的项目') == \
+        ('SELECT * FROM ai_projects WHERE end_date > %s;', ('2023-06-01',))
+
+
+def test_date_from_is_inclusive():
+    assert match('2023-06-01起开始的项目') == \
+        ('SELECT * FROM ai_projects WHERE start_date >= %s;', ('2023-06-01',))
+
+
+def test_date_before_is_exclusive():
+    assert match('2023年6月1日以前交付的项目') == \
+        ('SELECT * FROM ai_projects WHERE end_date < %s;', ('2023-06-01',))
+
+
+def test_year_range():
+    assert match('2022年开始的项目') == \
+        ('SELECT * FROM ai_projects WHERE start_date >= %s AND start_date < %s;', ('2022-01-01', '2023-01-01'))
+
+
+def test_compare_and_top():
+    assert match('预算大于二十万的项目') == ('SELECT * FROM ai_projects WHERE total_budget > %s;', (200000,))
+    assert match('预算最高的前五个项目') == ('SELECT * FROM ai_projects ORDER BY total_budget DESC, id LIMIT 5;', None)
+
+
+def test_ambiguous_compare_not_matched():
+    # 没有比较方向时交给 LLM
+    assert match('预算10万的项目') is None
+
+
+if __name__ == "__main__":
+    for name, func in list(globals().items()):
+        if name.startswith('test_') and callable(func):
+            func()
+            print(f"✅ {name}")
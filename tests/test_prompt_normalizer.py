@@ -0,0 +1,36 @@
+import os
+import sys
+
+# 将 backend 目录添加到 sys.path，以便导入 prompt_normalizer
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(BASE_DIR, 'backend'))
+
+from prompt_normalizer import make_cache_key, normalize_prompt
+
+
+def test_equivalent_spellings_share_key():
+    key = make_cache_key('查询所有项目')
+    for prompt in ('查询所有项目？', '查询 所有项目吗', '  查询所有项目吧。', '查询所有项目呢!'):
+        assert make_cache_key(prompt) == key
+
+
+def test_strips_single_trailing_particle():
+    assert normalize_prompt('查询所有项目吗？') == '查询所有项目'
+    assert normalize_prompt('查询所有项目 吗') == '查询所有项目'
+    # 只去掉一个语气词，前面的字可能是内容的一部分
+    assert normalize_prompt('查询客户哦呀') == '查询客户哦'
+    assert normalize_prompt('项目叫啊呀吗') == '项目叫啊呀'
+    # 句中的语气词不动
+    assert normalize_prompt('吗啡项目有哪些') == '吗啡项目有哪些'
+
+
+def test_keeps_meaningful_punctuation():
+    assert normalize_prompt('完成率大于80%的项目') == '完成率大于80%的项目'
+    assert normalize_prompt('2023-01-01之后开始的项目') == '2023-01-01之后开始的项目'
+
+
+if __name__ == "__main__":
+    for name, func in list(globals().items()):
+        if name.startswith('test_') and callable(func):
+            func()
+            print(f"✅ {name}")
@@ -0,0 +1,67 @@
+import os
+import sys
+
+# 将 backend 目录添加到 sys.path，以便导入 similarity_index
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(BASE_DIR, 'backend'))
+
+from entity_dictionary import entity_dictionary
+from prompt_normalizer import normalize_prompt
+from similarity_index import SimilarityIndex
+from sql_template import extract_slots, parse_chinese_number
+
+ARCHITECT_SQL = "SELECT * FROM ai_projects WHERE architect_name = '张三' AND status = '已交付' LIMIT 100;"
+BUDGET_SQL = "SELECT * FROM ai_projects WHERE total_budget > 100000 LIMIT 100;"
+
+
+def make_index():
+    entity_dictionary.set_values({
+        normalize_prompt(value): (column, value)
+        for column, values in (('architect_name', ['张三', '李四']), ('status', ['已交付', '制作中']))
+        for value in values
+    })
+    index = SimilarityIndex(capacity=16)
+    index.add(normalize_prompt('帮我查询一下解决方案架构师张三负责的所有已交付项目'), ARCHITECT_SQL)
+    index.add(normalize_prompt('查询预算大于十万的项目'), BUDGET_SQL)
+    return index
+
+
+def test_near_duplicate_reused():
+    index = make_index()
+    match = index.lookup(normalize_prompt('帮我查询一下解决方案架构师张三负责的全部已交付项目'))
+    assert match is not None and match[0] == ARCHITECT_SQL
+
+
+def test_entity_swap_not_reused():
+    index = make_index()
+    assert index.lookup(normalize_prompt('帮我查询一下解决方案架构师李四负责的所有已交付项目')) is None
+    assert index.lookup(normalize_prompt('帮我查询一下解决方案架构师张三负责的所有制作中项目')) is None
+
+
+def test_chinese_numeral_swap_not_reused():
+    index = make_index()
+    assert index.lookup(normalize_prompt('查询预算大于二十万的项目')) is None
+    assert index.lookup(normalize_prompt('查询预算大于20万的项目')) is None
+
+
+def test_same_chinese_numeral_reused():
+    index = make_index()
+    match = index.lookup(normalize_prompt('请查询预算大于十万的项目'))
+    assert match is not None and match[0] == BUDGET_SQL
+
+
+def test_parse_chinese_number():
+    assert parse_chinese_number('二十万') == 200000
+    assert parse_chinese_number('十五') == 15
+    assert parse_chinese_number('三千五百') == 3500
+    assert parse_chinese_number('一亿两千万') == 120000000
+    # "一下"、"一个" 不是数字
+    assert extract_slots('查询一下一个项目')[1] == []
+    assert extract_slots('前五个项目')[1] == [('number', 5)]
+
+
+if __name__ == "__main__":
+    for name, func in list(globals().items()):
+        if name.startswith('test_') and callable(func):
+            func()
+            print(f"✅ {name}")
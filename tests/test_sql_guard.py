@@ -0,0 +1,95 @@
+import os
+import sys
+
+# 将 backend 目录添加到 sys.path，以便导入 sql_guard
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(BASE_DIR, 'backend'))
+
+import pytest
+from sql_guard import InvalidCursorError, enforce_limit, paginate, split_limit, strip_sql
+
+
+def test_limit_added_when_missing():
+    assert enforce_limit("SELECT * FROM ai_projects", max_rows=100) == "SELECT * FROM ai_projects LIMIT 100"
+
+
+def test_smaller_limit_kept():
+    assert enforce_limit("SELECT * FROM ai_projects LIMIT 10", max_rows=100) == "SELECT * FROM ai_projects LIMIT 10"
+
+
+def test_larger_limit_capped():
+    assert enforce_limit("SELECT * FROM ai_projects LIMIT 5000", max_rows=100) == "SELECT * FROM ai_projects LIMIT 100"
+    assert enforce_limit("SELECT * FROM ai_projects LIMIT 20, 5000", max_rows=100) == \
+        "SELECT * FROM ai_projects LIMIT 20, 100"
+    assert enforce_limit("SELECT * FROM ai_projects LIMIT 5000 OFFSET 20", max_rows=100) == \
+        "SELECT * FROM ai_projects LIMIT 20, 100"
+
+
+def test_subquery_limit_not_treated_as_outer():
+    sql = "SELECT * FROM (SELECT * FROM ai_projects LIMIT 5000) t"
+    assert enforce_limit(sql, max_rows=100) == f"{sql} LIMIT 100"
+
+
+def test_unparseable_limit_wrapped():
+    sql = "SELECT * FROM ai_projects LIMIT %s"
+    assert enforce_limit(sql, max_rows=100) == f"SELECT * FROM ({sql}) AS _capped LIMIT 100"
+
+
+def test_trailing_semicolon_and_comments():
+    assert enforce_limit("SELECT * FROM ai_projects LIMIT 10;", max_rows=100) == \
+        "SELECT * FROM ai_projects LIMIT 10"
+    # 注释里的 LIMIT 不算数，末尾注释后的分号也能去掉
+    assert enforce_limit("SELECT * FROM ai_projects; -- LIMIT 1", max_rows=100) == \
+        "SELECT * FROM ai_projects LIMIT 100"
+    assert enforce_limit("SELECT * FROM ai_projects /* LIMIT 1 */ LIMIT 5000 # note", max_rows=100) == \
+        "SELECT * FROM ai_projects LIMIT 100"
+    # 字符串里的 -- 与 # 不是注释；优化器提示保留
+    assert strip_sql("SELECT * FROM ai_projects WHERE project_name = 'a -- #b';") == \
+        "SELECT * FROM ai_projects WHERE project_name = 'a -- #b'"
+    assert strip_sql("SELECT /*+ MAX_EXECUTION_TIME(100) */ * FROM ai_projects") == \
+        "SELECT /*+ MAX_EXECUTION_TIME(100) */ * FROM ai_projects"
+
+
+def test_split_limit():
+    assert split_limit("SELECT * FROM ai_projects LIMIT 5, 10") == ("SELECT * FROM ai_projects", 10, 5)
+    assert split_limit("SELECT * FROM ai_projects") == ("SELECT * FROM ai_projects", None, 0)
+
+
+def test_paginate_adds_id_tiebreak():
+    page = paginate("SELECT * FROM ai_projects ORDER BY total_budget DESC", page_size=10)
+    assert page.keys == ['total_budget', 'id']
+    assert page.sql.endswith("ORDER BY `_page`.`total_budget` DESC, `_page`.`id` DESC LIMIT 11")
+
+
+def test_paginate_inner_limit_gets_id_tiebreak():
+    # 内层 LIMIT 决定取哪些行，也必须按唯一键排序，否则并列值让各页取到的行集合不一致
+    page = paginate("SELECT * FROM ai_projects ORDER BY total_budget DESC LIMIT 50;", page_size=10)
+    assert "ORDER BY total_budget DESC, `id` DESC LIMIT 50" in page.sql
+    page = paginate("SELECT * FROM ai_projects LIMIT 50", page_size=10)
+    assert "FROM ai_projects ORDER BY `id` LIMIT 50" in page.sql
+
+
+def test_paginate_cursor_round_trip():
+    sql = "SELECT * FROM ai_projects ORDER BY total_budget DESC"
+    first = paginate(sql, page_size=2)
+    rows = [{'id': i, 'total_budget': 100 - i} for i in range(1, 4)]
+    page_rows, token = first.finish(rows)
+    assert len(page_rows) == 2 and token
+    second = paginate(sql, page_size=2, cursor=token)
+    assert "WHERE (`_page`.`total_budget`, `_page`.`id`) < (%s, %s)" in second.sql
+    assert second.params == (98, 2)
+    with pytest.raises(InvalidCursorError):
+        paginate("SELECT * FROM ai_projects ORDER BY id", page_size=2, cursor=token)
+
+
+def test_paginate_rejects_unsupported():
+    assert paginate("SELECT status, COUNT(*) FROM ai_projects GROUP BY status") is None
+    assert paginate("SELECT * FROM ai_projects ORDER BY total_budget DESC, id ASC") is None
+    assert paginate("SELECT project_name FROM ai_projects ORDER BY total_budget") is None
+
+
+if __name__ == "__main__":
+    for name, func in list(globals().items()):
+        if name.startswith('test_') and callable(func):
+            func()
+            print(f"✅ {name}")
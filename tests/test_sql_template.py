@@ -0,0 +1,76 @@
+import os
+import sys
+
+# 将 backend 目录添加到 sys.path，以便导入 sql_template
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(BASE_DIR, 'backend'))
+
+from entity_dictionary import entity_dictionary
+from prompt_normalizer import normalize_prompt
+from sql_template import TemplateStore, build_template, extract_slots, render_sql
+
+ARCHITECT_BUDGET_SQL = "SELECT * FROM ai_projects WHERE architect_name = '张三' AND total_budget > 100000;"
+
+
+def setup_module():
+    entity_dictionary.set_values({
+        normalize_prompt(value): (column, value)
+        for column, values in (('architect_name', ['张三', '李四']), ('status', ['已交付', '制作中']))
+        for value in values
+    })
+
+
+def test_extract_slots():
+    template, slots = extract_slots(normalize_prompt('架构师张三负责的预算大于10万的项目'))
+    assert template == '架构师{architect_name}负责的预算大于{number}的项目'
+    assert slots == [('architect_name', '张三'), ('number', 100000)]
+    # 中文数字与阿拉伯数字落到同一个模板
+    assert extract_slots(normalize_prompt('架构师李四负责的预算大于二十万的项目')) == \
+        (template, [('architect_name', '李四'), ('number', 200000)])
+
+
+def test_build_template_and_bind():
+    _, slots = extract_slots(normalize_prompt('架构师张三负责的预算大于10万的项目'))
+    template = build_template(ARCHITECT_BUDGET_SQL, slots)
+    assert template.sql == "SELECT * FROM ai_projects WHERE architect_name = %s AND total_budget > %s;"
+    assert template.bind(slots) == ('张三', 100000)
+    # 原样填回得到原 SQL
+    assert render_sql(template.sql, template.bind(slots)) == ARCHITECT_BUDGET_SQL
+
+
+def test_like_affix_kept():
+    _, slots = extract_slots(normalize_prompt('张三负责的项目'))
+    template = build_template("SELECT * FROM ai_projects WHERE architect_name LIKE '%张三%';", slots)
+    assert template.bind([('architect_name', '李四')]) == ('%李四%',)
+
+
+def test_ambiguous_literal_not_templated():
+    # 同一个值在 SQL 中出现两次，无法确定槽位对应哪一个
+    _, slots = extract_slots(normalize_prompt('预算大于10万的项目'))
+    assert build_template(
+        "SELECT * FROM ai_projects WHERE total_budget > 100000 OR actual_cost > 100000;", slots) is None
+    # SQL 中找不到槽位的值
+    assert build_template("SELECT * FROM ai_projects WHERE total_budget > 5;", slots) is None
+
+
+def test_store_round_trip():
+    store = TemplateStore(capacity=4)
+    assert store.learn(normalize_prompt('架构师张三负责的预算大于10万的项目'), ARCHITECT_BUDGET_SQL)
+    sql, params = store.lookup(normalize_prompt('架构师李四负责的预算大于二十万的项目'))
+    assert params == ('李四', 200000)
+    assert render_sql(sql, params) == \
+        "SELECT * FROM ai_projects WHERE architect_name = '李四' AND total_budget > 200000;"
+    assert store.lookup(normalize_prompt('架构师李四负责的预算小于二十万的项目')) is None
+
+
+def test_render_sql_escapes_quotes():
+    assert render_sql("SELECT * FROM ai_projects WHERE project_name = %s", ("O'Brien\\",)) == \
+        "SELECT * FROM ai_projects WHERE project_name = 'O''Brien\\\\'"
+
+
+if __name__ == "__main__":
+    setup_module()
+    for name, func in list(globals().items()):
+        if name.startswith('test_') and callable(func):
+            func()
+            print(f"✅ {name}")